@@ -0,0 +1,88 @@
+# activity.py
+
+import time
+from collections import Counter
+
+from aiogram import BaseMiddleware
+
+from config import STATS_FLUSH_INTERVAL
+from database import db
+from write_behind import WriteBehind
+
+
+def today():
+    # daily_stats days are UTC, like SQLite's date('now')
+    return time.strftime("%Y-%m-%d", time.gmtime())
+
+
+# ======================
+# Activity tracker
+# ======================
+class ActivityTracker(WriteBehind):
+    # Daily active users and per-button presses are counted in memory and
+    # written every STATS_FLUSH_INTERVAL and at shutdown, so an update costs
+    # a dict/set operation instead of a write. Each user is written once per
+    # day; presses become one row per button and day.
+    name = "Activity"
+
+    def __init__(self, database, flush_interval=STATS_FLUSH_INTERVAL):
+        super().__init__(flush_interval)
+        self.db = database
+        self.seen_day = None
+        self.seen = set()          # users already recorded for seen_day
+        self.pending = {}          # day -> telegram_ids not yet written
+        self.presses = {}          # day -> Counter(button_id) not yet written
+
+    def user_seen(self, telegram_id):
+        day = today()
+        if day != self.seen_day:
+            self.seen_day, self.seen = day, set()
+        if telegram_id in self.seen:
+            return
+        self.seen.add(telegram_id)
+        self.pending.setdefault(day, set()).add(telegram_id)
+        self._start()
+
+    def button_pressed(self, button_id):
+        day = today()
+        if day not in self.presses:
+            self.presses[day] = Counter()
+        self.presses[day][button_id] += 1
+        self._start()
+
+    def _take(self):
+        if not self.pending and not self.presses:
+            return None
+        batch = (self.pending, self.presses)
+        self.pending, self.presses = {}, {}
+        return batch
+
+    async def _write(self, batch):
+        pending, presses = batch
+        for day in sorted(set(pending) | set(presses)):
+            await self.db.record_activity(day, pending.get(day, ()), presses.get(day))
+            # Written: a later failure only puts the remaining days back
+            pending.pop(day, None)
+            presses.pop(day, None)
+
+    def _restore(self, batch):
+        pending, presses = batch
+        for day, telegram_ids in pending.items():
+            self.pending.setdefault(day, set()).update(telegram_ids)
+        for day, counts in presses.items():
+            self.presses.setdefault(day, Counter()).update(counts)
+
+
+activity = ActivityTracker(db)
+
+
+class ActivityMiddleware(BaseMiddleware):
+    # Outer update middleware: runs after aiogram resolved event_from_user
+    def __init__(self, tracker):
+        self.tracker = tracker
+
+    async def __call__(self, handler, event, data):
+        user = data.get("event_from_user")
+        if user is not None:
+            self.tracker.user_seen(user.id)
+        return await handler(event, data)
@@ -1,67 +1,79 @@
 # admin_interface.py
 
+import datetime
 import html
+import logging
 from aiogram import Router, F, Bot
 from aiogram.types import CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton, Message
 from aiogram.fsm.context import FSMContext
 
-from database import Database
-from states import AddSupervisor, ManageButtons, SupportState
+from database import db
+from auth_cache import auth_cache
+from states import AddSupervisor, ManageButtons, SupportState, BroadcastState, UserSearch
+from broadcast import broadcasts
+from activity import activity
+from routing import text_routes, callback_routes
+from callbacks import (
+    ADMIN_PANEL, ADMIN_CLOSE, BROADCAST,
+    BUTTONS_LIST, BUTTON_MOVE, BUTTON_DELETE, BUTTON_EDIT, BUTTON_EDIT_FIELD, BUTTON_ADD, BUTTON_TYPE,
+    STATS, HOT_BUTTONS, USERS_PAGE, USERS_SEARCH, USER_TOGGLE_BLOCK,
+    CONFIRM_USER_ACTION, CONFIRM_CANCEL, CONFIRM_DELETE_ADMIN_LOG, CONFIRM_DELETE_MESSAGE,
+    MANAGERS, MANAGER_ADD, MANAGER_LIST, MANAGER_VIEW, MANAGER_PERMS, MANAGER_DELETE,
+    MANAGER_DELETE_FINAL, MANAGER_SET_ACTIVE,
+    SUPPORT_REPLY, LOG_SECTIONS, LOG_PAGE, LOG_CLEAR, LOG_CLEAR_FINAL,
+    ADMIN_LOGS, ADMIN_LOGS_CLEAR, ADMIN_LOGS_CLEAR_FINAL,
+)
 
 router = Router()
-db = Database()
 
 # ======================
 # Permissions
 # ======================
-def is_admin_user(telegram_id: int) -> bool:
-    user = db.get_user_by_telegram_id(telegram_id)
-    return bool(user and user["role"] in ("super_admin", "admin", "supervisor"))
+async def is_admin_user(telegram_id: int) -> bool:
+    return await auth_cache.is_staff(telegram_id)
 
-def is_super_admin_user(telegram_id: int) -> bool:
-    user = db.get_user_by_telegram_id(telegram_id)
-    return bool(user and user["role"] == "super_admin")
+async def is_super_admin_user(telegram_id: int) -> bool:
+    return await auth_cache.is_super_admin(telegram_id)
 
 # ======================
 # Keyboards
 # ======================
-def admin_main_keyboard_markup(user_id):
-    is_super = is_super_admin_user(user_id)
+async def admin_main_keyboard_markup(user_id):
+    is_super = await is_super_admin_user(user_id)
     buttons = []
-    if is_super or db.has_permission(user_id, 'managers'):
-        buttons.append([InlineKeyboardButton(text="👥 إدارة المشرفين", callback_data="admin:managers")])
-    if is_super or db.has_permission(user_id, 'buttons'):
-        buttons.append([InlineKeyboardButton(text="🧱 إدارة الأزرار", callback_data="admin:buttons_list")])
-    if is_super or db.has_permission(user_id, 'stats'):
-        buttons.append([InlineKeyboardButton(text="📊 الإحصائيات", callback_data="admin:stats")])
-    if is_super or db.has_permission(user_id, 'logs'):
-        buttons.append([InlineKeyboardButton(text="📜 سجل المراسلات", callback_data="admin:logs")])
+    if is_super or await auth_cache.has_permission(user_id, 'managers'):
+        buttons.append([InlineKeyboardButton(text="👥 إدارة المشرفين", callback_data=MANAGERS.pack())])
+    if is_super or await auth_cache.has_permission(user_id, 'buttons'):
+        buttons.append([InlineKeyboardButton(text="🧱 إدارة الأزرار", callback_data=BUTTONS_LIST.pack())])
+    if is_super or await auth_cache.has_permission(user_id, 'stats'):
+        buttons.append([InlineKeyboardButton(text="📊 الإحصائيات", callback_data=STATS.pack())])
+    if is_super or await auth_cache.has_permission(user_id, 'logs'):
+        buttons.append([InlineKeyboardButton(text="📜 سجل المراسلات", callback_data=LOG_SECTIONS.pack())])
     if is_super:
-        buttons.append([InlineKeyboardButton(text="📢 إذاعة رسالة للكل", callback_data="admin:broadcast")])
-        buttons.append([InlineKeyboardButton(text="🛡️ سجل المشرفين", callback_data="admin:admin_logs")])
-    buttons.append([InlineKeyboardButton(text="⬅️ إغلاق", callback_data="admin:close")])
+        buttons.append([InlineKeyboardButton(text="📢 إذاعة رسالة للكل", callback_data=BROADCAST.pack())])
+        buttons.append([InlineKeyboardButton(text="🛡️ سجل المشرفين", callback_data=ADMIN_LOGS.pack())])
+    buttons.append([InlineKeyboardButton(text="⬅️ إغلاق", callback_data=ADMIN_CLOSE.pack())])
     return InlineKeyboardMarkup(inline_keyboard=buttons)
 
 def managers_keyboard_markup():
     return InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="➕ إضافة مشرف", callback_data="manager:add")],
-        [InlineKeyboardButton(text="📋 عرض المشرفين", callback_data="manager:list")],
-        [InlineKeyboardButton(text="⬅️ رجوع", callback_data="admin:panel")],
+        [InlineKeyboardButton(text="➕ إضافة مشرف", callback_data=MANAGER_ADD.pack())],
+        [InlineKeyboardButton(text="📋 عرض المشرفين", callback_data=MANAGER_LIST.pack())],
+        [InlineKeyboardButton(text="⬅️ رجوع", callback_data=ADMIN_PANEL.pack())],
     ])
 
 def back_to_admin_button():
     return InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="⬅️ رجوع", callback_data="admin:panel")]
+        [InlineKeyboardButton(text="⬅️ رجوع", callback_data=ADMIN_PANEL.pack())]
     ])
 
 # ======================
 # Handlers
 # ======================
-@router.callback_query(F.data == "admin:panel")
-@router.callback_query(F.data == "admin:back")
+@callback_routes.route(ADMIN_PANEL)
 async def admin_panel_view(callback: CallbackQuery, state: FSMContext):
     await state.clear() # Clear state if returning from a flow
-    if not is_admin_user(callback.from_user.id):
+    if not await is_admin_user(callback.from_user.id):
         await callback.answer("غير مصرح", show_alert=True)
         return
 
@@ -69,22 +81,21 @@ async def admin_panel_view(callback: CallbackQuery, state: FSMContext):
     try:
         await callback.message.edit_text(
             "🔧 لوحة التحكم",
-            reply_markup=admin_main_keyboard_markup(callback.from_user.id)
+            reply_markup=await admin_main_keyboard_markup(callback.from_user.id)
         )
     except Exception:
         # In case edit fails (e.g. message text is same), try sending fresh message
         await callback.message.answer(
             "🔧 لوحة التحكم",
-            reply_markup=admin_main_keyboard_markup(callback.from_user.id)
+            reply_markup=await admin_main_keyboard_markup(callback.from_user.id)
         )
     await callback.answer()
 
-@router.callback_query(F.data == "admin:close")
+@callback_routes.route(ADMIN_CLOSE)
 async def close_admin_panel(callback: CallbackQuery):
     await callback.message.delete()
 
-@router.callback_query(F.data == "admin:managers")
-@router.callback_query(F.data == "admin:supervisors")
+@callback_routes.route(MANAGERS)
 async def managers_menu_view(callback: CallbackQuery):
     await callback.message.edit_text(
         "👥 إدارة المشرفين",
@@ -94,29 +105,10 @@ async def managers_menu_view(callback: CallbackQuery):
 # ======================
 # Buttons Management
 # ======================
-@router.callback_query(F.data == "admin:buttons")
-@router.callback_query(F.data.startswith("admin:buttons_list:"))
-@router.callback_query(F.data == "admin:buttons_list")
-async def list_buttons_admin_view(callback: CallbackQuery):
-    parent_id = None
-    if callback.data.startswith("admin:buttons_list:"):
-        parts = callback.data.split(":")
-        if len(parts) > 2:
-            try:
-                parent_id = int(parts[-1])
-            except ValueError:
-                parent_id = None
-    
-    buttons = db.get_buttons(parent_id)
+def buttons_list_markup(buttons, parent_btn):
     keyboard = []
-    
-    parent_text = ""
-    if parent_id:
-        parent_btn = db.get_button_by_id(parent_id)
-        if parent_btn:
-            parent_text = f" (داخل: {parent_btn['text']})"
-            back_id = parent_btn['parent_id']
-            keyboard.append([InlineKeyboardButton(text="⬅️ مستوى للأعلى", callback_data=f"admin:buttons_list:{back_id}" if back_id else "admin:buttons_list")])
+    if parent_btn:
+        keyboard.append([InlineKeyboardButton(text="⬅️ مستوى للأعلى", callback_data=BUTTONS_LIST.pack(parent_btn['parent_id']))])
 
     for btn in buttons:
         # 📂 for folder (parent), 🟢 for contact, 📝 for content
@@ -128,265 +120,344 @@ async def list_buttons_admin_view(callback: CallbackQuery):
             btn_icon = "📝"
             
         keyboard.append([
-            InlineKeyboardButton(text=f"{btn_icon} {btn['text']}", callback_data=f"btn_edit:{btn['id']}")
+            InlineKeyboardButton(text=f"{btn_icon} {btn['text']}", callback_data=BUTTON_EDIT.pack(btn['id']))
         ])
         keyboard.append([
-            InlineKeyboardButton(text="🔼", callback_data=f"btn_move:up:{btn['id']}"),
-            InlineKeyboardButton(text="🔽", callback_data=f"btn_move:down:{btn['id']}"),
-            InlineKeyboardButton(text="❌", callback_data=f"btn_del:{btn['id']}"),
+            InlineKeyboardButton(text="🔼", callback_data=BUTTON_MOVE.pack("up", btn['id'])),
+            InlineKeyboardButton(text="🔽", callback_data=BUTTON_MOVE.pack("down", btn['id'])),
+            InlineKeyboardButton(text="❌", callback_data=BUTTON_DELETE.pack(btn['id'])),
         ])
     
-    keyboard.append([InlineKeyboardButton(text="➕ إضافة زر هنا", callback_data=f"button:add:{parent_id}" if parent_id else "button:add")])
-    if not parent_id:
-        keyboard.append([InlineKeyboardButton(text="⬅️ القائمة الرئيسية", callback_data="admin:panel")])
-    
+    parent_id = parent_btn['id'] if parent_btn else None
+    keyboard.append([InlineKeyboardButton(text="➕ إضافة زر هنا", callback_data=BUTTON_ADD.pack(parent_id))])
+    if not parent_btn:
+        keyboard.append([InlineKeyboardButton(text="⬅️ القائمة الرئيسية", callback_data=ADMIN_PANEL.pack())])
+    return InlineKeyboardMarkup(inline_keyboard=keyboard)
+
+async def render_buttons_list(callback: CallbackQuery, parent_id=None):
+    buttons = await db.get_buttons(parent_id)
+    parent_btn = await db.get_button_by_id(parent_id) if parent_id else None
+    parent_text = f" (داخل: {parent_btn['text']})" if parent_btn else ""
     await callback.message.edit_text(
         f"🧱 إدارة الأزرار{parent_text}:\n\n🔼/🔽: للترتيب.\n📝: للتعديل والدخول للأزرار الفرعية.\n❌: للحذف.",
-        reply_markup=InlineKeyboardMarkup(inline_keyboard=keyboard)
+        reply_markup=buttons_list_markup(buttons, parent_btn)
     )
 
-@router.callback_query(F.data.startswith("btn_move:"))
-async def move_button_handler(callback: CallbackQuery):
-    parts = callback.data.split(":")
-    direction = parts[1]
-    btn_id = int(parts[2])
+@callback_routes.route(BUTTONS_LIST)
+async def list_buttons_admin_view(callback: CallbackQuery, callback_data):
+    await render_buttons_list(callback, callback_data.parent_id)
+
+@callback_routes.route(BUTTON_MOVE)
+async def move_button_handler(callback: CallbackQuery, callback_data):
+    btn_id = callback_data.button_id
     
-    if db.move_button(btn_id, direction):
+    if await db.move_button(btn_id, callback_data.direction):
         await callback.answer("تم تغيير الترتيب")
-        btn = db.get_button_by_id(btn_id)
-        parent_id = btn['parent_id'] if btn else None
-        
-        # Fresh view instead of modifying frozen callback.data
-        buttons = db.get_buttons(parent_id)
-        keyboard = []
-        
-        parent_text = ""
-        if parent_id:
-            parent_btn = db.get_button_by_id(parent_id)
-            if parent_btn:
-                parent_text = f" (داخل: {parent_btn['text']})"
-                back_id = parent_btn['parent_id']
-                keyboard.append([InlineKeyboardButton(text="⬅️ مستوى للأعلى", callback_data=f"admin:buttons_list:{back_id}" if back_id else "admin:buttons_list")])
-
-        for btn_item in buttons:
-            # 📂 for folder (parent), 🟢 for contact, 📝 for content
-            if btn_item['type'] == 'folder':
-                btn_icon = "📂"
-            elif btn_item['type'] == 'contact':
-                btn_icon = "🟢"
-            else:
-                btn_icon = "📝"
-                
-            keyboard.append([
-                InlineKeyboardButton(text=f"{btn_icon} {btn_item['text']}", callback_data=f"btn_edit:{btn_item['id']}")
-            ])
-            keyboard.append([
-                InlineKeyboardButton(text="🔼", callback_data=f"btn_move:up:{btn_item['id']}"),
-                InlineKeyboardButton(text="🔽", callback_data=f"btn_move:down:{btn_item['id']}"),
-                InlineKeyboardButton(text="❌", callback_data=f"btn_del:{btn_item['id']}"),
-            ])
-        
-        keyboard.append([InlineKeyboardButton(text="➕ إضافة زر هنا", callback_data=f"button:add:{parent_id}" if parent_id else "button:add")])
-        if not parent_id:
-            keyboard.append([InlineKeyboardButton(text="⬅️ القائمة الرئيسية", callback_data="admin:panel")])
-        
-        await callback.message.edit_text(
-            f"🧱 إدارة الأزرار{parent_text}:\n\n🔼/🔽: للترتيب.\n📝: للتعديل والدخول للأزرار الفرعية.\n❌: للحذف.",
-            reply_markup=InlineKeyboardMarkup(inline_keyboard=keyboard)
-        )
+        btn = await db.get_button_by_id(btn_id)
+        await render_buttons_list(callback, btn['parent_id'] if btn else None)
     else:
         await callback.answer("لا يمكن التحريك أكثر من ذلك", show_alert=False)
 
-@router.callback_query(F.data == "admin:stats")
+@callback_routes.route(STATS)
 async def stats_handler_view(callback: CallbackQuery):
-    total_users = db.get_total_users_count()
-    total_supervisors = db.get_total_supervisors_count()
-    
+    # Counters and daily rows are kept up to date by triggers; nothing here
+    # scans the users or support_messages tables
+    stats = await db.get_statistics()
+    contact_buttons = await db.get_contact_buttons()
+    days = await db.get_daily_stats(7)
+
     stats_text = (
-        "📊 **إحصائيات البوت الحية**\n\n"
-        f"👥 إجمالي المستخدمين: `{total_users}`\n"
-        f"👮 إجمالي المشرفين: `{total_supervisors}`\n"
+        "📊 <b>إحصائيات البوت الحية</b>\n\n"
+        f"👥 إجمالي المستخدمين: <code>{stats.get('users_total', 0)}</code>\n"
+        f"✅ النشطون: <code>{stats.get('users_active', 0)}</code> | "
+        f"🚫 المحظورون: <code>{stats.get('users_blocked', 0)}</code>\n"
+        f"👮 إجمالي المشرفين: <code>{stats.get('supervisors', 0)}</code>\n"
+    )
+    if contact_buttons:
+        stats_text += "━━━━━━━━━━━━━━━\n📨 الرسائل حسب قسم التواصل:\n"
+        for btn in contact_buttons:
+            count = stats.get(f"button_messages:{btn['id']}", 0)
+            stats_text += f"• {html.escape(btn['text'])}: <code>{count}</code>\n"
+    if days:
+        stats_text += "━━━━━━━━━━━━━━━\n📅 آخر 7 أيام (جدد / نشطون / ضغطات / رسائل):\n"
+        for day in days:
+            stats_text += (
+                f"<code>{day['day']}</code>: {day['new_users']} / {day['active_users']} / "
+                f"{day['button_presses']} / {day['support_messages']}\n"
+            )
+    stats_text += (
         "━━━━━━━━━━━━━━━\n"
         "💡 هذه الإحصائيات محدثة بشكل حي من قاعدة البيانات."
     )
     
     keyboard = [
-        [InlineKeyboardButton(text="👥 إدارة جميع المستخدمين", callback_data="admin:users_list:1")],
-        [InlineKeyboardButton(text="⬅️ رجوع", callback_data="admin:panel")]
+        [InlineKeyboardButton(text="👥 إدارة جميع المستخدمين", callback_data=USERS_PAGE.pack("*", "*", False))],
+        [InlineKeyboardButton(text="🔥 الأزرار الأكثر استخداماً", callback_data=HOT_BUTTONS.pack(7))],
+        [InlineKeyboardButton(text="⬅️ رجوع", callback_data=ADMIN_PANEL.pack())]
     ]
     
     await callback.message.edit_text(
         stats_text,
         reply_markup=InlineKeyboardMarkup(inline_keyboard=keyboard),
-        parse_mode="Markdown"
+        parse_mode="HTML"
     )
 
-@router.callback_query(F.data.startswith("admin:users_list:"))
-async def list_users_paged(callback: CallbackQuery):
-    page = int(callback.data.split(":")[-1])
-    per_page = 10
-    users = db.get_users_paged(page, per_page)
-    total_users = db.get_total_users_count()
-    total_pages = (total_users + per_page - 1) // per_page
-    
+HOT_BUTTONS_LIMIT = 10
+
+@callback_routes.route(HOT_BUTTONS)
+async def hot_buttons_view(callback: CallbackQuery, callback_data):
+    days = callback_data.days
+    # Write the presses counted since the last flush so the view is current;
+    # if that fails, show what is already stored (the tracker retries later)
+    try:
+        await activity.flush()
+    except Exception:
+        logging.exception("Activity flush before the hot buttons view failed")
+    since_day = (datetime.datetime.now(datetime.timezone.utc).date() - datetime.timedelta(days=days - 1)).isoformat()
+    hot_buttons = await db.get_hot_buttons(since_day, HOT_BUTTONS_LIMIT)
+
+    text = f"🔥 <b>الأزرار الأكثر استخداماً (آخر {days} يوم):</b>\n\n"
+    if not hot_buttons:
+        text += "لا توجد ضغطات مسجلة في هذه الفترة."
+    for index, btn in enumerate(hot_buttons, start=1):
+        name = html.escape(btn['text']) if btn['text'] else f"زر محذوف #{btn['button_id']}"
+        text += f"{index}. {name}: <code>{btn['presses']}</code>\n"
+
+    period_row = []
+    for period in (1, 7, 30):
+        mark = "• " if period == days else ""
+        period_row.append(InlineKeyboardButton(text=f"{mark}{period} يوم", callback_data=HOT_BUTTONS.pack(period)))
+    keyboard = [
+        period_row,
+        [InlineKeyboardButton(text="⬅️ رجوع للإحصائيات", callback_data=STATS.pack())]
+    ]
+    await callback.message.edit_text(text, reply_markup=InlineKeyboardMarkup(inline_keyboard=keyboard), parse_mode="HTML")
+
+# filters: role char + is_active char, as in USERS_PAGE
+USER_ROLE_FILTERS = {"*": None, "u": "user", "s": "supervisor", "a": "admin"}
+USER_ACTIVE_FILTERS = {"*": None, "1": 1, "0": 0}
+USERS_PER_PAGE = 10
+
+async def users_list_view(filters="**", search=None, older_than=None, newer_than=None):
+    # older_than / newer_than: the users.id shown at the edge of the previous
+    # page; neither for the newest page
+    role = USER_ROLE_FILTERS.get(filters[0])
+    is_active = USER_ACTIVE_FILTERS.get(filters[1])
+    users, has_more = await db.get_users_page(role, is_active, search, older_than, newer_than, USERS_PER_PAGE)
+    cursor = older_than is not None or newer_than is not None
+    if not users and cursor:
+        # The edge user was deleted meanwhile; start over from the newest
+        return await users_list_view(filters, search)
+    searching = bool(search)
+
+    if search:
+        users_text = f"🔍 <b>نتائج البحث عن:</b> {html.escape(search)}\n\n"
+    elif filters == "**":
+        total_users = await db.get_total_users_count()
+        users_text = f"👥 <b>قائمة المستخدمين (الإجمالي: {total_users}):</b>\n\n"
+    else:
+        users_text = "👥 <b>قائمة المستخدمين (مصفاة):</b>\n\n"
     if not users:
-        await callback.message.edit_text("لا يوجد مستخدمون حالياً.", reply_markup=back_to_admin_button())
-        return
+        users_text += "لا يوجد مستخدمون مطابقون."
 
-    users_text = f"👥 **قائمة المستخدمين (صفحة {page} من {total_pages}):**\n\n"
-    keyboard = []
-    
     for user in users:
         status_emoji = "✅" if user['is_active'] else "🚫"
         name = user['full_name'] or "بدون اسم"
         username = f"@{user['username']}" if user['username'] else f"ID: {user['telegram_id']}"
-        
-        users_text += f"{status_emoji} {html.escape(name)} ({username})\n"
-        
+
+        users_text += f"{status_emoji} {html.escape(name)} ({html.escape(username)})\n"
+
         # Action commands as text
         if user['is_active']:
             users_text += f"└ 🗑️ /delete_{user['telegram_id']} | 🚫 /ban_{user['telegram_id']}\n\n"
         else:
             users_text += f"└ 🗑️ /delete_{user['telegram_id']} | ✅ /unban_{user['telegram_id']}\n\n"
 
+    keyboard = []
+
     # Navigation buttons
+    has_newer = has_more if newer_than is not None else cursor
+    has_older = has_more if newer_than is None else True
     nav_row = []
-    if page > 1:
-        nav_row.append(InlineKeyboardButton(text="⬅️ السابق", callback_data=f"admin:users_list:{page-1}"))
-    if page < total_pages:
-        nav_row.append(InlineKeyboardButton(text="التالي ➡️", callback_data=f"admin:users_list:{page+1}"))
-    
+    if users and has_newer:
+        nav_row.append(InlineKeyboardButton(text="⬅️ السابق", callback_data=USERS_PAGE.pack(filters[0], filters[1], searching, newer_than=users[0]['id'])))
+    if users and has_older:
+        nav_row.append(InlineKeyboardButton(text="التالي ➡️", callback_data=USERS_PAGE.pack(filters[0], filters[1], searching, older_than=users[-1]['id'])))
     if nav_row:
         keyboard.append(nav_row)
-        
-    keyboard.append([InlineKeyboardButton(text="⬅️ رجوع للإحصائيات", callback_data="admin:stats")])
-    
+
+    # Filters (the selected ones are marked)
+    def filter_button(text, new_filters):
+        mark = "• " if new_filters == filters else ""
+        return InlineKeyboardButton(text=f"{mark}{text}", callback_data=USERS_PAGE.pack(new_filters[0], new_filters[1], searching))
+    keyboard.append([
+        filter_button("الكل", "*" + filters[1]),
+        filter_button("مستخدمون", "u" + filters[1]),
+        filter_button("مشرفون", "s" + filters[1]),
+        filter_button("أدمن", "a" + filters[1]),
+    ])
+    keyboard.append([
+        filter_button("أي حالة", filters[0] + "*"),
+        filter_button("✅ نشط", filters[0] + "1"),
+        filter_button("🚫 محظور", filters[0] + "0"),
+    ])
+
+    search_row = [InlineKeyboardButton(text="🔍 بحث", callback_data=USERS_SEARCH.pack(filters[0], filters[1]))]
+    if search:
+        search_row.append(InlineKeyboardButton(text="✖️ إلغاء البحث", callback_data=USERS_PAGE.pack(filters[0], filters[1], False)))
+    keyboard.append(search_row)
+    keyboard.append([InlineKeyboardButton(text="⬅️ رجوع للإحصائيات", callback_data=STATS.pack())])
+
+    return users_text, InlineKeyboardMarkup(inline_keyboard=keyboard)
+
+async def list_users_paged(callback: CallbackQuery):
+    users_text, keyboard = await users_list_view()
+    await callback.message.edit_text(users_text, reply_markup=keyboard, parse_mode="HTML")
+
+@callback_routes.route(USERS_PAGE)
+async def list_users_filtered(callback: CallbackQuery, state: FSMContext, callback_data):
+    search = None
+    if callback_data.search:
+        search = (await state.get_data()).get("user_search")
+    users_text, keyboard = await users_list_view(
+        callback_data.role + callback_data.active, search, callback_data.older_than, callback_data.newer_than
+    )
+    await callback.message.edit_text(users_text, reply_markup=keyboard, parse_mode="HTML")
+
+@callback_routes.route(USERS_SEARCH)
+async def search_users_start(callback: CallbackQuery, state: FSMContext, callback_data):
+    filters = callback_data.role + callback_data.active
+    await state.update_data(user_search_filters=filters)
+    await state.set_state(UserSearch.waiting_for_query)
     await callback.message.edit_text(
-        users_text,
-        reply_markup=InlineKeyboardMarkup(inline_keyboard=keyboard),
-        parse_mode="HTML"
+        "🔍 أرسل بداية اسم المستخدم أو الاسم الكامل أو الآيدي للبحث:",
+        reply_markup=InlineKeyboardMarkup(inline_keyboard=[
+            [InlineKeyboardButton(text="❌ إلغاء", callback_data=USERS_PAGE.pack(filters[0], filters[1], False))]
+        ])
     )
 
-@router.callback_query(F.data.startswith("user:toggle_block:"))
-async def toggle_block_user(callback: CallbackQuery):
-    parts = callback.data.split(":")
-    user_id = int(parts[2])
-    page = int(parts[3])
+@router.message(UserSearch.waiting_for_query, F.text)
+async def search_users_exec(message: Message, state: FSMContext):
+    search = message.text.strip().lstrip("@")
+    data = await state.get_data()
+    filters = data.get("user_search_filters", "**")
+    await state.set_state(None)
+    await state.update_data(user_search=search)
+    users_text, keyboard = await users_list_view(filters, search)
+    await message.answer(users_text, reply_markup=keyboard, parse_mode="HTML")
+
+@callback_routes.route(USER_TOGGLE_BLOCK)
+async def toggle_block_user(callback: CallbackQuery, callback_data):
+    user_id = callback_data.telegram_id
     
-    user = db.get_user_by_telegram_id(user_id)
+    user = await db.get_user_by_telegram_id(user_id)
     if user:
         new_status = 0 if user['is_active'] else 1
-        db.set_user_active(user_id, new_status)
+        await db.set_user_active(user_id, new_status)
         action = "حظر" if new_status == 0 else "فك حظر"
-        db.add_admin_log(callback.from_user.id, callback.from_user.full_name, action, "إدارة المستخدمين", f"قام بـ {action} المستخدم {user_id}")
+        await db.add_admin_log(callback.from_user.id, callback.from_user.full_name, action, "إدارة المستخدمين", f"قام بـ {action} المستخدم {user_id}")
         await callback.answer(f"✅ تم {action} المستخدم")
-        await list_users_paged(callback) # Refresh current page
+        await list_users_paged(callback) # Refresh the list
 
-@router.message(F.text.startswith("/delete_"))
+@text_routes.prefix("/delete_")
 async def handle_text_delete(message: Message):
-    if not db.get_user_by_telegram_id(message.from_user.id) or db.get_user_by_telegram_id(message.from_user.id)['role'] not in ('super_admin', 'admin'):
+    requester = await auth_cache.get(message.from_user.id)
+    if not requester or requester.role not in ('super_admin', 'admin'):
         return
         
     try:
         user_id = int(message.text.split("_")[1])
-        user = db.get_user_by_telegram_id(user_id)
+        user = await db.get_user_by_telegram_id(user_id)
         if not user:
             await message.reply("❌ المستخدم غير موجود")
             return
             
         keyboard = InlineKeyboardMarkup(inline_keyboard=[
             [
-                InlineKeyboardButton(text="✅ نعم، احذف", callback_data=f"confirm:delete:{user_id}"),
-                InlineKeyboardButton(text="❌ إلغاء", callback_data="confirm:cancel")
+                InlineKeyboardButton(text="✅ نعم، احذف", callback_data=CONFIRM_USER_ACTION.pack("delete", user_id)),
+                InlineKeyboardButton(text="❌ إلغاء", callback_data=CONFIRM_CANCEL.pack())
             ]
         ])
         await message.reply(f"⚠️ هل أنت متأكد من حذف المستخدم {user['full_name']} ({user_id}) نهائياً؟", reply_markup=keyboard)
-    except Exception as e:
+    except Exception:
+        logging.exception("/delete_ command failed")
         await message.reply("❌ حدث خطأ أثناء معالجة الطلب")
 
-@router.message(F.text.startswith("/ban_"))
+@text_routes.prefix("/ban_")
 async def handle_text_ban(message: Message):
-    if not db.get_user_by_telegram_id(message.from_user.id) or db.get_user_by_telegram_id(message.from_user.id)['role'] not in ('super_admin', 'admin'):
+    requester = await auth_cache.get(message.from_user.id)
+    if not requester or requester.role not in ('super_admin', 'admin'):
         return
         
     try:
         user_id = int(message.text.split("_")[1])
-        user = db.get_user_by_telegram_id(user_id)
+        user = await db.get_user_by_telegram_id(user_id)
         if not user:
             await message.reply("❌ المستخدم غير موجود")
             return
             
         keyboard = InlineKeyboardMarkup(inline_keyboard=[
             [
-                InlineKeyboardButton(text="🚫 نعم، احظر", callback_data=f"confirm:ban:{user_id}"),
-                InlineKeyboardButton(text="❌ إلغاء", callback_data="confirm:cancel")
+                InlineKeyboardButton(text="🚫 نعم، احظر", callback_data=CONFIRM_USER_ACTION.pack("ban", user_id)),
+                InlineKeyboardButton(text="❌ إلغاء", callback_data=CONFIRM_CANCEL.pack())
             ]
         ])
         await message.reply(f"⚠️ هل أنت متأكد من حظر المستخدم {user['full_name']} ({user_id})؟", reply_markup=keyboard)
-    except Exception as e:
+    except Exception:
+        logging.exception("/ban_ command failed")
         await message.reply("❌ حدث خطأ أثناء معالجة الطلب")
 
-@router.message(F.text.startswith("/unban_"))
+@text_routes.prefix("/unban_")
 async def handle_text_unban(message: Message):
-    if not db.get_user_by_telegram_id(message.from_user.id) or db.get_user_by_telegram_id(message.from_user.id)['role'] not in ('super_admin', 'admin'):
+    requester = await auth_cache.get(message.from_user.id)
+    if not requester or requester.role not in ('super_admin', 'admin'):
         return
         
     try:
         user_id = int(message.text.split("_")[1])
-        user = db.get_user_by_telegram_id(user_id)
+        user = await db.get_user_by_telegram_id(user_id)
         if not user:
             await message.reply("❌ المستخدم غير موجود")
             return
             
         keyboard = InlineKeyboardMarkup(inline_keyboard=[
             [
-                InlineKeyboardButton(text="✅ نعم، فك الحظر", callback_data=f"confirm:unban:{user_id}"),
-                InlineKeyboardButton(text="❌ إلغاء", callback_data="confirm:cancel")
+                InlineKeyboardButton(text="✅ نعم، فك الحظر", callback_data=CONFIRM_USER_ACTION.pack("unban", user_id)),
+                InlineKeyboardButton(text="❌ إلغاء", callback_data=CONFIRM_CANCEL.pack())
             ]
         ])
         await message.reply(f"⚠️ هل أنت متأكد من فك حظر المستخدم {user['full_name']} ({user_id})؟", reply_markup=keyboard)
-    except Exception as e:
+    except Exception:
+        logging.exception("/unban_ command failed")
         await message.reply("❌ حدث خطأ أثناء معالجة الطلب")
 
-@router.callback_query(F.data.startswith("confirm:"))
-async def handle_confirmations(callback: CallbackQuery):
-    parts = callback.data.split(":")
-    action = parts[1]
-    
-    if action == "cancel":
-        await callback.message.edit_text("❌ تم إلغاء العملية.")
-        return
-        
-    user_id = int(parts[2])
-    user = db.get_user_by_telegram_id(user_id)
+@callback_routes.route(CONFIRM_CANCEL)
+async def cancel_confirmation(callback: CallbackQuery):
+    await callback.message.edit_text("❌ تم إلغاء العملية.")
+
+@callback_routes.route(CONFIRM_USER_ACTION)
+async def handle_confirmations(callback: CallbackQuery, callback_data):
+    action = callback_data.action
+    user_id = callback_data.telegram_id
     
     if action == "delete":
-        db.cursor.execute("DELETE FROM users WHERE telegram_id = ?", (user_id,))
-        db.conn.commit()
-        db.add_admin_log(callback.from_user.id, callback.from_user.full_name, "حذف مستخدم", "إدارة المستخدمين", f"قام بحذف المستخدم {user_id} بعد التأكيد")
+        await db.delete_user(user_id)
+        await db.add_admin_log(callback.from_user.id, callback.from_user.full_name, "حذف مستخدم", "إدارة المستخدمين", f"قام بحذف المستخدم {user_id} بعد التأكيد")
         await callback.message.edit_text(f"✅ تم حذف المستخدم {user_id} بنجاح.")
         
     elif action == "ban":
-        db.set_user_active(user_id, 0)
-        db.add_admin_log(callback.from_user.id, callback.from_user.full_name, "حظر", "إدارة المستخدمين", f"قام بحظر المستخدم {user_id} بعد التأكيد")
+        await db.set_user_active(user_id, 0)
+        await db.add_admin_log(callback.from_user.id, callback.from_user.full_name, "حظر", "إدارة المستخدمين", f"قام بحظر المستخدم {user_id} بعد التأكيد")
         await callback.message.edit_text(f"🚫 تم حظر المستخدم {user_id} بنجاح.")
         
     elif action == "unban":
-        db.set_user_active(user_id, 1)
-        db.add_admin_log(callback.from_user.id, callback.from_user.full_name, "فك حظر", "إدارة المستخدمين", f"قام بفك حظر المستخدم {user_id} بعد التأكيد")
+        await db.set_user_active(user_id, 1)
+        await db.add_admin_log(callback.from_user.id, callback.from_user.full_name, "فك حظر", "إدارة المستخدمين", f"قام بفك حظر المستخدم {user_id} بعد التأكيد")
         await callback.message.edit_text(f"✅ تم فك حظر المستخدم {user_id} بنجاح.")
 
-@router.callback_query(F.data.startswith("button:add"))
-async def add_button_start_handler(callback: CallbackQuery, state: FSMContext):
-    parent_id = None
-    parts = callback.data.split(":")
-    if len(parts) > 2:
-        try:
-            parent_id = int(parts[2])
-        except ValueError:
-            parent_id = None
-    
-    await state.update_data(parent_id=parent_id)
+@callback_routes.route(BUTTON_ADD)
+async def add_button_start_handler(callback: CallbackQuery, state: FSMContext, callback_data):
+    await state.update_data(parent_id=callback_data.parent_id)
     await state.set_state(ManageButtons.waiting_for_text)
     await callback.message.edit_text("أرسل نص الزر الذي سيظهر للمستخدمين:", reply_markup=back_to_admin_button())
 
@@ -394,45 +465,45 @@ async def add_button_start_handler(callback: CallbackQuery, state: FSMContext):
 async def add_button_text_handler(message: Message, state: FSMContext):
     await state.update_data(text=message.text)
     keyboard = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="📝 محتوى (نص، روابط، وسائط)", callback_data="type:content")],
-        [InlineKeyboardButton(text="📁 زر أب (مجلد)", callback_data="type:folder")],
-        [InlineKeyboardButton(text="💬 تواصل (Contact)", callback_data="type:contact")],
-        [InlineKeyboardButton(text="⬅️ رجوع", callback_data="admin:panel")]
+        [InlineKeyboardButton(text="📝 محتوى (نص، روابط، وسائط)", callback_data=BUTTON_TYPE.pack("content"))],
+        [InlineKeyboardButton(text="📁 زر أب (مجلد)", callback_data=BUTTON_TYPE.pack("folder"))],
+        [InlineKeyboardButton(text="💬 تواصل (Contact)", callback_data=BUTTON_TYPE.pack("contact"))],
+        [InlineKeyboardButton(text="⬅️ رجوع", callback_data=ADMIN_PANEL.pack())]
     ])
     await state.set_state(ManageButtons.waiting_for_type)
     await message.answer("اختر نوع الزر:", reply_markup=keyboard)
 
-@router.callback_query(ManageButtons.waiting_for_type)
-async def add_button_type_handler(callback: CallbackQuery, state: FSMContext):
-    btn_type = callback.data.split(":")[-1]
+@callback_routes.route(BUTTON_TYPE, state=ManageButtons.waiting_for_type)
+async def add_button_type_handler(callback: CallbackQuery, state: FSMContext, callback_data):
+    btn_type = callback_data.btn_type
     await state.update_data(type=btn_type)
     
     if btn_type == "contact":
         data = await state.get_data()
-        db.add_button(
+        await db.add_button(
             text=data['text'],
             btn_type="contact",
             content="Support System",
             parent_id=data.get('parent_id'),
             created_by=callback.from_user.id
         )
-        db.add_admin_log(callback.from_user.id, callback.from_user.full_name, "إضافة زر", "إدارة الأزرار", f"إضافة زر تواصل جديد: {data['text']}")
+        await db.add_admin_log(callback.from_user.id, callback.from_user.full_name, "إضافة زر", "إدارة الأزرار", f"إضافة زر تواصل جديد: {data['text']}")
         await state.clear()
-        await callback.message.edit_text("✅ تم إضافة زر التواصل بنجاح!", reply_markup=admin_main_keyboard_markup(callback.from_user.id))
+        await callback.message.edit_text("✅ تم إضافة زر التواصل بنجاح!", reply_markup=await admin_main_keyboard_markup(callback.from_user.id))
         return
 
     if btn_type == "folder":
         data = await state.get_data()
-        db.add_button(
+        await db.add_button(
             text=data['text'],
             btn_type="folder",
             content="Folder",
             parent_id=data.get('parent_id'),
             created_by=callback.from_user.id
         )
-        db.add_admin_log(callback.from_user.id, callback.from_user.full_name, "إضافة زر", "إدارة الأزرار", f"إضافة زر مجلد جديد: {data['text']}")
+        await db.add_admin_log(callback.from_user.id, callback.from_user.full_name, "إضافة زر", "إدارة الأزرار", f"إضافة زر مجلد جديد: {data['text']}")
         await state.clear()
-        await callback.message.edit_text("✅ تم إضافة زر الأب (المجلد) بنجاح!", reply_markup=admin_main_keyboard_markup(callback.from_user.id))
+        await callback.message.edit_text("✅ تم إضافة زر الأب (المجلد) بنجاح!", reply_markup=await admin_main_keyboard_markup(callback.from_user.id))
         return
 
     await state.set_state(ManageButtons.waiting_for_content)
@@ -441,45 +512,34 @@ async def add_button_type_handler(callback: CallbackQuery, state: FSMContext):
 @router.message(ManageButtons.waiting_for_content)
 async def add_button_finish_handler(message: Message, state: FSMContext):
     data = await state.get_data()
-    db.add_button(
+    await db.add_button(
         text=data['text'],
         btn_type=data['type'],
         content=message.text,
         parent_id=data.get('parent_id'),
         created_by=message.from_user.id
     )
-    db.add_admin_log(message.from_user.id, message.from_user.full_name, "إضافة زر", "إدارة الأزرار", f"إضافة زر جديد: {data['text']}")
+    await db.add_admin_log(message.from_user.id, message.from_user.full_name, "إضافة زر", "إدارة الأزرار", f"إضافة زر جديد: {data['text']}")
     await state.clear()
-    await message.answer("✅ تم إضافة الزر بنجاح!", reply_markup=admin_main_keyboard_markup(message.from_user.id))
+    await message.answer("✅ تم إضافة الزر بنجاح!", reply_markup=await admin_main_keyboard_markup(message.from_user.id))
 
-@router.callback_query(F.data.startswith("btn_del:"))
-async def delete_button_handler_view(callback: CallbackQuery):
-    btn_id = int(callback.data.split(":")[-1])
-    btn = db.get_button_by_id(btn_id)
+@callback_routes.route(BUTTON_DELETE)
+async def delete_button_handler_view(callback: CallbackQuery, callback_data):
+    btn_id = callback_data.button_id
+    btn = await db.get_button_by_id(btn_id)
     parent_id = btn['parent_id'] if btn else None
     
     if btn:
-        db.delete_button(btn_id)
-        db.add_admin_log(callback.from_user.id, callback.from_user.full_name, "حذف زر", "إدارة الأزرار", f"حذف الزر: {btn['text']}")
+        await db.delete_button(btn_id)
+        await db.add_admin_log(callback.from_user.id, callback.from_user.full_name, "حذف زر", "إدارة الأزرار", f"حذف الزر: {btn['text']}")
     
     await callback.answer("✅ تم حذف الزر")
-    
-    # Refresh view by calling list_buttons_admin_view with a "mock" callback
-    # Create a simple class to mimic the callback with new data
-    class MockCallback:
-        def __init__(self, original_callback, new_data):
-            self.message = original_callback.message
-            self.from_user = original_callback.from_user
-            self.data = new_data
-            self.answer = original_callback.answer
-            
-    mock_cb = MockCallback(callback, f"admin:buttons_list:{parent_id}" if parent_id else "admin:buttons_list")
-    await list_buttons_admin_view(mock_cb)
+    await render_buttons_list(callback, parent_id)
 
-@router.callback_query(F.data.startswith("btn_edit:"))
-async def edit_button_handler(callback: CallbackQuery, state: FSMContext):
-    btn_id = int(callback.data.split(":")[-1])
-    btn = db.get_button_by_id(btn_id)
+@callback_routes.route(BUTTON_EDIT)
+async def edit_button_handler(callback: CallbackQuery, state: FSMContext, callback_data):
+    btn_id = callback_data.button_id
+    btn = await db.get_button_by_id(btn_id)
     
     if not btn:
         await callback.answer("الزر غير موجود")
@@ -487,10 +547,10 @@ async def edit_button_handler(callback: CallbackQuery, state: FSMContext):
 
     await state.update_data(edit_btn_id=btn_id)
     keyboard = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="📂 الأزرار الفرعية (داخل هذا الزر)", callback_data=f"admin:buttons_list:{btn_id}")],
-        [InlineKeyboardButton(text="✏️ تغيير الاسم", callback_data=f"btn_edit_field:text:{btn_id}")],
-        [InlineKeyboardButton(text="📝 تغيير المحتوى", callback_data=f"btn_edit_field:content:{btn_id}")],
-        [InlineKeyboardButton(text="⬅️ رجوع", callback_data=f"admin:buttons_list:{btn['parent_id']}" if btn['parent_id'] else "admin:buttons_list")]
+        [InlineKeyboardButton(text="📂 الأزرار الفرعية (داخل هذا الزر)", callback_data=BUTTONS_LIST.pack(btn_id))],
+        [InlineKeyboardButton(text="✏️ تغيير الاسم", callback_data=BUTTON_EDIT_FIELD.pack("text", btn_id))],
+        [InlineKeyboardButton(text="📝 تغيير المحتوى", callback_data=BUTTON_EDIT_FIELD.pack("content", btn_id))],
+        [InlineKeyboardButton(text="⬅️ رجوع", callback_data=BUTTONS_LIST.pack(btn['parent_id']))]
     ])
     
     await callback.message.edit_text(
@@ -501,11 +561,10 @@ async def edit_button_handler(callback: CallbackQuery, state: FSMContext):
         reply_markup=keyboard
     )
 
-@router.callback_query(F.data.startswith("btn_edit_field:"))
-async def edit_button_field_handler(callback: CallbackQuery, state: FSMContext):
-    parts = callback.data.split(":")
-    field = parts[1]
-    btn_id = int(parts[2])
+@callback_routes.route(BUTTON_EDIT_FIELD)
+async def edit_button_field_handler(callback: CallbackQuery, state: FSMContext, callback_data):
+    field = callback_data.field
+    btn_id = callback_data.button_id
     
     await state.update_data(edit_field=field, edit_btn_id=btn_id)
     
@@ -514,7 +573,7 @@ async def edit_button_field_handler(callback: CallbackQuery, state: FSMContext):
         await callback.message.edit_text("أرسل الاسم الجديد للزر:", reply_markup=back_to_admin_button())
     else:
         await state.set_state(ManageButtons.waiting_for_new_content)
-        btn = db.get_button_by_id(btn_id)
+        btn = await db.get_button_by_id(btn_id)
         msg = "أرسل المحتوى الجديد للزر:"
         if btn['type'] == 'url':
             msg = "أرسل الرابط الجديد (http://...):"
@@ -529,9 +588,9 @@ async def process_new_text(message: Message, state: FSMContext):
     btn_id = data.get("edit_btn_id")
     new_text = message.text.strip()
     
-    db.update_button(btn_id, text=new_text)
+    await db.update_button(btn_id, text=new_text)
     await state.clear()
-    await message.answer(f"✅ تم تغيير اسم الزر إلى: {new_text}", reply_markup=admin_main_keyboard_markup(message.from_user.id))
+    await message.answer(f"✅ تم تغيير اسم الزر إلى: {new_text}", reply_markup=await admin_main_keyboard_markup(message.from_user.id))
 
 @router.message(ManageButtons.waiting_for_new_content)
 async def process_new_content(message: Message, state: FSMContext):
@@ -539,14 +598,14 @@ async def process_new_content(message: Message, state: FSMContext):
     btn_id = data.get("edit_btn_id")
     new_content = message.text.strip()
     
-    db.update_button(btn_id, content=new_content)
+    await db.update_button(btn_id, content=new_content)
     await state.clear()
-    await message.answer("✅ تم تحديث محتوى الزر بنجاح!", reply_markup=admin_main_keyboard_markup(message.from_user.id))
+    await message.answer("✅ تم تحديث محتوى الزر بنجاح!", reply_markup=await admin_main_keyboard_markup(message.from_user.id))
 
 # ======================
 # Add Supervisor Handlers
 # ======================
-@router.callback_query(F.data == "manager:add")
+@callback_routes.route(MANAGER_ADD)
 async def add_manager_start_view(callback: CallbackQuery, state: FSMContext):
     await state.set_state(AddSupervisor.waiting_for_username)
     await callback.message.edit_text(
@@ -566,16 +625,16 @@ async def add_manager_finish_view(message: Message, state: FSMContext, bot: Bot)
         await message.answer("❌ لم يتم العثور على مستخدم بهذا المعرف", reply_markup=back_to_admin_button())
         return
     telegram_id = chat.id
-    db.add_user(telegram_id=telegram_id, role="supervisor")
+    await db.add_user(telegram_id=telegram_id, role="supervisor")
     await state.clear()
     await message.answer(
         f"✅ تم إضافة المشرف @{username} بنجاح",
-        reply_markup=admin_main_keyboard_markup(message.from_user.id)
+        reply_markup=await admin_main_keyboard_markup(message.from_user.id)
     )
 
-@router.callback_query(F.data == "manager:list")
+@callback_routes.route(MANAGER_LIST)
 async def list_managers_view(callback: CallbackQuery):
-    admins = db.get_admins()
+    admins = await db.get_admins()
     if not admins:
         await callback.message.edit_text(
             "لا يوجد مشرفون حاليًا",
@@ -587,46 +646,45 @@ async def list_managers_view(callback: CallbackQuery):
         keyboard.append([
             InlineKeyboardButton(
                 text=f"👤 {admin['telegram_id']}",
-                callback_data=f"manager:view:{admin['telegram_id']}"
+                callback_data=MANAGER_VIEW.pack(admin['telegram_id'])
             )
         ])
     keyboard.append(
-        [InlineKeyboardButton(text="⬅️ رجوع", callback_data="admin:managers")]
+        [InlineKeyboardButton(text="⬅️ رجوع", callback_data=MANAGERS.pack())]
     )
     await callback.message.edit_text(
         "📋 قائمة المشرفين:",
         reply_markup=InlineKeyboardMarkup(inline_keyboard=keyboard)
     )
 
-@router.callback_query(F.data.startswith("manager:perms:"))
-async def edit_manager_perms(callback: CallbackQuery):
-    parts = callback.data.split(":")
-    target_id = int(parts[2])
+@callback_routes.route(MANAGER_PERMS)
+async def edit_manager_perms(callback: CallbackQuery, callback_data):
+    target_id = callback_data.telegram_id
     
-    if not is_super_admin_user(callback.from_user.id):
+    if not await is_super_admin_user(callback.from_user.id):
         await callback.answer("عذراً، هذا الإجراء متاح للأدمن الأساسي فقط.", show_alert=True)
         return
 
     # Toggle if action is specified
-    if len(parts) > 3:
-        feature_id = parts[3]
-        current_perms = db.get_supervisor_permissions(target_id)
+    if callback_data.feature is not None:
+        feature_id = callback_data.feature
+        current_perms = await db.get_supervisor_permissions(target_id)
         granted = feature_id not in current_perms
-        db.set_supervisor_permission(target_id, feature_id, granted)
+        await db.set_supervisor_permission(target_id, feature_id, granted)
         
         # Log action
         action_text = "تفعيل" if granted else "تعطيل"
-        db.add_admin_log(callback.from_user.id, callback.from_user.full_name, f"{action_text} صلاحية {feature_id}", "إدارة المشرفين", f"للمشرف {target_id}")
+        await db.add_admin_log(callback.from_user.id, callback.from_user.full_name, f"{action_text} صلاحية {feature_id}", "إدارة المشرفين", f"للمشرف {target_id}")
 
-    features = db.get_features()
-    user_perms = db.get_supervisor_permissions(target_id)
+    features = await db.get_features()
+    user_perms = await db.get_supervisor_permissions(target_id)
     
     keyboard = []
     for f in features:
         status = "✅" if f['id'] in user_perms else "❌"
-        keyboard.append([InlineKeyboardButton(text=f"{status} {f['name_ar']}", callback_data=f"manager:perms:{target_id}:{f['id']}")])
+        keyboard.append([InlineKeyboardButton(text=f"{status} {f['name_ar']}", callback_data=MANAGER_PERMS.pack(target_id, f['id']))])
     
-    keyboard.append([InlineKeyboardButton(text="⬅️ رجوع", callback_data=f"manager:view:{target_id}")])
+    keyboard.append([InlineKeyboardButton(text="⬅️ رجوع", callback_data=MANAGER_VIEW.pack(target_id))])
     
     await callback.message.edit_text(
         f"⚙️ **تعديل صلاحيات المشرف: {target_id}**\nاضغط على الصلاحية للتفعيل أو التعطيل:",
@@ -634,77 +692,78 @@ async def edit_manager_perms(callback: CallbackQuery):
         parse_mode="Markdown"
     )
 
-@router.callback_query(F.data.startswith("manager:delete:"))
-async def delete_manager_confirm(callback: CallbackQuery):
-    if not is_super_admin_user(callback.from_user.id):
+@callback_routes.route(MANAGER_DELETE)
+async def delete_manager_confirm(callback: CallbackQuery, callback_data):
+    if not await is_super_admin_user(callback.from_user.id):
         await callback.answer("للأدمن الأساسي فقط", show_alert=True)
         return
     
-    target_id = int(callback.data.split(":")[-1])
-    user = db.get_user_by_telegram_id(target_id)
+    target_id = callback_data.telegram_id
+    user = await db.get_user_by_telegram_id(target_id)
     keyboard = InlineKeyboardMarkup(inline_keyboard=[
         [
-            InlineKeyboardButton(text="✅ نعم، احذفه", callback_data=f"manager:del_final:{target_id}"),
-            InlineKeyboardButton(text="❌ إلغاء", callback_data=f"manager:view:{target_id}")
+            InlineKeyboardButton(text="✅ نعم، احذفه", callback_data=MANAGER_DELETE_FINAL.pack(target_id)),
+            InlineKeyboardButton(text="❌ إلغاء", callback_data=MANAGER_VIEW.pack(target_id))
         ]
     ])
     await callback.message.edit_text(f"⚠️ هل أنت متأكد من حذف المشرف {user['telegram_id']} نهائياً؟", reply_markup=keyboard)
 
-@router.callback_query(F.data.startswith("manager:del_final:"))
-async def manager_del_final(callback: CallbackQuery):
-    if not is_super_admin_user(callback.from_user.id):
+@callback_routes.route(MANAGER_DELETE_FINAL)
+async def manager_del_final(callback: CallbackQuery, callback_data):
+    if not await is_super_admin_user(callback.from_user.id):
         await callback.answer("للأدمن الأساسي فقط", show_alert=True)
         return
     
-    target_id = int(callback.data.split(":")[-1])
-    db.delete_supervisor(target_id)
-    db.add_admin_log(callback.from_user.id, callback.from_user.full_name, "حذف مشرف", "إدارة المشرفين", f"حذف المشرف {target_id} نهائياً")
+    target_id = callback_data.telegram_id
+    await db.delete_supervisor(target_id)
+    await db.add_admin_log(callback.from_user.id, callback.from_user.full_name, "حذف مشرف", "إدارة المشرفين", f"حذف المشرف {target_id} نهائياً")
     await callback.answer("✅ تم حذف المشرف نهائياً")
     await list_managers_view(callback)
 
 def manager_control_keyboard_markup(telegram_id: int, is_active: int, is_super: bool):
     buttons = []
     if is_active:
-        buttons.append([InlineKeyboardButton(text="⛔ تعطيل المؤقت", callback_data=f"manager:disable:{telegram_id}")])
+        buttons.append([InlineKeyboardButton(text="⛔ تعطيل المؤقت", callback_data=MANAGER_SET_ACTIVE.pack(telegram_id, False))])
     else:
-        buttons.append([InlineKeyboardButton(text="✅ تفعيل", callback_data=f"manager:enable:{telegram_id}")])
+        buttons.append([InlineKeyboardButton(text="✅ تفعيل", callback_data=MANAGER_SET_ACTIVE.pack(telegram_id, True))])
     
     if is_super:
-        buttons.append([InlineKeyboardButton(text="⚙️ تعديل الصلاحيات", callback_data=f"manager:perms:{telegram_id}")])
-        buttons.append([InlineKeyboardButton(text="🗑️ حذف نهائي", callback_data=f"manager:delete:{telegram_id}")])
+        buttons.append([InlineKeyboardButton(text="⚙️ تعديل الصلاحيات", callback_data=MANAGER_PERMS.pack(telegram_id))])
+        buttons.append([InlineKeyboardButton(text="🗑️ حذف نهائي", callback_data=MANAGER_DELETE.pack(telegram_id))])
         
-    buttons.append([InlineKeyboardButton(text="⬅️ رجوع", callback_data="manager:list")])
+    buttons.append([InlineKeyboardButton(text="⬅️ رجوع", callback_data=MANAGER_LIST.pack())])
     return InlineKeyboardMarkup(inline_keyboard=buttons)
 
-@router.callback_query(F.data.startswith("manager:view:"))
-async def manager_view_handler(callback: CallbackQuery):
-    telegram_id = int(callback.data.split(":")[-1])
-    user = db.get_user_by_telegram_id(telegram_id)
-    is_super = is_super_admin_user(callback.from_user.id)
+async def show_manager(callback: CallbackQuery, telegram_id):
+    user = await db.get_user_by_telegram_id(telegram_id)
+    is_super = await is_super_admin_user(callback.from_user.id)
     await callback.message.edit_text(
         f"👤 المشرف: {telegram_id}\nالحالة: {'مفعل' if user['is_active'] else 'معطل'}\nالرتبة: {user['role']}",
         reply_markup=manager_control_keyboard_markup(telegram_id, user["is_active"], is_super)
     )
 
-@router.callback_query(F.data.startswith("manager:disable:"))
-async def disable_manager_handler(callback: CallbackQuery):
-    telegram_id = int(callback.data.split(":")[-1])
-    db.set_user_active(telegram_id, 0)
-    await callback.answer("تم التعطيل")
-    await manager_view_handler(callback)
+@callback_routes.route(MANAGER_VIEW)
+async def manager_view_handler(callback: CallbackQuery, callback_data):
+    await show_manager(callback, callback_data.telegram_id)
+
+@callback_routes.route(MANAGER_SET_ACTIVE)
+async def set_manager_active_handler(callback: CallbackQuery, callback_data):
+    telegram_id = callback_data.telegram_id
+    await db.set_user_active(telegram_id, 1 if callback_data.active else 0)
+    await callback.answer("تم التفعيل" if callback_data.active else "تم التعطيل")
+    await show_manager(callback, telegram_id)
 
 # ======================
 # Support Reply Handlers
 # ======================
-@router.callback_query(F.data.startswith("support:reply:"))
-async def support_reply_start(callback: CallbackQuery, state: FSMContext):
-    parts = callback.data.split(":")
-    user_id = int(parts[2])
-    button_id = int(parts[3]) if len(parts) > 3 else None
+@callback_routes.route(SUPPORT_REPLY)
+async def support_reply_start(callback: CallbackQuery, state: FSMContext, callback_data):
+    user_id = callback_data.user_id
+    button_id = callback_data.button_id
     
     await state.update_data(reply_to_user_id=user_id, reply_button_id=button_id)
     await state.set_state(SupportState.waiting_for_reply)
-    await callback.message.answer(f"أرسل ردك للمستخدم ({user_id}):", reply_markup=InlineKeyboardMarkup(inline_keyboard=[[InlineKeyboardButton(text="إلغاء", callback_data="admin:panel")]]))
+    await callback.message.answer(f"أرسل ردك للمستخدم ({user_id}):", reply_markup=InlineKeyboardMarkup(inline_keyboard=[[InlineKeyboardButton(text="إلغاء", callback_data=ADMIN_PANEL.pack())]]))
     await callback.answer()
 
 @router.message(SupportState.waiting_for_reply)
@@ -716,8 +775,8 @@ async def support_reply_process(message: Message, state: FSMContext, bot: Bot):
     
     try:
         await bot.send_message(user_id, f"✉️ **رد من الإدارة:**\n\n{message.text}", parse_mode="Markdown")
-        db.add_support_message(user_id, message.text, is_from_admin=1, admin_id=message.from_user.id, button_id=button_id, admin_name=admin_name)
-        db.add_admin_log(message.from_user.id, admin_name, "الرد على مستخدم", "سجل المراسلات", f"رد على المستخدم {user_id}")
+        await db.add_support_message(user_id, message.text, is_from_admin=1, admin_id=message.from_user.id, button_id=button_id, admin_name=admin_name)
+        await db.add_admin_log(message.from_user.id, admin_name, "الرد على مستخدم", "سجل المراسلات", f"رد على المستخدم {user_id}")
         await message.answer("✅ تم إرسال الرد بنجاح.")
     except Exception as e:
         await message.answer(f"❌ فشل إرسال الرد: {e}")
@@ -727,77 +786,124 @@ async def support_reply_process(message: Message, state: FSMContext, bot: Bot):
 # ======================
 # Logs Handlers
 # ======================
-@router.callback_query(F.data == "admin:logs")
+@callback_routes.route(LOG_SECTIONS)
 async def show_logs_categories(callback: CallbackQuery):
-    contact_buttons = db.get_contact_buttons()
+    contact_buttons = await db.get_contact_buttons()
     if not contact_buttons:
         await callback.message.edit_text("❌ لا توجد أزرار تواصل مبرمجة حالياً.", reply_markup=back_to_admin_button())
         return
 
     keyboard = []
     for btn in contact_buttons:
-        keyboard.append([InlineKeyboardButton(text=f"📂 {btn['text']}", callback_data=f"logs:view:{btn['id']}")])
+        keyboard.append([InlineKeyboardButton(text=f"📂 {btn['text']}", callback_data=LOG_PAGE.pack(btn['id']))])
     
-    keyboard.append([InlineKeyboardButton(text="⬅️ رجوع", callback_data="admin:panel")])
+    keyboard.append([InlineKeyboardButton(text="⬅️ رجوع", callback_data=ADMIN_PANEL.pack())])
     
     await callback.message.edit_text("📜 اختر القسم لعرض سجل المراسلات:", reply_markup=InlineKeyboardMarkup(inline_keyboard=keyboard))
 
-@router.callback_query(F.data.startswith("logs:view:"))
-async def view_section_logs(callback: CallbackQuery):
-    parts = callback.data.split(":")
-    button_id = int(parts[2])
-    
-    messages = db.get_messages_by_button(button_id)
-    btn = db.get_button_by_id(button_id)
-    
+# Telegram rejects message texts longer than this (counted in UTF-16 units)
+MESSAGE_LIMIT = 4096
+SUPPORT_LOG_PAGE_SIZE = 20
+
+def telegram_length(text):
+    return len(text.encode("utf-16-le")) // 2
+
+def format_support_message(msg, max_length=None):
+    sender = "🛠️ الإدارة"
+    if not msg['is_from_admin']:
+        username_str = f" (@{msg['username']})" if msg['username'] else ""
+        sender = f"👤 {msg['full_name']}{username_str}"
+
+    head = f"<b>{html.escape(sender)}:</b>\n"
+    footer = (
+        f"📅 <code>{msg['timestamp']}</code>\n"
+        f"❌ /del_{msg['id']}\n"
+        "────────────────\n"
+    )
+    text = msg['message_text'] or ""
+    # Use HTML escaping for better stability
+    body = html.escape(text)
+    if max_length is not None:
+        room = max_length - telegram_length(head + footer) - 2
+        if telegram_length(body) > room:
+            # Longest prefix of the raw text that still fits once escaped,
+            # so no HTML entity is split
+            low, high = 0, len(text)
+            while low < high:
+                mid = (low + high + 1) // 2
+                if telegram_length(html.escape(text[:mid])) <= room:
+                    low = mid
+                else:
+                    high = mid - 1
+            body = html.escape(text[:low]) + "…"
+    return f"{head}{body}\n{footer}"
+
+async def render_section_logs(callback: CallbackQuery, button_id, before_id=None, after_id=None):
+    btn = await db.get_button_by_id(button_id)
+    btn_text = btn['text'] if btn else 'غير معروف'
+    messages = await db.get_messages_page(button_id, before_id, after_id, SUPPORT_LOG_PAGE_SIZE)
+
     if not messages:
+        if before_id is not None or after_id is not None:
+            # The page was emptied meanwhile; show the newest one instead
+            return await render_section_logs(callback, button_id)
         await callback.message.edit_text(
-            f"📜 سجل المراسلات لـ {btn['text'] if btn else 'غير معروف'}:\n\nلا توجد رسائل في هذا القسم حالياً.",
+            f"📜 سجل المراسلات لـ {btn_text}:\n\nلا توجد رسائل في هذا القسم حالياً.",
             reply_markup=back_to_admin_button()
         )
         return
 
-    import html
-    logs_text = f"📜 <b>سجل المراسلات: {html.escape(btn['text'])}</b>\n\n"
-    keyboard = []
-    
+    header = f"📜 <b>سجل المراسلات: {html.escape(btn_text)}</b>\n\n"
+    budget = MESSAGE_LIMIT - telegram_length(header)
+
+    # Fill the page from the cursor outwards until the next message would
+    # not fit; the first one is shortened if it cannot fit on its own.
+    page = []
     for msg in messages:
-        sender = "🛠️ الإدارة"
-        if not msg['is_from_admin']:
-            username_str = f" (@{msg['username']})" if msg['username'] else ""
-            sender = f"👤 {msg['full_name']}{username_str}"
-        
-        # Use HTML escaping for better stability
-        safe_msg = html.escape(msg['message_text'])
-        
-        logs_text += f"<b>{html.escape(sender)}:</b>\n{safe_msg}\n"
-        logs_text += f"📅 <code>{msg['timestamp']}</code>\n"
-        logs_text += f"❌ /del_{msg['id']}\n"
-        logs_text += "────────────────\n"
-    
+        block = format_support_message(msg, None if page else budget)
+        if telegram_length(block) > budget:
+            break
+        page.append((msg, block))
+        budget -= telegram_length(block)
+    if after_id is None:
+        page.reverse()
+
+    first, last = page[0][0], page[-1][0]
+    has_older, has_newer = await db.has_messages_around(button_id, first['id'], last['id'])
+    logs_text = header + "".join(block for _, block in page)
+    keyboard = []
+
+    # Navigation buttons
+    nav_row = []
+    if has_older:
+        nav_row.append(InlineKeyboardButton(text="⬅️ أقدم", callback_data=LOG_PAGE.pack(button_id, before_id=first['id'])))
+    if has_newer:
+        nav_row.append(InlineKeyboardButton(text="أحدث ➡️", callback_data=LOG_PAGE.pack(button_id, after_id=last['id'])))
+    if nav_row:
+        keyboard.append(nav_row)
+
     # Add clear all button
-    keyboard.append([InlineKeyboardButton(text="🗑️ مسح الكل", callback_data=f"logs:clear_all:{button_id}")])
-    
+    keyboard.append([InlineKeyboardButton(text="🗑️ مسح الكل", callback_data=LOG_CLEAR.pack(button_id))])
+
     # Add reply button for the last user if the last message was from a user
-    last_msg = messages[-1]
-    if not last_msg['is_from_admin']:
-        keyboard.append([InlineKeyboardButton(text="💬 رد على آخر رسالة", callback_data=f"support:reply:{last_msg['user_id']}:{button_id}")])
-    
-    keyboard.append([InlineKeyboardButton(text="⬅️ رجوع", callback_data="admin:logs")])
-    
-    # Limit message length
-    if len(logs_text) > 4000:
-        logs_text = logs_text[-4000:]
-        
+    if not has_newer and not last['is_from_admin']:
+        keyboard.append([InlineKeyboardButton(text="💬 رد على آخر رسالة", callback_data=SUPPORT_REPLY.pack(last['user_id'], button_id))])
+
+    keyboard.append([InlineKeyboardButton(text="⬅️ رجوع", callback_data=LOG_SECTIONS.pack())])
+
     await callback.message.edit_text(logs_text, reply_markup=InlineKeyboardMarkup(inline_keyboard=keyboard), parse_mode="HTML")
 
-@router.callback_query(F.data == "admin:admin_logs")
+@callback_routes.route(LOG_PAGE)
+async def view_section_logs(callback: CallbackQuery, callback_data):
+    await render_section_logs(callback, callback_data.button_id, callback_data.before_id, callback_data.after_id)
+
+@callback_routes.route(ADMIN_LOGS)
 async def show_admin_logs(callback: CallbackQuery):
-    if not is_super_admin_user(callback.from_user.id):
+    if not await is_super_admin_user(callback.from_user.id):
         await callback.answer("للأدمن الأساسي فقط", show_alert=True)
         return
         
-    logs = db.get_admin_logs(limit=20)
+    logs = await db.get_admin_logs(limit=20)
     if not logs:
         await callback.message.edit_text("🛡️ سجل المشرفين فارغ حالياً.", reply_markup=back_to_admin_button())
         return
@@ -824,22 +930,22 @@ async def show_admin_logs(callback: CallbackQuery):
         logs_text = logs_text[:4000]
 
     keyboard = [
-        [InlineKeyboardButton(text="🗑️ مسح السجل بالكامل", callback_data="admin:confirm_clear_logs")],
-        [InlineKeyboardButton(text="⬅️ رجوع", callback_data="admin:panel")]
+        [InlineKeyboardButton(text="🗑️ مسح السجل بالكامل", callback_data=ADMIN_LOGS_CLEAR.pack())],
+        [InlineKeyboardButton(text="⬅️ رجوع", callback_data=ADMIN_PANEL.pack())]
     ]
 
     await callback.message.edit_text(logs_text, reply_markup=InlineKeyboardMarkup(inline_keyboard=keyboard), parse_mode="HTML")
 
-@router.callback_query(F.data == "admin:confirm_clear_logs")
+@callback_routes.route(ADMIN_LOGS_CLEAR)
 async def confirm_clear_logs(callback: CallbackQuery):
-    if not is_super_admin_user(callback.from_user.id):
+    if not await is_super_admin_user(callback.from_user.id):
         await callback.answer("للأدمن الأساسي فقط", show_alert=True)
         return
         
     keyboard = InlineKeyboardMarkup(inline_keyboard=[
         [
-            InlineKeyboardButton(text="✅ نعم، امسح الكل", callback_data="admin:clear_all_logs_final"),
-            InlineKeyboardButton(text="❌ تراجع", callback_data="admin:admin_logs")
+            InlineKeyboardButton(text="✅ نعم، امسح الكل", callback_data=ADMIN_LOGS_CLEAR_FINAL.pack()),
+            InlineKeyboardButton(text="❌ تراجع", callback_data=ADMIN_LOGS.pack())
         ]
     ])
     
@@ -849,45 +955,45 @@ async def confirm_clear_logs(callback: CallbackQuery):
         parse_mode="Markdown"
     )
 
-@router.callback_query(F.data == "admin:clear_all_logs_final")
+@callback_routes.route(ADMIN_LOGS_CLEAR_FINAL)
 async def clear_all_logs_final(callback: CallbackQuery):
-    if not is_super_admin_user(callback.from_user.id):
+    if not await is_super_admin_user(callback.from_user.id):
         await callback.answer("للأدمن الأساسي فقط", show_alert=True)
         return
         
-    db.clear_all_admin_logs()
-    db.add_admin_log(callback.from_user.id, callback.from_user.full_name, "مسح السجل", "🛡️ سجل المشرفين", "قام بمسح سجل العمليات بالكامل")
+    await db.clear_all_admin_logs()
+    await db.add_admin_log(callback.from_user.id, callback.from_user.full_name, "مسح السجل", "🛡️ سجل المشرفين", "قام بمسح سجل العمليات بالكامل")
     
     await callback.answer("✅ تم مسح السجل بالكامل بنجاح", show_alert=True)
     await show_admin_logs(callback)
 
-@router.callback_query(F.data.startswith("logs:clear_all:"))
-async def clear_all_logs_confirm(callback: CallbackQuery):
-    button_id = int(callback.data.split(":")[-1])
+@callback_routes.route(LOG_CLEAR)
+async def clear_all_logs_confirm(callback: CallbackQuery, callback_data):
+    button_id = callback_data.button_id
     keyboard = InlineKeyboardMarkup(inline_keyboard=[
         [
-            InlineKeyboardButton(text="✅ نعم، امسح سجل المراسلات", callback_data=f"logs:clear_all_final:{button_id}"),
-            InlineKeyboardButton(text="❌ إلغاء", callback_data=f"logs:view:{button_id}")
+            InlineKeyboardButton(text="✅ نعم، امسح سجل المراسلات", callback_data=LOG_CLEAR_FINAL.pack(button_id)),
+            InlineKeyboardButton(text="❌ إلغاء", callback_data=LOG_PAGE.pack(button_id))
         ]
     ])
     await callback.message.edit_text("⚠️ هل أنت متأكد من مسح جميع الرسائل في هذا القسم؟", reply_markup=keyboard)
 
-@router.callback_query(F.data.startswith("logs:clear_all_final:"))
-async def clear_all_logs_final_exec(callback: CallbackQuery):
-    button_id = int(callback.data.split(":")[-1])
-    db.clear_support_messages_by_button(button_id)
+@callback_routes.route(LOG_CLEAR_FINAL)
+async def clear_all_logs_final_exec(callback: CallbackQuery, callback_data):
+    button_id = callback_data.button_id
+    await db.clear_support_messages_by_button(button_id)
     await callback.answer("✅ تم مسح جميع الرسائل بنجاح")
     await callback.message.edit_text("📜 تم مسح السجل بالكامل.", reply_markup=back_to_admin_button())
 
-@router.message(F.text.startswith("/del_log_"))
+@text_routes.prefix("/del_log_")
 async def delete_single_admin_log_handler(message: Message):
-    if not is_super_admin_user(message.from_user.id):
+    if not await is_super_admin_user(message.from_user.id):
         return
     
     try:
         parts = message.text.split("_")
         log_id = int(parts[-1])
-        log = db.cursor.execute("SELECT * FROM admin_logs WHERE id = ?", (log_id,)).fetchone()
+        log = await db.get_admin_log_by_id(log_id)
         
         if not log:
             await message.answer("❌ السجل غير موجود.")
@@ -895,64 +1001,60 @@ async def delete_single_admin_log_handler(message: Message):
 
         keyboard = InlineKeyboardMarkup(inline_keyboard=[
             [
-                InlineKeyboardButton(text="✅ نعم، احذف", callback_data=f"confirm_del_log:{log_id}"),
-                InlineKeyboardButton(text="❌ إلغاء", callback_data="confirm:cancel")
+                InlineKeyboardButton(text="✅ نعم، احذف", callback_data=CONFIRM_DELETE_ADMIN_LOG.pack(log_id)),
+                InlineKeyboardButton(text="❌ إلغاء", callback_data=CONFIRM_CANCEL.pack())
             ]
         ])
         await message.reply(f"⚠️ هل أنت متأكد من حذف هذا السجل؟\n📝 {log['action_type']} - {log['details']}", reply_markup=keyboard)
-    except Exception:
+    except (ValueError, IndexError):
         await message.answer("❌ أمر غير صالح.")
 
-@router.callback_query(F.data.startswith("confirm_del_log:"))
-async def confirm_del_log_callback(callback: CallbackQuery):
-    log_id = int(callback.data.split(":")[-1])
-    db.delete_admin_log(log_id)
+@callback_routes.route(CONFIRM_DELETE_ADMIN_LOG)
+async def confirm_del_log_callback(callback: CallbackQuery, callback_data):
+    log_id = callback_data.log_id
+    await db.delete_admin_log(log_id)
     await callback.message.edit_text(f"✅ تم حذف السجل رقم {log_id} بنجاح.")
     await callback.answer()
 
-@router.message(F.text.startswith("/del_"))
+@text_routes.prefix("/del_")
 async def delete_single_log_command(message: Message):
-    if not is_admin_user(message.from_user.id):
-        return
-    
-    if message.text.startswith("/del_log_"):
+    if not await is_admin_user(message.from_user.id):
         return
 
     try:
         parts = message.text.split("_")
         msg_id = int(parts[-1])
-        msg = db.get_message_by_id(msg_id)
+        msg = await db.get_message_by_id(msg_id)
         if not msg:
             await message.answer("❌ الرسالة غير موجودة.")
             return
 
         keyboard = InlineKeyboardMarkup(inline_keyboard=[
             [
-                InlineKeyboardButton(text="✅ نعم، احذف", callback_data=f"confirm_del_msg:{msg_id}"),
-                InlineKeyboardButton(text="❌ إلغاء", callback_data="confirm:cancel")
+                InlineKeyboardButton(text="✅ نعم، احذف", callback_data=CONFIRM_DELETE_MESSAGE.pack(msg_id)),
+                InlineKeyboardButton(text="❌ إلغاء", callback_data=CONFIRM_CANCEL.pack())
             ]
         ])
         await message.reply(f"⚠️ هل أنت متأكد من حذف هذه الرسالة؟\n📝 {msg['message_text'][:50]}...", reply_markup=keyboard)
-    except Exception:
+    except (ValueError, IndexError):
         await message.answer("❌ أمر غير صالح.")
 
-@router.callback_query(F.data.startswith("confirm_del_msg:"))
-async def confirm_del_msg_callback(callback: CallbackQuery):
-    msg_id = int(callback.data.split(":")[-1])
-    db.delete_support_message(msg_id)
+@callback_routes.route(CONFIRM_DELETE_MESSAGE)
+async def confirm_del_msg_callback(callback: CallbackQuery, callback_data):
+    msg_id = callback_data.message_id
+    await db.delete_support_message(msg_id)
     await callback.message.edit_text(f"✅ تم حذف الرسالة بنجاح.")
     await callback.answer()
 
 # ======================
 # Broadcast Handlers
 # ======================
-@router.callback_query(F.data == "admin:broadcast")
+@callback_routes.route(BROADCAST)
 async def broadcast_start_handler(callback: CallbackQuery, state: FSMContext):
-    if not is_super_admin_user(callback.from_user.id):
+    if not await is_super_admin_user(callback.from_user.id):
         await callback.answer("للأدمن الأساسي فقط", show_alert=True)
         return
     
-    from states import BroadcastState
     await state.set_state(BroadcastState.waiting_for_message)
     await callback.message.edit_text(
         "📢 **قسم الإذاعة العامة**\n\nأرسل الرسالة التي تريد توجيهها لجميع مستخدمي البوت:",
@@ -960,42 +1062,18 @@ async def broadcast_start_handler(callback: CallbackQuery, state: FSMContext):
         parse_mode="Markdown"
     )
 
-@router.message(F.text, F.state == "BroadcastState:waiting_for_message")
+@router.message(BroadcastState.waiting_for_message, F.text)
 async def broadcast_process_handler(message: Message, state: FSMContext, bot: Bot):
-    from states import BroadcastState
-    current_state = await state.get_state()
-    if current_state != BroadcastState.waiting_for_message.state:
-        return
-
     broadcast_text = message.text
     await state.clear()
     
-    # Get all users from DB
-    db.cursor.execute("SELECT telegram_id FROM users WHERE role = 'user'")
-    users = db.cursor.fetchall()
-    
-    if not users:
+    total = await db.get_broadcast_recipients_count()
+    if not total:
         await message.answer("❌ لا يوجد مستخدمون لإرسال الرسالة إليهم.")
         return
 
-    status_msg = await message.answer(f"⏳ جاري بدء الإذاعة لـ {len(users)} مستخدم...")
+    status_msg = await message.answer(f"⏳ جاري بدء الإذاعة لـ {total} مستخدم...")
     
-    success_count = 0
-    fail_count = 0
-    
-    for user in users:
-        try:
-            await bot.send_message(user['telegram_id'], f"📢 **إعلان من الإدارة:**\n\n{broadcast_text}", parse_mode="Markdown")
-            success_count += 1
-        except Exception:
-            fail_count += 1
-            
-    db.add_admin_log(message.from_user.id, message.from_user.full_name, "إذاعة عامة", "النظام", f"تم الإرسال لـ {success_count} مستخدم (فشل {fail_count})")
-    
-    await status_msg.edit_text(
-        f"✅ **اكتملت عملية الإذاعة**\n\n"
-        f"🔹 تم الإرسال بنجاح: `{success_count}`\n"
-        f"🔸 فشل الإرسال (بوت محظور): `{fail_count}`",
-        reply_markup=admin_main_keyboard_markup(message.from_user.id),
-        parse_mode="Markdown"
-    )
+    # The engine sends in the background (rate limited, resumable), so this
+    # update finishes right away; the status message is edited with progress.
+    await broadcasts.start_job(bot, message.from_user.id, message.from_user.full_name, broadcast_text, total, status_msg)
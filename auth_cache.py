@@ -0,0 +1,116 @@
+# auth_cache.py
+
+from typing import NamedTuple
+
+from database import db
+
+
+STAFF_ROLES = ("super_admin", "admin", "supervisor")
+FULL_ACCESS_ROLES = ("super_admin", "admin")
+
+
+class AuthSnapshot(NamedTuple):
+    role: str
+    is_active: int
+    permissions: int  # bitmask over AuthCache.feature_bits
+
+    @property
+    def is_staff(self):
+        return self.role in STAFF_ROLES
+
+    @property
+    def is_super_admin(self):
+        return self.role == "super_admin"
+
+
+# ======================
+# Authorization cache
+# ======================
+class AuthCache:
+    # Admin guards used to re-read the user row (and supervisor_permissions)
+    # on every check. Snapshots are cached per telegram_id and dropped by the
+    # Database "users" notifications on role, activation and permission writes.
+    # Every invalidation bumps the generation; a lookup that was awaiting the
+    # database meanwhile returns its result but does not cache it, so a
+    # demotion committed during the read is not overwritten by the old row.
+    def __init__(self, database):
+        self.db = database
+        self.snapshots = {}
+        self.feature_bits = None
+        self.staff_ids = None
+        self._generation = 0
+        database.subscribe("users", self.invalidate)
+        database.subscribe("features", self.invalidate_features)
+
+    def invalidate(self, telegram_id=None):
+        self._generation += 1
+        self.staff_ids = None
+        if telegram_id is None:
+            self.snapshots.clear()
+        else:
+            self.snapshots.pop(telegram_id, None)
+
+    def invalidate_features(self, _key=None):
+        self._generation += 1
+        self.feature_bits = None
+        self.snapshots.clear()
+
+    async def _ensure_features(self):
+        feature_bits = self.feature_bits
+        if feature_bits is None:
+            generation = self._generation
+            features = await self.db.get_features()
+            ids = sorted(feature["id"] for feature in features)
+            feature_bits = {feature_id: 1 << index for index, feature_id in enumerate(ids)}
+            if generation == self._generation:
+                self.feature_bits = feature_bits
+        return feature_bits
+
+    async def get(self, telegram_id):
+        snapshot = self.snapshots.get(telegram_id)
+        if snapshot is not None:
+            return snapshot
+        generation = self._generation
+        feature_bits = await self._ensure_features()
+        user, feature_ids = await self.db.get_auth_snapshot(telegram_id)
+        if not user:
+            # Not cached: the row may appear with the next user upsert flush
+            return None
+        mask = 0
+        for feature_id in feature_ids:
+            mask |= feature_bits.get(feature_id, 0)
+        snapshot = AuthSnapshot(user["role"], user["is_active"], mask)
+        if generation == self._generation:
+            self.snapshots[telegram_id] = snapshot
+        return snapshot
+
+    async def is_staff(self, telegram_id):
+        snapshot = await self.get(telegram_id)
+        return bool(snapshot and snapshot.is_staff)
+
+    async def is_known_staff(self, telegram_id):
+        # From the set of staff ids, so unknown users never cost a query;
+        # used to pick an update's priority lane before any handler runs
+        staff_ids = self.staff_ids
+        if staff_ids is None:
+            generation = self._generation
+            staff_ids = frozenset(await self.db.get_staff_ids())
+            if generation == self._generation:
+                self.staff_ids = staff_ids
+        return telegram_id in staff_ids
+
+    async def is_super_admin(self, telegram_id):
+        snapshot = await self.get(telegram_id)
+        return bool(snapshot and snapshot.is_super_admin)
+
+    async def has_permission(self, telegram_id, feature_id):
+        snapshot = await self.get(telegram_id)
+        if not snapshot:
+            return False
+        if snapshot.role in FULL_ACCESS_ROLES:
+            return True
+        feature_bits = await self._ensure_features()
+        return bool(snapshot.permissions & feature_bits.get(feature_id, 0))
+
+
+auth_cache = AuthCache(db)
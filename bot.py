@@ -3,13 +3,24 @@
 import asyncio
 import logging
 
-from aiogram import Bot, Dispatcher, Router, F
+from aiogram import Bot, Router
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
 from aiogram.filters import CommandStart
 from aiogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton, CallbackQuery
 
-from config import BOT_TOKEN, SUPER_ADMIN_ID
-from database import Database
-from aiogram.fsm.storage.memory import MemoryStorage
+from config import BOT_TOKEN, SUPER_ADMIN_ID, BOT_MODE, TELEGRAM_API_URL, CAPTURE_ENABLED
+from database import db
+from write_behind import user_writes
+from auth_cache import auth_cache
+from broadcast import broadcasts
+from fsm_storage import fsm_storage
+from activity import activity, ActivityMiddleware
+from capture import capture, CaptureMiddleware
+from executor import executor, OrderedDispatcher
+from routing import text_routes, callback_routes
+from callbacks import USER_REGISTRATION
+from metrics import UpdateMetricsMiddleware, HandlerMetricsMiddleware, BotApiMetricsMiddleware
 from admin_interface import router as admin_router
 from user_interface import router as user_router
 from keyboards import admin_main_keyboard, main_menu_keyboard
@@ -26,24 +37,63 @@ logging.basicConfig(level=logging.INFO)
 # ======================
 # Core objects
 # ======================
-bot = Bot(token=BOT_TOKEN)
-dp = Dispatcher(storage=MemoryStorage())
-db = Database()
+session = None
+if TELEGRAM_API_URL:
+    session = AiohttpSession(api=TelegramAPIServer.from_base(TELEGRAM_API_URL))
+bot = Bot(token=BOT_TOKEN, session=session)
+bot.session.middleware(BotApiMetricsMiddleware())
+# Per-chat ordering and the global concurrency cap wrap feed_update itself
+dp = OrderedDispatcher(executor, storage=fsm_storage)
+if CAPTURE_ENABLED:
+    dp.update.outer_middleware(CaptureMiddleware(capture))
+dp.update.outer_middleware(ActivityMiddleware(activity))
+dp.update.outer_middleware(UpdateMetricsMiddleware())
+# Inner middlewares on the dispatcher also wrap handlers of included routers
+dp.message.middleware(HandlerMetricsMiddleware())
+dp.callback_query.middleware(HandlerMetricsMiddleware())
 
 
 # ======================
 # Startup
 # ======================
 async def on_startup():
-    db.add_user(telegram_id=SUPER_ADMIN_ID, role="super_admin")
+    await db.add_user(telegram_id=SUPER_ADMIN_ID, role="super_admin")
     logging.info("Super admin ready")
+    if CAPTURE_ENABLED:
+        capture.start()
+    # Pick up broadcasts interrupted by the last restart
+    await broadcasts.resume(bot)
+
+
+async def on_shutdown():
+    # Persist queued writes before the connections go away. Each writer gets
+    # its final flush even if an earlier one failed, and the database is
+    # closed last in any case.
+    try:
+        for name, stop in (
+            ("broadcasts", broadcasts.stop),
+            ("user upserts", user_writes.stop),
+            ("activity", activity.stop),
+            ("FSM storage", fsm_storage.close),
+        ):
+            try:
+                await stop()
+            except Exception:
+                logging.exception(f"Stopping {name} failed")
+        try:
+            capture.stop()
+        except Exception:
+            logging.exception("Stopping update capture failed")
+    finally:
+        db.close()
 
 
 # ======================
-# Main
+# Dispatcher setup
 # ======================
-async def main():
-    await on_startup()
+def setup_dispatcher(dp):
+    # Handlers registered on dp itself are tried before the included routers.
+    # Kept separate from main() so tools can build the same dispatcher.
     dp.include_router(admin_router)
     dp.include_router(user_router)
     
@@ -54,64 +104,94 @@ async def main():
         username = message.from_user.username
         full_name = message.from_user.full_name
         
-        # Ensure user exists in DB and update info immediately
-        db.add_user(telegram_id=telegram_id, username=username, full_name=full_name)
-        db.update_user_info(telegram_id, username, full_name)
+        # Queue the insert/update; it is committed with the next batch
+        user_writes.upsert(telegram_id, username, full_name)
         
         # Log to confirm in console
         logging.info(f"Start command: ID={telegram_id}, Username={username}, Name={full_name}")
             
-        user = db.get_user_by_telegram_id(telegram_id)
-        is_admin = user["role"] in ("super_admin", "admin", "supervisor")
+        # A user that is not flushed yet is new, so it has the default role
+        is_admin = await auth_cache.is_staff(telegram_id)
         
         await message.answer(
             f"👋 مرحباً بك {message.from_user.full_name}\n"
             "في البوت الخاص بدورة صناعة المحدث.",
-            reply_markup=main_menu_keyboard(is_admin=is_admin)
+            reply_markup=await main_menu_keyboard(is_admin=is_admin)
         )
 
-    @dp.callback_query(F.data == "user:start_registration")
+    @callback_routes.route(USER_REGISTRATION)
     async def process_registration(callback: CallbackQuery):
         telegram_id = callback.from_user.id
         username = callback.from_user.username
         full_name = callback.from_user.full_name
         
-        # Check if user exists and has a special role
-        existing_user = db.get_user_by_telegram_id(telegram_id)
-        role = existing_user["role"] if existing_user else "user"
-        
-        # Add or update user info while preserving role
-        db.add_user(telegram_id=telegram_id, username=username, full_name=full_name, role=role)
-        db.update_user_info(telegram_id, username, full_name)
+        # Add or update user info; the upsert preserves an existing role
+        user_writes.upsert(telegram_id, username, full_name)
         
-        user = db.get_user_by_telegram_id(telegram_id)
-        is_admin = user["role"] in ("super_admin", "admin", "supervisor")
+        is_admin = await auth_cache.is_staff(telegram_id)
         
         await callback.message.delete()
         await callback.message.answer(
             "✅ تم تسجيل بياناتك بنجاح! أهلاً بك في خدمات البوت.",
-            reply_markup=main_menu_keyboard(is_admin=is_admin)
+            reply_markup=await main_menu_keyboard(is_admin=is_admin)
         )
         await callback.answer()
 
-    @dp.message(lambda message: message.text == "🔄 تحديث البوت")
+    @text_routes.text("🔄 تحديث البوت")
     async def refresh_bot_handler(message: Message):
         await start_handler(message)
 
-    @dp.message(lambda message: message.text == "🔧 لوحة التحكم")
+    @text_routes.text("🔧 لوحة التحكم")
     async def admin_panel_handler(message: Message):
         telegram_id = message.from_user.id
-        user = db.get_user_by_telegram_id(telegram_id)
-        if user and user["role"] in ("super_admin", "admin", "supervisor"):
+        if await auth_cache.is_staff(telegram_id):
             from admin_interface import admin_main_keyboard_markup
             await message.answer(
                 "🔧 أهلاً بك في لوحة التحكم",
-                reply_markup=admin_main_keyboard_markup(telegram_id)
+                reply_markup=await admin_main_keyboard_markup(telegram_id)
             )
         else:
             await message.answer("عذراً، ليس لديك صلاحية الوصول.")
 
-    await dp.start_polling(bot)
+    # Fixed texts and command prefixes of every module, in one lookup; runs
+    # before the routers, so the fixed texts win over pending FSM input.
+    # Command prefixes only match outside FSM states.
+    dp.message.register(text_routes.dispatch, text_routes.filter)
+
+    # Every callback handler is a callback_routes entry; resolved by prefix
+    # trie and handed its parsed callback_data
+    dp.callback_query.register(callback_routes.dispatch, callback_routes.filter)
+
+    # Anything left is a button from an older message whose data no schema
+    # accepts any more (or a step of a flow that is over)
+    @dp.callback_query()
+    async def stale_callback_handler(callback: CallbackQuery):
+        await callback.answer("⌛ انتهت صلاحية هذا الزر، افتح القائمة من جديد.", show_alert=True)
+
+
+# ======================
+# Main
+# ======================
+async def main():
+    await on_startup()
+    setup_dispatcher(dp)
+
+    try:
+        if BOT_MODE == "webhook":
+            from webhook import run_webhook
+            await run_webhook(dp, bot)
+        else:
+            from webhook import start_metrics_server
+            metrics_runner = await start_metrics_server()
+            # A webhook left over from a webhook deploy would block getUpdates
+            await bot.delete_webhook()
+            try:
+                await dp.start_polling(bot)
+            finally:
+                if metrics_runner is not None:
+                    await metrics_runner.cleanup()
+    finally:
+        await on_shutdown()
 
 
 if __name__ == "__main__":
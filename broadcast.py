@@ -0,0 +1,201 @@
+# broadcast.py
+
+import asyncio
+import logging
+import time
+
+from aiogram.exceptions import (
+    TelegramAPIError, TelegramRetryAfter, TelegramForbiddenError, TelegramBadRequest,
+    TelegramNetworkError, TelegramServerError,
+)
+
+from config import (
+    BROADCAST_RATE_LIMIT, BROADCAST_CONCURRENCY, BROADCAST_BATCH_SIZE,
+    BROADCAST_PER_CHAT_INTERVAL, BROADCAST_MAX_RETRIES, BROADCAST_PROGRESS_INTERVAL,
+)
+from database import db
+
+
+# ======================
+# Rate limiting
+# ======================
+class RateLimiter:
+    # Spaces sends evenly at `rate` per second across the whole process, and
+    # keeps a minimum interval between two sends to the same chat. A
+    # RetryAfter from Telegram pauses everyone until the flood wait is over.
+    # Priority sends (admin notifications) do not queue behind the bulk
+    # ones: they only honor the pause and their chat's interval, and push
+    # the next bulk slot back by the interval they used.
+    def __init__(self, rate=BROADCAST_RATE_LIMIT, per_chat_interval=BROADCAST_PER_CHAT_INTERVAL):
+        self.interval = 1 / rate
+        self.per_chat_interval = per_chat_interval
+        self._next_slot = 0.0
+        self._paused_until = 0.0
+        self._chat_next = {}
+
+    async def acquire(self, chat_id, priority=False):
+        while True:
+            now = time.monotonic()
+            start = max(now, self._paused_until, self._chat_next.get(chat_id, 0.0))
+            if not priority:
+                start = max(start, self._next_slot)
+            if start <= now:
+                self._next_slot = max(self._next_slot, now) + self.interval
+                self._chat_next[chat_id] = now + self.per_chat_interval
+                if len(self._chat_next) > 10000:
+                    self._chat_next = {k: v for k, v in self._chat_next.items() if v > now}
+                return
+            await asyncio.sleep(start - now)
+
+    def pause(self, seconds):
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+
+limiter = RateLimiter()
+
+
+async def send_with_retry(bot, chat_id, text, max_retries=BROADCAST_MAX_RETRIES, priority=False, **kwargs):
+    # Returns None on success or the error text once retries are exhausted
+    attempt = 0
+    while True:
+        await limiter.acquire(chat_id, priority)
+        try:
+            await bot.send_message(chat_id, text, **kwargs)
+            return None
+        except TelegramRetryAfter as e:
+            limiter.pause(e.retry_after)
+            error = f"RetryAfter {e.retry_after}s"
+        except (TelegramForbiddenError, TelegramBadRequest) as e:
+            # Blocked the bot, deleted account, chat not found: do not retry
+            return str(e)
+        except (TelegramNetworkError, TelegramServerError) as e:
+            error = str(e)
+            await asyncio.sleep(min(2 ** attempt, 30))
+        except TelegramAPIError as e:
+            # Not found, migrated chat, entity too large...: recorded as a
+            # failure of this recipient instead of ending the whole job
+            return str(e)
+        attempt += 1
+        if attempt > max_retries:
+            return error
+
+
+# ======================
+# Broadcast engine
+# ======================
+class BroadcastEngine:
+    # Runs broadcasts as background tasks instead of inside the admin's
+    # update. Progress (keyset cursor + counters) is saved after every batch,
+    # so a restart resumes each running job from its last saved recipient.
+    # Delivery is at-least-once: recipients of a batch that was interrupted
+    # before its progress was saved get the message again on resume. A job
+    # that fails (e.g. the database is unavailable) stays 'running' and is
+    # resumed the same way on the next start.
+    def __init__(self, database):
+        self.db = database
+        self.tasks = {}
+        self._semaphore = asyncio.Semaphore(BROADCAST_CONCURRENCY)
+
+    async def start_job(self, bot, admin_id, admin_name, text, total, status_message):
+        job_id = await self.db.create_broadcast_job(
+            admin_id, admin_name, text, total, status_message.chat.id, status_message.message_id
+        )
+        self._launch(bot, job_id)
+        return job_id
+
+    async def resume(self, bot):
+        for job in await self.db.get_running_broadcast_jobs():
+            logging.info(f"Resuming broadcast #{job['id']} after user {job['last_recipient_id']}")
+            self._launch(bot, job["id"])
+
+    def _launch(self, bot, job_id):
+        task = asyncio.create_task(self._run(bot, job_id))
+        self.tasks[job_id] = task
+        task.add_done_callback(lambda _: self.tasks.pop(job_id, None))
+
+    async def stop(self):
+        # Progress is already saved per batch; running jobs resume on restart
+        for task in list(self.tasks.values()):
+            task.cancel()
+        await asyncio.gather(*self.tasks.values(), return_exceptions=True)
+
+    async def _deliver(self, bot, chat_id, text):
+        async with self._semaphore:
+            return await send_with_retry(bot, chat_id, text, parse_mode="Markdown")
+
+    async def _run(self, bot, job_id):
+        job = await self.db.get_broadcast_job(job_id)
+        if job is None or job["status"] != "running":
+            return
+        text = f"📢 **إعلان من الإدارة:**\n\n{job['text']}"
+        cursor, sent, failed = job["last_recipient_id"], job["sent"], job["failed"]
+        last_report = 0.0
+
+        try:
+            while True:
+                recipients = await self.db.get_broadcast_recipients_after(cursor, BROADCAST_BATCH_SIZE)
+                if not recipients:
+                    break
+                errors = await asyncio.gather(*(self._deliver(bot, chat_id, text) for chat_id in recipients))
+                failures = [(chat_id, error) for chat_id, error in zip(recipients, errors) if error]
+                failed += len(failures)
+                sent += len(recipients) - len(failures)
+                cursor = recipients[-1]
+                await self.db.save_broadcast_progress(job_id, cursor, sent, failed, failures)
+
+                if time.monotonic() - last_report >= BROADCAST_PROGRESS_INTERVAL:
+                    last_report = time.monotonic()
+                    await self._edit_status(
+                        bot, job,
+                        f"⏳ جاري الإذاعة...\n\n"
+                        f"🔹 تم الإرسال: `{sent}`\n"
+                        f"🔸 فشل: `{failed}`\n"
+                        f"📊 التقدم: `{sent + failed}` / `{job['total']}`"
+                    )
+
+            # The log entry first: if finishing fails, the resumed job finds
+            # no recipients left and logs again rather than never
+            await self.db.add_admin_log(job["admin_id"], job["admin_name"], "إذاعة عامة", "النظام", f"تم الإرسال لـ {sent} مستخدم (فشل {failed})")
+            await self.db.finish_broadcast_job(job_id)
+        except asyncio.CancelledError:
+            logging.info(f"Broadcast #{job_id} paused at user {cursor}")
+            raise
+        except Exception:
+            logging.exception(f"Broadcast #{job_id} stopped at user {cursor}; it resumes on the next start")
+            await self._edit_status(
+                bot, job,
+                f"⚠️ توقفت الإذاعة بسبب خطأ، وستُستأنف عند إعادة تشغيل البوت.\n\n"
+                f"🔹 تم الإرسال: `{sent}`\n"
+                f"🔸 فشل: `{failed}`"
+            )
+            return
+
+        from admin_interface import admin_main_keyboard_markup
+        try:
+            reply_markup = await admin_main_keyboard_markup(job["admin_id"])
+        except Exception:
+            logging.exception(f"Broadcast #{job_id}: could not build the admin keyboard")
+            reply_markup = None
+        await self._edit_status(
+            bot, job,
+            f"✅ **اكتملت عملية الإذاعة**\n\n"
+            f"🔹 تم الإرسال بنجاح: `{sent}`\n"
+            f"🔸 فشل الإرسال (بوت محظور): `{failed}`",
+            reply_markup=reply_markup
+        )
+
+    async def _edit_status(self, bot, job, text, reply_markup=None):
+        try:
+            await bot.edit_message_text(
+                text,
+                chat_id=job["status_chat_id"],
+                message_id=job["status_message_id"],
+                reply_markup=reply_markup,
+                parse_mode="Markdown"
+            )
+        except Exception:
+            # e.g. "message is not modified" or the admin deleted it
+            logging.debug("Could not update broadcast status message", exc_info=True)
+
+
+broadcasts = BroadcastEngine(db)
@@ -0,0 +1,76 @@
+# button_cache.py
+
+import asyncio
+
+from database import db
+
+
+def normalize_text(text):
+    return text.strip() if text else ""
+
+
+# ======================
+# Button tree cache
+# ======================
+class ButtonTree:
+    # The whole buttons table is small and read on every text message, so it
+    # lives in memory: children per level in display order, plus a dict per
+    # level keyed by normalized text. Admin mutations invalidate it through
+    # Database.subscribe and the next lookup reloads it with one query.
+    def __init__(self, database):
+        self.db = database
+        self.by_id = {}
+        self.children = {}
+        self.by_text = {}
+        self.version = 0
+        self._generation = 0
+        self._loaded_generation = -1
+        self._lock = asyncio.Lock()
+        database.subscribe("buttons", self.invalidate)
+
+    def invalidate(self, _key=None):
+        self._generation += 1
+
+    async def ensure_loaded(self):
+        if self._loaded_generation == self._generation:
+            return
+        async with self._lock:
+            generation = self._generation
+            if self._loaded_generation == generation:
+                return
+            rows = await self.db.get_all_buttons()
+            self._build(rows)
+            self._loaded_generation = generation
+
+    def _build(self, rows):
+        by_id = {row["id"]: dict(row) for row in rows}
+        children = {}
+        by_text = {}
+        for btn in by_id.values():
+            btn["has_children"] = False
+        for btn in by_id.values():  # rows are already in position order
+            if not btn["is_active"]:
+                continue
+            parent_id = btn["parent_id"]
+            children.setdefault(parent_id, []).append(btn)
+            # First button wins on duplicate texts, as in the old linear scan
+            by_text.setdefault(parent_id, {}).setdefault(normalize_text(btn["text"]), btn)
+            if parent_id in by_id:
+                by_id[parent_id]["has_children"] = True
+        self.by_id, self.children, self.by_text = by_id, children, by_text
+        self.version += 1
+
+    async def resolve(self, parent_id, text):
+        await self.ensure_loaded()
+        return self.by_text.get(parent_id, {}).get(normalize_text(text))
+
+    async def get(self, button_id):
+        await self.ensure_loaded()
+        return self.by_id.get(button_id)
+
+    async def get_children(self, parent_id=None):
+        await self.ensure_loaded()
+        return self.children.get(parent_id, [])
+
+
+button_tree = ButtonTree(db)
@@ -0,0 +1,76 @@
+# callbacks.py
+#
+# callback_data schemas of every inline button. Handlers are registered on
+# them through routing.callback_routes and receive the parsed values as
+# callback_data. Prefixes are short on purpose: "<area>:<action>".
+
+from routing import CallbackData, Int, Bool, Choice, Token, INT, USER_ID
+
+# ======================
+# Admin panel
+# ======================
+ADMIN_PANEL = CallbackData("a:p")
+ADMIN_CLOSE = CallbackData("a:x")
+BROADCAST = CallbackData("a:b")
+
+# ======================
+# Buttons management
+# ======================
+BUTTONS_LIST = CallbackData("b:l", parent_id=Int(optional=True))
+BUTTON_MOVE = CallbackData("b:m", direction=Choice("up", "down"), button_id=INT)
+BUTTON_DELETE = CallbackData("b:d", button_id=INT)
+BUTTON_EDIT = CallbackData("b:e", button_id=INT)
+BUTTON_EDIT_FIELD = CallbackData("b:f", field=Choice("text", "content"), button_id=INT)
+BUTTON_ADD = CallbackData("b:a", parent_id=Int(optional=True))
+BUTTON_TYPE = CallbackData("b:t", btn_type=Choice("content", "folder", "contact"))
+
+# ======================
+# Statistics and users
+# ======================
+STATS = CallbackData("s:o")
+HOT_BUTTONS = CallbackData("s:h", days=INT)
+# role: "*" any / u / s / a; active: "*" any / "1" / "0"; search: the last
+# query kept in the FSM data applies; at most one of older_than / newer_than
+# (users.id at the edge of the previous page)
+USERS_PAGE = CallbackData(
+    "u:l",
+    role=Choice("*", "u", "s", "a"), active=Choice("*", "1", "0"), search=Bool(),
+    older_than=Int(optional=True), newer_than=Int(optional=True),
+)
+USERS_SEARCH = CallbackData("u:s", role=Choice("*", "u", "s", "a"), active=Choice("*", "1", "0"))
+USER_TOGGLE_BLOCK = CallbackData("u:b", telegram_id=USER_ID)
+USER_REGISTRATION = CallbackData("u:r")
+
+# ======================
+# Confirmations
+# ======================
+CONFIRM_USER_ACTION = CallbackData("c:u", action=Choice("delete", "ban", "unban"), telegram_id=USER_ID)
+CONFIRM_CANCEL = CallbackData("c:x")
+CONFIRM_DELETE_ADMIN_LOG = CallbackData("c:l", log_id=INT)
+CONFIRM_DELETE_MESSAGE = CallbackData("c:m", message_id=INT)
+
+# ======================
+# Managers
+# ======================
+MANAGERS = CallbackData("m:m")
+MANAGER_ADD = CallbackData("m:a")
+MANAGER_LIST = CallbackData("m:l")
+MANAGER_VIEW = CallbackData("m:v", telegram_id=USER_ID)
+MANAGER_PERMS = CallbackData("m:p", telegram_id=USER_ID, feature=Token(16, optional=True))
+MANAGER_DELETE = CallbackData("m:d", telegram_id=USER_ID)
+MANAGER_DELETE_FINAL = CallbackData("m:f", telegram_id=USER_ID)
+MANAGER_SET_ACTIVE = CallbackData("m:s", telegram_id=USER_ID, active=Bool())
+
+# ======================
+# Support
+# ======================
+SUPPORT_REPLY = CallbackData("r:u", user_id=USER_ID, button_id=Int(optional=True))
+LOG_SECTIONS = CallbackData("l:s")
+# Without a cursor: the newest page
+LOG_PAGE = CallbackData("l:v", button_id=INT, before_id=Int(optional=True), after_id=Int(optional=True))
+LOG_CLEAR = CallbackData("l:c", button_id=INT)
+LOG_CLEAR_FINAL = CallbackData("l:f", button_id=INT)
+
+ADMIN_LOGS = CallbackData("g:v")
+ADMIN_LOGS_CLEAR = CallbackData("g:c")
+ADMIN_LOGS_CLEAR_FINAL = CallbackData("g:f")
@@ -0,0 +1,198 @@
+# capture.py
+
+import hashlib
+import hmac
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import time
+
+from aiogram import BaseMiddleware
+
+from config import CAPTURE_PATH, CAPTURE_MAX_BYTES, CAPTURE_BACKUPS, CAPTURE_HASH_TEXT, CAPTURE_SALT
+from button_cache import button_tree, normalize_text
+from routing import text_routes, callback_routes
+
+# Commands kept verbatim. Of the text_routes prefixes only "<prefix><digits>"
+# survives, with the digits remapped for commands whose argument is a
+# telegram id; in callback_data the schemas mark such fields (routing.USER_ID)
+KNOWN_COMMANDS = ("/start",)
+USER_ID_COMMANDS = ("/delete_", "/ban_", "/unban_")
+HASHED_KEYS = {"file_id", "file_unique_id", "phone_number", "chat_instance", "caption"}
+PEER_KEYS = ("from", "chat", "user", "sender_chat", "sender_user")
+NAME_KEYS = ("first_name", "last_name", "username", "title")
+
+
+# ======================
+# Anonymizer
+# ======================
+class Anonymizer:
+    # Telegram ids are replaced by a keyed hash, so the same person gets the
+    # same pseudonymous id in every capture file and in a database copy
+    # anonymized with the same salt (tools/replay.py --salt). Names become
+    # "u<id>"; free text becomes a hash of the same length, while menu labels
+    # and the bot's own commands are kept so a replay still walks the same
+    # menus.
+    def __init__(self, salt, hash_text=True):
+        self.key = salt.encode()
+        self.hash_text = hash_text
+
+    def _digest(self, value):
+        return hmac.new(self.key, str(value).encode(), hashlib.sha256).hexdigest()
+
+    def user_id(self, telegram_id):
+        telegram_id = int(telegram_id)
+        # Same sign (groups are negative) and a user-like magnitude
+        mapped = 1_000_000_000 + int(self._digest(abs(telegram_id))[:12], 16) % 8_000_000_000
+        return -mapped if telegram_id < 0 else mapped
+
+    def name(self, telegram_id):
+        return f"u{self.user_id(telegram_id)}"
+
+    def text(self, text, keep=False):
+        if text is None or keep or not self.hash_text:
+            return text
+        digest = "#" + self._digest(text)[:16]
+        return digest + "·" * max(0, len(text) - len(digest))
+
+    def command(self, text):
+        # Anything else after a "/" is whatever the user typed and is hashed
+        # like free text
+        if text in KNOWN_COMMANDS:
+            return text
+        for length in text_routes.prefix_lengths:
+            prefix = text[:length]
+            if prefix in text_routes.prefixes:
+                argument = text[length:]
+                if not argument.isdigit():
+                    break
+                if prefix in USER_ID_COMMANDS:
+                    argument = str(self.user_id(argument))
+                return prefix + argument
+        return self.text(text)
+
+    def callback_data(self, data):
+        # Needs the handlers' modules imported, as the bot does
+        route, values = callback_routes.resolve(data) if data else (None, None)
+        if route is None:
+            return data
+        schema = route.schema
+        values = [
+            self.user_id(value) if value is not None and getattr(field, "user_id", False) else value
+            for field, value in zip(schema.fields, values)
+        ]
+        return schema.pack(*values)
+
+    def message_text(self, text, is_label):
+        if text.startswith("/"):
+            return self.command(text)
+        return self.text(text, keep=is_label(text))
+
+    def update(self, update, is_label=lambda text: False):
+        # update: Update.model_dump(mode="json", by_alias=True, exclude_none=True)
+        return self._walk(update, is_label)
+
+    def _walk(self, value, is_label):
+        if isinstance(value, list):
+            return [self._walk(item, is_label) for item in value]
+        if not isinstance(value, dict):
+            return value
+        result = {}
+        for key, item in value.items():
+            if key in PEER_KEYS and isinstance(item, dict) and "id" in item:
+                telegram_id = item["id"]
+                item = dict(item, id=self.user_id(telegram_id))
+                for name_key in NAME_KEYS:
+                    if name_key in item:
+                        item[name_key] = self.name(telegram_id)
+            elif key == "user_id" and isinstance(item, int):
+                item = self.user_id(item)
+            elif key == "text" and isinstance(item, str):
+                item = self.message_text(item, is_label)
+            elif key == "data" and isinstance(item, str):
+                item = self.callback_data(item)
+            elif key in HASHED_KEYS and isinstance(item, str):
+                item = self._digest(item)[:24]
+            result[key] = self._walk(item, is_label)
+        # Entity offsets point into the original text
+        if "entities" in result and result.get("text") != value.get("text"):
+            del result["entities"]
+        return result
+
+
+def is_menu_label(text):
+    # Fixed keyboard texts and labels of the current button tree
+    # (button_tree must be loaded)
+    if text in text_routes.exact:
+        return True
+    text = normalize_text(text)
+    return any(text in level for level in button_tree.by_text.values())
+
+
+# ======================
+# Capture writer
+# ======================
+class UpdateCapture:
+    # Lines go through a logging queue to a RotatingFileHandler on the
+    # listener's thread, so the event loop never waits on disk. Each line is
+    # {"t": unix time, "u": anonymized update}.
+    def __init__(self, path=CAPTURE_PATH, max_bytes=CAPTURE_MAX_BYTES, backups=CAPTURE_BACKUPS,
+                 salt=CAPTURE_SALT, hash_text=CAPTURE_HASH_TEXT):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.anonymizer = Anonymizer(salt or "", hash_text)
+        self.logger = logging.getLogger("capture")
+        self.logger.propagate = False
+        self.logger.setLevel(logging.INFO)
+        self._listener = None
+
+    def start(self):
+        if self._listener is not None:
+            return
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        handler = logging.handlers.RotatingFileHandler(
+            self.path, maxBytes=self.max_bytes, backupCount=self.backups, encoding="utf-8"
+        )
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        records = queue.SimpleQueue()
+        self.logger.addHandler(logging.handlers.QueueHandler(records))
+        self._listener = logging.handlers.QueueListener(records, handler)
+        self._listener.start()
+        logging.info(f"Capturing updates to {self.path}")
+
+    async def record(self, update):
+        await button_tree.ensure_loaded()
+        payload = self.anonymizer.update(update.model_dump(mode="json", by_alias=True, exclude_none=True), is_menu_label)
+        self.logger.info(json.dumps({"t": round(time.time(), 3), "u": payload}, ensure_ascii=False, separators=(",", ":")))
+
+    def stop(self):
+        if self._listener is None:
+            return
+        self._listener.stop()  # drains the queue
+        for handler in list(self.logger.handlers):
+            self.logger.removeHandler(handler)
+        for handler in self._listener.handlers:
+            handler.close()
+        self._listener = None
+
+
+capture = UpdateCapture()
+
+
+class CaptureMiddleware(BaseMiddleware):
+    # Outer update middleware; records before handling so updates whose
+    # handler fails are captured too
+    def __init__(self, capture):
+        self.capture = capture
+
+    async def __call__(self, handler, event, data):
+        try:
+            await self.capture.record(event)
+        except Exception:
+            logging.exception("Update capture failed")
+        return await handler(event, data)
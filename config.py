@@ -26,12 +26,120 @@ except ValueError:
     else:
         raise RuntimeError(f"Invalid SUPER_ADMIN_ID format: {SUPER_ADMIN_ID}")
 
+# Bot API base URL, e.g. a local Bot API server or tools/mock_api.py;
+# unset means https://api.telegram.org
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL")
+
+
+# ======================
+# Update Delivery
+# ======================
+
+# "polling" (default) or "webhook"
+BOT_MODE = os.getenv("BOT_MODE", "polling").strip().lower()
+if BOT_MODE not in ("polling", "webhook"):
+    raise RuntimeError(f"Invalid BOT_MODE: {BOT_MODE}")
+
+WEB_SERVER_HOST = os.getenv("WEB_SERVER_HOST", "0.0.0.0")
+WEB_SERVER_PORT = int(os.getenv("WEB_SERVER_PORT", "8080"))
+WEBHOOK_URL = os.getenv("WEBHOOK_URL")  # public base URL, e.g. https://example.com
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")
+
+# Prometheus text metrics, served on WEB_SERVER_PORT in both modes
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+METRICS_PATH = os.getenv("METRICS_PATH", "/metrics")
+
+if BOT_MODE == "webhook":
+    if not WEBHOOK_URL:
+        raise RuntimeError("WEBHOOK_URL is not set in environment variables")
+    if not WEBHOOK_SECRET:
+        raise RuntimeError("WEBHOOK_SECRET is not set in environment variables")
+
 
 # ======================
 # Database Settings
 # ======================
 
 DATABASE_NAME = os.getenv("DATABASE_NAME", "bot.db")
+DATABASE_READ_POOL_SIZE = int(os.getenv("DATABASE_READ_POOL_SIZE", "4"))
+DATABASE_MMAP_SIZE = int(os.getenv("DATABASE_MMAP_SIZE", str(64 * 1024 * 1024)))
+DATABASE_CACHE_SIZE_KB = int(os.getenv("DATABASE_CACHE_SIZE_KB", "16384"))
+DATABASE_STATEMENT_CACHE_SIZE = int(os.getenv("DATABASE_STATEMENT_CACHE_SIZE", "256"))
+
+# Write-behind flush for /start user upserts
+USER_FLUSH_INTERVAL_MS = int(os.getenv("USER_FLUSH_INTERVAL_MS", "500"))
+USER_FLUSH_MAX_ROWS = int(os.getenv("USER_FLUSH_MAX_ROWS", "500"))
+
+# FSM storage: contexts kept in memory, and how often dirty ones are written
+FSM_CACHE_SIZE = int(os.getenv("FSM_CACHE_SIZE", "10000"))
+FSM_FLUSH_INTERVAL_MS = int(os.getenv("FSM_FLUSH_INTERVAL_MS", "1000"))
+FSM_FLUSH_MAX_ROWS = int(os.getenv("FSM_FLUSH_MAX_ROWS", "500"))
+
+# FSM idle timeouts in seconds. Contexts without a state (menu position) use
+# FSM_IDLE_TTL; contexts in a state use their group's entry, overridable as
+# FSM_STATE_TTLS="ManageButtons=86400,SupportState=3600". A group missing
+# here falls back to FSM_IDLE_TTL.
+FSM_IDLE_TTL = int(os.getenv("FSM_IDLE_TTL", "1800"))
+FSM_STATE_TTLS = {
+    "ManageButtons": 86400,
+    "AddSupervisor": 3600,
+    "SupportState": 3600,
+    "BroadcastState": 3600,
+    "UserSearch": 3600,
+}
+for _item in os.getenv("FSM_STATE_TTLS", "").split(","):
+    if "=" in _item:
+        _group, _seconds = _item.split("=", 1)
+        FSM_STATE_TTLS[_group.strip()] = int(_seconds)
+FSM_SWEEP_INTERVAL = int(os.getenv("FSM_SWEEP_INTERVAL", "300"))
+
+# Updates handled at the same time across all chats; each chat's own updates
+# always run one after another (executor.py)
+EXECUTOR_MAX_CONCURRENCY = int(os.getenv("EXECUTOR_MAX_CONCURRENCY", "64"))
+
+# Staff updates (by cached role) take free slots before user updates. User
+# updates get a short "busy" reply instead of being handled once this many
+# updates wait for a slot, or when one waited longer than EXECUTOR_SHED_WAIT_MS
+# for it; 0 turns a check off. A chat gets at most one busy message per
+# EXECUTOR_BUSY_REPLY_INTERVAL seconds.
+EXECUTOR_SHED_QUEUE_DEPTH = int(os.getenv("EXECUTOR_SHED_QUEUE_DEPTH", "1000"))
+EXECUTOR_SHED_WAIT_MS = int(os.getenv("EXECUTOR_SHED_WAIT_MS", "5000"))
+EXECUTOR_BUSY_REPLY_INTERVAL = float(os.getenv("EXECUTOR_BUSY_REPLY_INTERVAL", "10"))
+
+# Seconds between writes of daily activity (active users, button presses)
+STATS_FLUSH_INTERVAL = int(os.getenv("STATS_FLUSH_INTERVAL", "30"))
+
+
+# ======================
+# Broadcast Settings
+# ======================
+
+# Telegram allows roughly 30 messages/second to different chats
+BROADCAST_RATE_LIMIT = float(os.getenv("BROADCAST_RATE_LIMIT", "30"))
+BROADCAST_CONCURRENCY = int(os.getenv("BROADCAST_CONCURRENCY", "20"))
+BROADCAST_BATCH_SIZE = int(os.getenv("BROADCAST_BATCH_SIZE", "200"))
+BROADCAST_PER_CHAT_INTERVAL = float(os.getenv("BROADCAST_PER_CHAT_INTERVAL", "1.0"))
+BROADCAST_MAX_RETRIES = int(os.getenv("BROADCAST_MAX_RETRIES", "3"))
+BROADCAST_PROGRESS_INTERVAL = float(os.getenv("BROADCAST_PROGRESS_INTERVAL", "3"))
+
+
+# ======================
+# Traffic Capture
+# ======================
+
+# Opt-in recording of incoming updates for tools/replay.py. User ids are
+# remapped with CAPTURE_SALT (keep it to anonymize a database copy the same
+# way) and free text is replaced by a hash.
+CAPTURE_ENABLED = os.getenv("CAPTURE_ENABLED", "false").lower() == "true"
+CAPTURE_PATH = os.getenv("CAPTURE_PATH", "captures/updates.jsonl")
+CAPTURE_MAX_BYTES = int(os.getenv("CAPTURE_MAX_BYTES", str(50 * 1024 * 1024)))
+CAPTURE_BACKUPS = int(os.getenv("CAPTURE_BACKUPS", "10"))
+CAPTURE_HASH_TEXT = os.getenv("CAPTURE_HASH_TEXT", "true").lower() == "true"
+CAPTURE_SALT = os.getenv("CAPTURE_SALT")
+
+if CAPTURE_ENABLED and not CAPTURE_SALT:
+    raise RuntimeError("CAPTURE_SALT is not set in environment variables")
 
 
 # ======================
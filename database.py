@@ -1,321 +1,670 @@
 # database.py
 
+import asyncio
+import functools
+import inspect
 import sqlite3
-from config import DATABASE_NAME
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from config import (
+    DATABASE_NAME, DATABASE_READ_POOL_SIZE, DATABASE_MMAP_SIZE,
+    DATABASE_CACHE_SIZE_KB, DATABASE_STATEMENT_CACHE_SIZE,
+)
+from migrations import apply_migrations
+from metrics import observe_query, row_count
+
+
+# ======================
+# Connection manager
+# ======================
+class ConnectionManager:
+    # One writer connection on its own thread (SQLite allows a single writer
+    # anyway) plus a small pool of reader threads, each owning a connection.
+    def __init__(self, path, read_pool_size=DATABASE_READ_POOL_SIZE):
+        self.path = path
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+        self.writer = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="db-writer", initializer=self._open_thread_connection
+        )
+        self.readers = ThreadPoolExecutor(
+            max_workers=read_pool_size, thread_name_prefix="db-reader", initializer=self._open_thread_connection
+        )
+
+    def connect(self):
+        conn = sqlite3.connect(
+            self.path,
+            check_same_thread=False,
+            timeout=5,
+            cached_statements=DATABASE_STATEMENT_CACHE_SIZE,
+        )
+        conn.row_factory = sqlite3.Row
+        # WAL lets the reader pool run while the writer commits; NORMAL is
+        # durable across app crashes and skips the fsync on every commit.
+        conn.execute("PRAGMA synchronous = NORMAL")
+        conn.execute(f"PRAGMA mmap_size = {int(DATABASE_MMAP_SIZE)}")
+        conn.execute(f"PRAGMA cache_size = -{int(DATABASE_CACHE_SIZE_KB)}")
+        conn.execute("PRAGMA temp_store = MEMORY")
+        return conn
+
+    def _open_thread_connection(self):
+        conn = self.connect()
+        self._local.conn = conn
+        with self._lock:
+            self._connections.append(conn)
+
+    def _call(self, func, args, kwargs, submitted=None):
+        started = time.perf_counter()
+        result = func(self._local.conn, *args, **kwargs)
+        if submitted is not None:
+            observe_query(func.__name__, "read", started - submitted, time.perf_counter() - started, row_count(result))
+        return result
+
+    def _call_in_transaction(self, func, args, kwargs, submitted):
+        conn = self._local.conn
+        started = time.perf_counter()
+        changes = conn.total_changes
+        with conn:  # commits on success, rolls back on error
+            result = func(conn, *args, **kwargs)
+        observe_query(func.__name__, "write", started - submitted, time.perf_counter() - started, conn.total_changes - changes)
+        return result
+
+    # func is a bound Database method; its name labels the query metrics
+    async def read(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.readers, self._call, func, args, kwargs, time.perf_counter())
+
+    async def write(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.writer, self._call_in_transaction, func, args, kwargs, time.perf_counter())
+
+    def run_sync(self, func, *args, **kwargs):
+        # For startup code that runs before the event loop exists; func
+        # manages its own transactions.
+        return self.writer.submit(self._call, func, args, kwargs).result()
+
+    def close(self):
+        try:
+            self.run_sync(lambda conn: conn.execute("PRAGMA optimize"))
+        except RuntimeError:
+            pass  # already closed
+        self.writer.shutdown(wait=True)
+        self.readers.shutdown(wait=True)
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+
+
+def reads(func):
+    # Runs on a reader thread; the method receives that thread's connection.
+    @functools.wraps(func)
+    async def wrapper(self, *args, **kwargs):
+        return await self.connections.read(func.__get__(self), *args, **kwargs)
+    return wrapper
+
+
+def writes(func):
+    # Runs on the writer thread inside a transaction.
+    @functools.wraps(func)
+    async def wrapper(self, *args, **kwargs):
+        return await self.connections.write(func.__get__(self), *args, **kwargs)
+    return wrapper
+
+
+def notifies(topic, key=None):
+    # Tells in-memory caches that a committed write touched `topic`; `key`
+    # names the argument passed to the listeners (e.g. telegram_id).
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        async def wrapper(self, *args, **kwargs):
+            result = await func(self, *args, **kwargs)
+            value = None
+            if key is not None:
+                value = signature.bind(self, None, *args, **kwargs).arguments[key]
+            self._notify(topic, value)
+            return result
+        return wrapper
+    return decorator
 
 
 class Database:
-    def __init__(self):
-        self.conn = sqlite3.connect(DATABASE_NAME, check_same_thread=False)
-        self.conn.row_factory = sqlite3.Row
-        self.cursor = self.conn.cursor()
-        self.create_tables()
+    def __init__(self, path=DATABASE_NAME):
+        self._listeners = {}
+        self.connections = ConnectionManager(path)
+        self.connections.run_sync(self._prepare)
+
+    def _prepare(self, conn):
+        # journal_mode is persistent in the file, so set it once from the writer
+        conn.execute("PRAGMA journal_mode = WAL")
+        apply_migrations(conn)
+
+    def close(self):
+        self.connections.close()
 
     # ======================
-    # Tables
+    # Change notifications
     # ======================
-    def create_tables(self):
-        # Users
-        self.cursor.execute("""
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY,
-            telegram_id INTEGER UNIQUE,
-            username TEXT,
-            full_name TEXT,
-            role TEXT DEFAULT 'user',
-            is_active INTEGER DEFAULT 1,
-            joined_at DATETIME DEFAULT CURRENT_TIMESTAMP
-        )
-        """)
-
-        # Permissions
-        self.cursor.execute("""
-        CREATE TABLE IF NOT EXISTS permissions (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER,
-            permission TEXT,
-            FOREIGN KEY (user_id) REFERENCES users (id)
-        )
-        """)
-
-        # Buttons
-        self.cursor.execute("""
-        CREATE TABLE IF NOT EXISTS buttons (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            text TEXT NOT NULL,
-            type TEXT NOT NULL,
-            content TEXT,
-            parent_id INTEGER,
-            is_active INTEGER DEFAULT 1,
-            created_by INTEGER,
-            position INTEGER,
-            FOREIGN KEY (parent_id) REFERENCES buttons (id),
-            FOREIGN KEY (created_by) REFERENCES users (id)
-        )
-        """)
-
-        # Messages (Support System)
-        self.cursor.execute("""
-        CREATE TABLE IF NOT EXISTS support_messages (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER,
-            admin_id INTEGER,
-            message_text TEXT,
-            is_from_admin INTEGER DEFAULT 0,
-            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-        )
-        """)
-
-        # Pending Supervisors
-        self.cursor.execute("""
-        CREATE TABLE IF NOT EXISTS pending_supervisors (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT UNIQUE,
-            role TEXT DEFAULT 'supervisor'
-        )
-        """)
+    def subscribe(self, topic, callback):
+        self._listeners.setdefault(topic, []).append(callback)
 
-        self.conn.commit()
+    def _notify(self, topic, key=None):
+        for callback in self._listeners.get(topic, ()):
+            callback(key)
 
     # ======================
     # Pending supervisors
     # ======================
-    def add_pending_supervisor(self, username):
-        self.cursor.execute(
+    @writes
+    def add_pending_supervisor(self, conn, username):
+        conn.execute(
             "INSERT OR IGNORE INTO pending_supervisors (username) VALUES (?)",
             (username.lower(),)
         )
-        self.conn.commit()
 
-    def get_pending_by_username(self, username):
-        self.cursor.execute(
+    @reads
+    def get_pending_by_username(self, conn, username):
+        return conn.execute(
             "SELECT * FROM pending_supervisors WHERE username = ?",
             (username.lower(),)
-        )
-        return self.cursor.fetchone()
+        ).fetchone()
 
-    def remove_pending(self, username):
-        self.cursor.execute(
+    @writes
+    def remove_pending(self, conn, username):
+        conn.execute(
             "DELETE FROM pending_supervisors WHERE username = ?",
             (username.lower(),)
         )
-        self.conn.commit()
 
     # ======================
     # Users
     # ======================
-    def add_user(self, telegram_id, username=None, full_name=None, role="user"):
-        self.cursor.execute(
-            "INSERT OR IGNORE INTO users (telegram_id, username, full_name, role) VALUES (?, ?, ?, ?)",
+    @notifies("users", key="telegram_id")
+    @writes
+    def add_user(self, conn, telegram_id, username=None, full_name=None, role="user"):
+        conn.execute(
+            "INSERT OR IGNORE INTO users (telegram_id, username, full_name, role, joined_at) VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)",
             (telegram_id, username, full_name, role)
         )
-        self.conn.commit()
 
-    def update_user_info(self, telegram_id, username, full_name):
-        self.cursor.execute(
+    @writes
+    def update_user_info(self, conn, telegram_id, username, full_name):
+        conn.execute(
             "UPDATE users SET username = ?, full_name = ? WHERE telegram_id = ?",
             (username, full_name, telegram_id)
         )
-        self.conn.commit()
 
-    def get_total_users_count(self):
-        self.cursor.execute("SELECT COUNT(*) FROM users")
-        return self.cursor.fetchone()[0]
-
-    def get_total_supervisors_count(self):
-        self.cursor.execute("SELECT COUNT(*) FROM users WHERE role IN ('admin', 'supervisor')")
-        return self.cursor.fetchone()[0]
-
-    def get_users_paged(self, page=1, per_page=10):
-        offset = (page - 1) * per_page
-        self.cursor.execute("SELECT * FROM users ORDER BY joined_at DESC LIMIT ? OFFSET ?", (per_page, offset))
-        return self.cursor.fetchall()
-
-    def set_user_active(self, telegram_id, is_active):
-        self.cursor.execute("UPDATE users SET is_active = ? WHERE telegram_id = ?", (is_active, telegram_id))
-        self.conn.commit()
-
-    def get_user_by_telegram_id(self, telegram_id):
-        self.cursor.execute(
+    @writes
+    def upsert_users(self, conn, rows):
+        # rows: (telegram_id, username, full_name); keeps the existing role
+        conn.executemany("""
+            INSERT INTO users (telegram_id, username, full_name, joined_at)
+            VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+            ON CONFLICT (telegram_id) DO UPDATE SET
+                username = excluded.username,
+                full_name = excluded.full_name
+        """, rows)
+
+    @reads
+    def get_total_users_count(self, conn):
+        # Maintained by the users insert/delete triggers
+        row = conn.execute("SELECT value FROM statistics WHERE key = 'users_total'").fetchone()
+        return row[0] if row else 0
+
+    @reads
+    def get_total_supervisors_count(self, conn):
+        row = conn.execute("SELECT value FROM statistics WHERE key = 'supervisors'").fetchone()
+        return row[0] if row else 0
+
+    @reads
+    def get_users_page(self, conn, role=None, is_active=None, search=None, older_than=None, newer_than=None, limit=10):
+        # Keyset page over (joined_at, id), newest first. The cursors are
+        # users.id of the last/first row shown. Returns (rows, has_more) where
+        # has_more is about the direction being paged.
+        where, params = [], []
+        if role is not None:
+            where.append("role = ?")
+            params.append(role)
+        if is_active is not None:
+            where.append("is_active = ?")
+            params.append(is_active)
+        if search:
+            # Prefix match on username / full name through the NOCASE indexes
+            upper = search + "\U0010ffff"
+            where.append("""id IN (
+                SELECT id FROM users WHERE username >= ? COLLATE NOCASE AND username < ? COLLATE NOCASE
+                UNION
+                SELECT id FROM users WHERE full_name >= ? COLLATE NOCASE AND full_name < ? COLLATE NOCASE
+                UNION
+                SELECT id FROM users WHERE telegram_id = ?
+            )""")
+            params += [search, upper, search, upper, int(search) if search.isdigit() else None]
+        order = "DESC"
+        if older_than is not None:
+            where.append("(joined_at, id) < (SELECT joined_at, id FROM users WHERE id = ?)")
+            params.append(older_than)
+        elif newer_than is not None:
+            where.append("(joined_at, id) > (SELECT joined_at, id FROM users WHERE id = ?)")
+            params.append(newer_than)
+            order = "ASC"
+        query = "SELECT * FROM users"
+        if where:
+            query += " WHERE " + " AND ".join(where)
+        query += f" ORDER BY joined_at {order}, id {order} LIMIT ?"
+        rows = conn.execute(query, params + [limit + 1]).fetchall()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        if order == "ASC":
+            rows.reverse()
+        return rows, has_more
+
+    @notifies("users", key="telegram_id")
+    @writes
+    def set_user_active(self, conn, telegram_id, is_active):
+        conn.execute("UPDATE users SET is_active = ? WHERE telegram_id = ?", (is_active, telegram_id))
+
+    @reads
+    def get_user_by_telegram_id(self, conn, telegram_id):
+        return self._fetch_user(conn, telegram_id)
+
+    @notifies("users", key="telegram_id")
+    @writes
+    def delete_user(self, conn, telegram_id):
+        conn.execute("DELETE FROM users WHERE telegram_id = ?", (telegram_id,))
+
+
+    def _fetch_user(self, conn, telegram_id):
+        # Plain helper for methods that already hold a connection
+        return conn.execute(
             "SELECT * FROM users WHERE telegram_id = ?",
             (telegram_id,)
-        )
-        return self.cursor.fetchone()
+        ).fetchone()
 
     # ======================
     # Permissions
     # ======================
-    def add_permission(self, user_id, permission):
-        self.cursor.execute(
+    @writes
+    def add_permission(self, conn, user_id, permission):
+        conn.execute(
             "INSERT INTO permissions (user_id, permission) VALUES (?, ?)",
             (user_id, permission)
         )
-        self.conn.commit()
 
-    def get_permissions(self, user_id):
-        self.cursor.execute(
+    @reads
+    def get_permissions(self, conn, user_id):
+        rows = conn.execute(
             "SELECT permission FROM permissions WHERE user_id = ?",
             (user_id,)
-        )
-        return [row["permission"] for row in self.cursor.fetchall()]
+        ).fetchall()
+        return [row["permission"] for row in rows]
 
     # ======================
     # Buttons
     # ======================
-    def add_button(self, text, btn_type, content, parent_id=None, created_by=None):
-        self.cursor.execute("SELECT COUNT(*) FROM buttons")
-        count = self.cursor.fetchone()[0]
-        self.cursor.execute("""
+    @notifies("buttons")
+    @writes
+    def add_button(self, conn, text, btn_type, content, parent_id=None, created_by=None):
+        count = conn.execute("SELECT COUNT(*) FROM buttons").fetchone()[0]
+        conn.execute("""
         INSERT INTO buttons (text, type, content, parent_id, created_by, position)
         VALUES (?, ?, ?, ?, ?, ?)
         """, (text, btn_type, content, parent_id, created_by, count))
-        self.conn.commit()
 
-    def get_buttons(self, parent_id=None):
+    @reads
+    def get_all_buttons(self, conn):
+        return conn.execute("SELECT * FROM buttons ORDER BY position ASC, id ASC").fetchall()
+
+    @reads
+    def get_buttons(self, conn, parent_id=None):
         if parent_id is None:
-            self.cursor.execute(
+            return conn.execute(
                 "SELECT * FROM buttons WHERE parent_id IS NULL AND is_active = 1 ORDER BY position ASC"
-            )
-        else:
-            self.cursor.execute(
-                "SELECT * FROM buttons WHERE parent_id = ? AND is_active = 1 ORDER BY position ASC",
-                (parent_id,)
-            )
-        return self.cursor.fetchall()
-
-    def move_button(self, button_id, direction):
+            ).fetchall()
+        return conn.execute(
+            "SELECT * FROM buttons WHERE parent_id = ? AND is_active = 1 ORDER BY position ASC",
+            (parent_id,)
+        ).fetchall()
+
+    @notifies("buttons")
+    @writes
+    def move_button(self, conn, button_id, direction):
         # direction: 'up' or 'down'
-        self.cursor.execute("SELECT position FROM buttons WHERE id = ?", (button_id,))
-        current_pos = self.cursor.fetchone()[0]
-        
+        current_pos = conn.execute("SELECT position FROM buttons WHERE id = ?", (button_id,)).fetchone()[0]
+
         if direction == 'up':
-            self.cursor.execute("SELECT id, position FROM buttons WHERE position < ? ORDER BY position DESC LIMIT 1", (current_pos,))
+            other = conn.execute("SELECT id, position FROM buttons WHERE position < ? ORDER BY position DESC LIMIT 1", (current_pos,)).fetchone()
         else:
-            self.cursor.execute("SELECT id, position FROM buttons WHERE position > ? ORDER BY position ASC LIMIT 1", (current_pos,))
-            
-        other = self.cursor.fetchone()
+            other = conn.execute("SELECT id, position FROM buttons WHERE position > ? ORDER BY position ASC LIMIT 1", (current_pos,)).fetchone()
+
         if other:
             other_id, other_pos = other
-            self.cursor.execute("UPDATE buttons SET position = ? WHERE id = ?", (other_pos, button_id))
-            self.cursor.execute("UPDATE buttons SET position = ? WHERE id = ?", (current_pos, other_id))
-            self.conn.commit()
+            conn.execute("UPDATE buttons SET position = ? WHERE id = ?", (other_pos, button_id))
+            conn.execute("UPDATE buttons SET position = ? WHERE id = ?", (current_pos, other_id))
             return True
         return False
 
-    def delete_button(self, button_id):
-        self.cursor.execute("DELETE FROM buttons WHERE id = ?", (button_id,))
-        self.conn.commit()
+    @notifies("buttons")
+    @writes
+    def delete_button(self, conn, button_id):
+        conn.execute("DELETE FROM buttons WHERE id = ?", (button_id,))
 
-    def update_button(self, button_id, text=None, content=None):
+    @notifies("buttons")
+    @writes
+    def update_button(self, conn, button_id, text=None, content=None):
         if text:
-            self.cursor.execute("UPDATE buttons SET text = ? WHERE id = ?", (text, button_id))
+            conn.execute("UPDATE buttons SET text = ? WHERE id = ?", (text, button_id))
         if content:
-            self.cursor.execute("UPDATE buttons SET content = ? WHERE id = ?", (content, button_id))
-        self.conn.commit()
+            conn.execute("UPDATE buttons SET content = ? WHERE id = ?", (content, button_id))
 
-    def get_button_by_id(self, button_id):
-        self.cursor.execute("SELECT * FROM buttons WHERE id = ?", (button_id,))
-        return self.cursor.fetchone()
+    @reads
+    def get_button_by_id(self, conn, button_id):
+        return conn.execute("SELECT * FROM buttons WHERE id = ?", (button_id,)).fetchone()
 
     # ======================
     # Admins / Supervisors
     # ======================
-    def get_admins(self):
-        self.cursor.execute(
+    @reads
+    def get_admins(self, conn):
+        return conn.execute(
             "SELECT * FROM users WHERE role IN ('admin', 'supervisor')"
-        )
-        return self.cursor.fetchall()
-
-    def update_user_role(self, telegram_id, role):
-        self.cursor.execute(
+        ).fetchall()
+
+    @reads
+    def get_staff_ids(self, conn):
+        rows = conn.execute(
+            "SELECT telegram_id FROM users WHERE role IN ('super_admin', 'admin', 'supervisor')"
+        ).fetchall()
+        return [row['telegram_id'] for row in rows]
+
+    @notifies("users", key="telegram_id")
+    @writes
+    def update_user_role(self, conn, telegram_id, role):
+        conn.execute(
             "UPDATE users SET role = ? WHERE telegram_id = ?",
             (role, telegram_id)
         )
-        self.conn.commit()
 
     # ======================
     # Permissions & Features
     # ======================
-    def get_features(self):
-        self.cursor.execute("SELECT * FROM features")
-        return self.cursor.fetchall()
-
-    def get_supervisor_permissions(self, telegram_id):
-        self.cursor.execute("SELECT feature_id FROM supervisor_permissions WHERE telegram_id = ?", (telegram_id,))
-        return [row['feature_id'] for row in self.cursor.fetchall()]
-
-    def set_supervisor_permission(self, telegram_id, feature_id, granted):
+    @reads
+    def get_features(self, conn):
+        return conn.execute("SELECT * FROM features").fetchall()
+
+    @reads
+    def get_supervisor_permissions(self, conn, telegram_id):
+        rows = conn.execute("SELECT feature_id FROM supervisor_permissions WHERE telegram_id = ?", (telegram_id,)).fetchall()
+        return [row['feature_id'] for row in rows]
+
+    @notifies("users", key="telegram_id")
+    @writes
+    def set_supervisor_permission(self, conn, telegram_id, feature_id, granted):
         if granted:
-            self.cursor.execute("INSERT OR IGNORE INTO supervisor_permissions (telegram_id, feature_id) VALUES (?, ?)", (telegram_id, feature_id))
+            conn.execute("INSERT OR IGNORE INTO supervisor_permissions (telegram_id, feature_id) VALUES (?, ?)", (telegram_id, feature_id))
         else:
-            self.cursor.execute("DELETE FROM supervisor_permissions WHERE telegram_id = ? AND feature_id = ?", (telegram_id, feature_id))
-        self.conn.commit()
+            conn.execute("DELETE FROM supervisor_permissions WHERE telegram_id = ? AND feature_id = ?", (telegram_id, feature_id))
 
-    def has_permission(self, telegram_id, feature_id):
-        user = self.get_user_by_telegram_id(telegram_id)
+    @reads
+    def has_permission(self, conn, telegram_id, feature_id):
+        user = self._fetch_user(conn, telegram_id)
         if not user: return False
         if user['role'] in ('super_admin', 'admin'): return True
-        self.cursor.execute("SELECT 1 FROM supervisor_permissions WHERE telegram_id = ? AND feature_id = ?", (telegram_id, feature_id))
-        return bool(self.cursor.fetchone())
-
-    def delete_supervisor(self, telegram_id):
-        self.cursor.execute("DELETE FROM users WHERE telegram_id = ?", (telegram_id,))
-        self.cursor.execute("DELETE FROM supervisor_permissions WHERE telegram_id = ?", (telegram_id,))
-        self.conn.commit()
-    def add_support_message(self, user_id, message_text, is_from_admin=0, admin_id=None, button_id=None, admin_name=None):
-        self.cursor.execute("""
+        row = conn.execute("SELECT 1 FROM supervisor_permissions WHERE telegram_id = ? AND feature_id = ?", (telegram_id, feature_id)).fetchone()
+        return bool(row)
+
+    @reads
+    def get_auth_snapshot(self, conn, telegram_id):
+        # User row plus granted feature ids in one trip to the reader pool
+        user = self._fetch_user(conn, telegram_id)
+        if not user:
+            return None, []
+        rows = conn.execute("SELECT feature_id FROM supervisor_permissions WHERE telegram_id = ?", (telegram_id,)).fetchall()
+        return user, [row['feature_id'] for row in rows]
+
+    @notifies("users", key="telegram_id")
+    @writes
+    def delete_supervisor(self, conn, telegram_id):
+        conn.execute("DELETE FROM users WHERE telegram_id = ?", (telegram_id,))
+        conn.execute("DELETE FROM supervisor_permissions WHERE telegram_id = ?", (telegram_id,))
+
+    @writes
+    def add_support_message(self, conn, user_id, message_text, is_from_admin=0, admin_id=None, button_id=None, admin_name=None):
+        cursor = conn.execute("""
             INSERT INTO support_messages (user_id, message_text, is_from_admin, admin_id, button_id, admin_name)
             VALUES (?, ?, ?, ?, ?, ?)
         """, (user_id, message_text, is_from_admin, admin_id, button_id, admin_name))
-        self.conn.commit()
-
-    def get_messages_by_button(self, button_id):
-        self.cursor.execute("""
-            SELECT sm.*, u.username, u.full_name 
-            FROM support_messages sm 
-            LEFT JOIN users u ON sm.user_id = u.telegram_id 
-            WHERE sm.button_id = ? 
-            ORDER BY sm.timestamp ASC
-        """, (button_id,))
-        return self.cursor.fetchall()
-
-    def add_admin_log(self, admin_id, admin_name, action_type, section, details):
-        user = self.get_user_by_telegram_id(admin_id)
+        return cursor.lastrowid
+
+    @reads
+    def get_messages_page(self, conn, button_id, before_id=None, after_id=None, limit=20):
+        # Keyset window over (button_id, id): the newest messages, those older
+        # than before_id, or those newer than after_id. Rows come back nearest
+        # to the cursor first (newest first unless paging forward).
+        query = """
+            SELECT sm.*, u.username, u.full_name
+            FROM support_messages sm
+            LEFT JOIN users u ON sm.user_id = u.telegram_id
+            WHERE sm.button_id = ?
+        """
+        if after_id is not None:
+            return conn.execute(query + " AND sm.id > ? ORDER BY sm.id ASC LIMIT ?", (button_id, after_id, limit)).fetchall()
+        if before_id is not None:
+            return conn.execute(query + " AND sm.id < ? ORDER BY sm.id DESC LIMIT ?", (button_id, before_id, limit)).fetchall()
+        return conn.execute(query + " ORDER BY sm.id DESC LIMIT ?", (button_id, limit)).fetchall()
+
+    @reads
+    def has_messages_around(self, conn, button_id, first_id, last_id):
+        older = conn.execute(
+            "SELECT 1 FROM support_messages WHERE button_id = ? AND id < ? LIMIT 1", (button_id, first_id)
+        ).fetchone()
+        newer = conn.execute(
+            "SELECT 1 FROM support_messages WHERE button_id = ? AND id > ? LIMIT 1", (button_id, last_id)
+        ).fetchone()
+        return older is not None, newer is not None
+
+    @writes
+    def add_admin_log(self, conn, admin_id, admin_name, action_type, section, details):
+        user = self._fetch_user(conn, admin_id)
         # Use existing name and username from users table to ensure consistency
         # If user is not in DB (rare), fall back to provided admin_name
         current_name = user['full_name'] if user and user['full_name'] else admin_name
         username = user['username'] if user and user['username'] else None
-        
-        self.cursor.execute("""
+
+        conn.execute("""
             INSERT INTO admin_logs (admin_id, admin_name, action_type, section, details, username)
             VALUES (?, ?, ?, ?, ?, ?)
         """, (admin_id, current_name, action_type, section, details, username))
-        self.conn.commit()
 
-    def delete_admin_log(self, log_id):
-        self.cursor.execute("DELETE FROM admin_logs WHERE id = ?", (log_id,))
-        self.conn.commit()
+    @reads
+    def get_admin_log_by_id(self, conn, log_id):
+        return conn.execute("SELECT * FROM admin_logs WHERE id = ?", (log_id,)).fetchone()
+
+    @writes
+    def delete_admin_log(self, conn, log_id):
+        conn.execute("DELETE FROM admin_logs WHERE id = ?", (log_id,))
+
+    @writes
+    def clear_all_admin_logs(self, conn):
+        conn.execute("DELETE FROM admin_logs")
 
-    def clear_all_admin_logs(self):
-        self.cursor.execute("DELETE FROM admin_logs")
-        self.conn.commit()
+    @reads
+    def get_admin_logs(self, conn, limit=20):
+        return conn.execute("SELECT * FROM admin_logs ORDER BY timestamp DESC LIMIT ?", (limit,)).fetchall()
 
-    def get_admin_logs(self, limit=20):
-        self.cursor.execute("SELECT * FROM admin_logs ORDER BY timestamp DESC LIMIT ?", (limit,))
-        return self.cursor.fetchall()
+    @reads
+    def get_contact_buttons(self, conn):
+        return conn.execute("SELECT * FROM buttons WHERE type = 'contact' AND is_active = 1").fetchall()
 
-    def get_contact_buttons(self):
-        self.cursor.execute("SELECT * FROM buttons WHERE type = 'contact' AND is_active = 1")
-        return self.cursor.fetchall()
+    @writes
+    def delete_support_message(self, conn, message_id):
+        conn.execute("DELETE FROM support_messages WHERE id = ?", (message_id,))
 
-    def delete_support_message(self, message_id):
-        self.cursor.execute("DELETE FROM support_messages WHERE id = ?", (message_id,))
-        self.conn.commit()
+    @writes
+    def clear_support_messages_by_button(self, conn, button_id):
+        conn.execute("DELETE FROM support_messages WHERE button_id = ?", (button_id,))
 
-    def clear_support_messages_by_button(self, button_id):
-        self.cursor.execute("DELETE FROM support_messages WHERE button_id = ?", (button_id,))
-        self.conn.commit()
+    @reads
+    def get_message_by_id(self, conn, message_id):
+        return conn.execute("SELECT * FROM support_messages WHERE id = ?", (message_id,)).fetchone()
+
+    # ======================
+    # Broadcasts
+    # ======================
+    @reads
+    def get_broadcast_recipients_count(self, conn):
+        return conn.execute("SELECT COUNT(*) FROM users WHERE role = 'user'").fetchone()[0]
+
+    @reads
+    def get_broadcast_recipients_after(self, conn, last_telegram_id, limit):
+        # Keyset page over the telegram_id unique index
+        rows = conn.execute(
+            "SELECT telegram_id FROM users WHERE role = 'user' AND telegram_id > ? ORDER BY telegram_id LIMIT ?",
+            (last_telegram_id, limit)
+        ).fetchall()
+        return [row['telegram_id'] for row in rows]
+
+    @writes
+    def create_broadcast_job(self, conn, admin_id, admin_name, text, total, status_chat_id, status_message_id):
+        cursor = conn.execute("""
+            INSERT INTO broadcast_jobs (admin_id, admin_name, text, total, status_chat_id, status_message_id)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, (admin_id, admin_name, text, total, status_chat_id, status_message_id))
+        return cursor.lastrowid
+
+    @reads
+    def get_broadcast_job(self, conn, job_id):
+        return conn.execute("SELECT * FROM broadcast_jobs WHERE id = ?", (job_id,)).fetchone()
+
+    @reads
+    def get_running_broadcast_jobs(self, conn):
+        return conn.execute("SELECT * FROM broadcast_jobs WHERE status = 'running' ORDER BY id").fetchall()
+
+    @writes
+    def save_broadcast_progress(self, conn, job_id, last_recipient_id, sent, failed, failures=()):
+        # failures: (chat_id, error) for this batch; stored with the cursor
+        conn.execute(
+            "UPDATE broadcast_jobs SET last_recipient_id = ?, sent = ?, failed = ? WHERE id = ?",
+            (last_recipient_id, sent, failed, job_id)
+        )
+        conn.executemany(
+            "INSERT INTO delivery_failures (kind, reference_id, chat_id, error) VALUES ('broadcast', ?, ?, ?)",
+            [(job_id, chat_id, error) for chat_id, error in failures]
+        )
 
-    def get_message_by_id(self, message_id):
-        self.cursor.execute("SELECT * FROM support_messages WHERE id = ?", (message_id,))
-        return self.cursor.fetchone()
+    @writes
+    def add_delivery_failures(self, conn, kind, reference_id, failures):
+        # failures: (chat_id, error)
+        conn.executemany(
+            "INSERT INTO delivery_failures (kind, reference_id, chat_id, error) VALUES (?, ?, ?, ?)",
+            [(kind, reference_id, chat_id, error) for chat_id, error in failures]
+        )
+
+    @writes
+    def finish_broadcast_job(self, conn, job_id):
+        conn.execute(
+            "UPDATE broadcast_jobs SET status = 'done', finished_at = CURRENT_TIMESTAMP WHERE id = ?",
+            (job_id,)
+        )
+
+    # ======================
+    # FSM storage
+    # ======================
+    @reads
+    def get_fsm_record(self, conn, key):
+        return conn.execute("SELECT state, data FROM fsm_states WHERE key = ?", (key,)).fetchone()
+
+    @writes
+    def save_fsm_records(self, conn, rows):
+        # rows: (key, state, data_json, updated_at); empty contexts are deleted
+        conn.executemany(
+            "DELETE FROM fsm_states WHERE key = ?",
+            [(key,) for key, state, data, _ in rows if state is None and data == "{}"]
+        )
+        conn.executemany("""
+            INSERT INTO fsm_states (key, state, data, updated_at) VALUES (?, ?, ?, ?)
+            ON CONFLICT (key) DO UPDATE SET
+                state = excluded.state,
+                data = excluded.data,
+                updated_at = excluded.updated_at
+        """, [row for row in rows if not (row[1] is None and row[2] == "{}")])
+
+    @reads
+    def get_expired_fsm_records(self, conn, now, idle_ttl, state_ttls):
+        # Rows idle for longer than their state group's TTL (state_ttls:
+        # group -> seconds, idle_ttl for no state and unlisted groups). The
+        # updated_at index narrows the scan to rows past the shortest TTL;
+        # the CASE applies each row's own TTL so only expired rows come back.
+        shortest = min([idle_ttl, *state_ttls.values()])
+        ttl, params = "?", [idle_ttl]
+        if state_ttls:
+            group = "CASE WHEN instr(state, ':') THEN substr(state, 1, instr(state, ':') - 1) ELSE state END"
+            whens = " ".join("WHEN ? THEN ?" for _ in state_ttls)
+            ttl = f"CASE {group} {whens} ELSE ? END"
+            params = [value for item in state_ttls.items() for value in item] + [idle_ttl]
+        return conn.execute(
+            "SELECT key, length(data) AS size, updated_at FROM fsm_states "
+            f"WHERE updated_at < ? AND updated_at < ? - (CASE WHEN state IS NULL THEN ? ELSE {ttl} END)",
+            (now - shortest, now, idle_ttl, *params)
+        ).fetchall()
+
+    @writes
+    def delete_fsm_records(self, conn, rows):
+        # rows: (key, updated_at) as read by get_expired_fsm_records; a context
+        # written since then keeps its row
+        cursor = conn.executemany("DELETE FROM fsm_states WHERE key = ? AND updated_at = ?", rows)
+        return cursor.rowcount
+
+    # ======================
+    # Statistics
+    # ======================
+    # Counters and daily_stats are maintained by triggers (see migrations 7
+    # and 8), except the batched activity written by record_activity.
+    @reads
+    def get_statistics(self, conn):
+        return {row['key']: row['value'] for row in conn.execute("SELECT key, value FROM statistics")}
+
+    @reads
+    def get_daily_stats(self, conn, days=7):
+        return conn.execute("SELECT * FROM daily_stats ORDER BY day DESC LIMIT ?", (days,)).fetchall()
+
+    @writes
+    def record_activity(self, conn, day, telegram_ids, presses=None):
+        # One last_seen bump per user and day; trg_users_last_seen counts it.
+        # presses: {button_id: count} for this day.
+        conn.executemany(
+            "UPDATE users SET last_seen = ? WHERE telegram_id = ? AND (last_seen IS NULL OR last_seen < ?)",
+            [(day, telegram_id, day) for telegram_id in telegram_ids]
+        )
+        if presses:
+            conn.executemany("""
+                INSERT INTO button_presses (day, button_id, presses) VALUES (?, ?, ?)
+                ON CONFLICT (day, button_id) DO UPDATE SET presses = presses + excluded.presses
+            """, [(day, button_id, count) for button_id, count in presses.items()])
+            conn.execute("""
+                INSERT INTO daily_stats (day, button_presses) VALUES (?, ?)
+                ON CONFLICT (day) DO UPDATE SET button_presses = button_presses + excluded.button_presses
+            """, (day, sum(presses.values())))
+
+    @reads
+    def get_hot_buttons(self, conn, since_day, limit=10):
+        return conn.execute("""
+            SELECT bp.button_id, b.text, b.parent_id, SUM(bp.presses) AS presses
+            FROM button_presses bp
+            LEFT JOIN buttons b ON b.id = bp.button_id
+            WHERE bp.day >= ?
+            GROUP BY bp.button_id
+            ORDER BY presses DESC
+            LIMIT ?
+        """, (since_day, limit)).fetchall()
+
+# ======================
+# Shared instance
+# ======================
+# Import this everywhere instead of building new Database() objects, so the
+# whole process shares one writer connection and one reader pool.
+db = Database()
@@ -0,0 +1,204 @@
+# executor.py
+
+import asyncio
+import collections
+import logging
+import time
+
+from aiogram import Dispatcher
+from aiogram.dispatcher.middlewares.user_context import UserContextMiddleware
+
+from config import (
+    EXECUTOR_MAX_CONCURRENCY, EXECUTOR_SHED_QUEUE_DEPTH, EXECUTOR_SHED_WAIT_MS, EXECUTOR_BUSY_REPLY_INTERVAL,
+)
+from auth_cache import auth_cache
+from metrics import executor_updates, executor_chats, executor_chat_depth, executor_wait_seconds, executor_shed
+
+# Highest priority first
+LANES = ("staff", "user")
+BUSY_TEXT = "⏳ البوت مشغول حالياً بسبب كثرة الطلبات، حاول مرة أخرى بعد قليل."
+
+
+def chat_key(update):
+    # Updates of one chat are ordered; those without a chat (e.g. inline
+    # queries) are ordered per user, and the rest not at all
+    context = UserContextMiddleware.resolve_event_context(update)
+    if context.chat is not None:
+        return context.chat.id
+    if context.user is not None:
+        return context.user.id
+    return None
+
+
+async def update_lane(update):
+    context = UserContextMiddleware.resolve_event_context(update)
+    if context.user is not None and await auth_cache.is_known_staff(context.user.id):
+        return "staff"
+    return "user"
+
+
+# ======================
+# Priority slots
+# ======================
+class PrioritySlots:
+    # A semaphore whose freed slots go to the waiters of the highest lane
+    # first, FIFO within a lane
+    def __init__(self, size, lanes=LANES):
+        self.free = size
+        self.waiters = {lane: collections.deque() for lane in lanes}
+
+    def waiting(self):
+        return sum(len(queue) for queue in self.waiters.values())
+
+    async def acquire(self, lane):
+        if self.free:
+            self.free -= 1
+            return
+        slot = asyncio.get_running_loop().create_future()
+        queue = self.waiters[lane]
+        queue.append(slot)
+        try:
+            await slot
+        except asyncio.CancelledError:
+            if slot.cancelled():
+                queue.remove(slot)
+            else:
+                # Handed a slot just as we were cancelled: pass it on
+                self.release()
+            raise
+
+    def release(self):
+        for queue in self.waiters.values():
+            while queue:
+                slot = queue.popleft()
+                if not slot.done():
+                    slot.set_result(None)
+                    return
+        self.free += 1
+
+
+# ======================
+# Update executor
+# ======================
+class UpdateExecutor:
+    # Each chat has a FIFO of the updates it sent; only the head runs, so a
+    # user's second tap sees the FSM data and button order the first one
+    # left. Heads of different chats run in parallel, at most
+    # max_concurrency at a time, staff before users. When the backlog grows
+    # past shed_queue_depth, or a user update waited longer than
+    # shed_wait_ms for its slot, user updates get BUSY_TEXT instead of being
+    # handled.
+    def __init__(self, max_concurrency=EXECUTOR_MAX_CONCURRENCY, shed_queue_depth=EXECUTOR_SHED_QUEUE_DEPTH,
+                 shed_wait_ms=EXECUTOR_SHED_WAIT_MS, busy_reply_interval=EXECUTOR_BUSY_REPLY_INTERVAL,
+                 classify=update_lane):
+        self.slots = PrioritySlots(max_concurrency)
+        self.chats = {}  # chat key -> deque of turn futures, head first
+        self.shed_queue_depth = shed_queue_depth
+        self.shed_wait = shed_wait_ms / 1000
+        self.busy_reply_interval = busy_reply_interval
+        self.busy_replied = {}  # chat id -> monotonic time of the last busy message
+        self.classify = classify
+
+    async def run(self, bot, update, function, *args, **kwargs):
+        arrived = time.perf_counter()
+        key = chat_key(update)
+        if key is None:
+            return await self._run_in_slot(bot, update, await self.classify(update), arrived, function, *args, **kwargs)
+
+        # The place in the chat's queue is taken before the first await
+        queue = self.chats.get(key)
+        if queue is None:
+            queue = self.chats[key] = collections.deque()
+            executor_chats.inc()
+        executor_chat_depth.observe(len(queue))
+        turn = asyncio.get_running_loop().create_future()
+        queue.append(turn)
+        if len(queue) == 1:
+            turn.set_result(None)
+
+        try:
+            lane = await self.classify(update)
+            if not turn.done():
+                executor_updates.inc(lane, "waiting_chat")
+                try:
+                    await turn
+                finally:
+                    executor_updates.dec(lane, "waiting_chat")
+            return await self._run_in_slot(bot, update, lane, arrived, function, *args, **kwargs)
+        finally:
+            # Also reached when cancelled while waiting: leave the queue and
+            # pass the turn on if it was ours
+            was_head = queue[0] is turn
+            queue.remove(turn)
+            if queue:
+                # The next turn may already be cancelled; its task's own
+                # finally then passes the turn on
+                if was_head and not queue[0].done():
+                    queue[0].set_result(None)
+            else:
+                del self.chats[key]
+                executor_chats.dec()
+
+    async def _run_in_slot(self, bot, update, lane, arrived, function, *args, **kwargs):
+        if lane == "user" and self.shed_queue_depth and self.slots.waiting() >= self.shed_queue_depth:
+            return await self._shed(bot, update, "queue_depth")
+
+        executor_updates.inc(lane, "waiting_slot")
+        queued = time.perf_counter()
+        try:
+            await self.slots.acquire(lane)
+        finally:
+            executor_updates.dec(lane, "waiting_slot")
+        now = time.perf_counter()
+        if lane == "user" and self.shed_wait and now - queued > self.shed_wait:
+            self.slots.release()
+            return await self._shed(bot, update, "wait")
+
+        executor_wait_seconds.observe(now - arrived, lane)
+        executor_updates.inc(lane, "running")
+        try:
+            return await function(*args, **kwargs)
+        finally:
+            executor_updates.dec(lane, "running")
+            self.slots.release()
+
+    async def _shed(self, bot, update, reason):
+        executor_shed.inc(update.event_type, reason)
+        try:
+            if update.callback_query is not None:
+                # Also stops the button's loading indicator
+                await bot.answer_callback_query(update.callback_query.id, text=BUSY_TEXT)
+            elif update.message is not None and self._may_reply(update.message.chat.id):
+                await bot.send_message(update.message.chat.id, BUSY_TEXT)
+        except Exception:
+            logging.exception("Busy reply failed")
+
+    def _may_reply(self, chat_id):
+        # One busy message per chat and interval, so a flood is not answered
+        # by a second flood
+        now = time.monotonic()
+        if now - self.busy_replied.get(chat_id, float("-inf")) < self.busy_reply_interval:
+            return False
+        if len(self.busy_replied) > 10_000:
+            self.busy_replied = {
+                chat: replied for chat, replied in self.busy_replied.items()
+                if now - replied < self.busy_reply_interval
+            }
+        self.busy_replied[chat_id] = now
+        return True
+
+
+executor = UpdateExecutor()
+
+
+class OrderedDispatcher(Dispatcher):
+    # Every update goes through feed_update (polling tasks, the webhook
+    # handler, tools/replay.py), and it waits for its turn before aiogram's
+    # own outer middlewares run, so even the FSM state is read only after
+    # the chat's previous update finished.
+    def __init__(self, executor, **kwargs):
+        super().__init__(**kwargs)
+        self.executor = executor
+
+    async def feed_update(self, bot, update, **kwargs):
+        return await self.executor.run(bot, update, super().feed_update, bot, update, **kwargs)
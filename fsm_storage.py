@@ -0,0 +1,183 @@
+# fsm_storage.py
+
+import asyncio
+import copy
+import json
+import logging
+import time
+from collections import OrderedDict
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder
+
+from config import (
+    FSM_CACHE_SIZE, FSM_FLUSH_INTERVAL_MS, FSM_FLUSH_MAX_ROWS,
+    FSM_IDLE_TTL, FSM_STATE_TTLS, FSM_SWEEP_INTERVAL,
+)
+from database import db
+from write_behind import WriteBehind
+from metrics import fsm_swept, fsm_swept_bytes
+
+
+# ======================
+# SQLite FSM storage
+# ======================
+class SQLiteStorage(WriteBehind, BaseStorage):
+    # FSM contexts live in the fsm_states table so menu position and
+    # half-finished flows survive a restart. The most recently used contexts
+    # are kept in an LRU; changes go to the LRU at once and are written to
+    # SQLite in one transaction every interval or batch size. Contexts idle
+    # for longer than their state group's TTL are dropped by a sweeper.
+    name = "FSM"
+
+    def __init__(self, database, max_entries=FSM_CACHE_SIZE,
+                 flush_interval_ms=FSM_FLUSH_INTERVAL_MS, max_rows=FSM_FLUSH_MAX_ROWS,
+                 idle_ttl=FSM_IDLE_TTL, state_ttls=FSM_STATE_TTLS, sweep_interval=FSM_SWEEP_INTERVAL):
+        super().__init__(flush_interval_ms / 1000)
+        self.db = database
+        self.max_entries = max_entries
+        self.max_rows = max_rows
+        self.key_builder = DefaultKeyBuilder(with_bot_id=True, with_business_connection_id=True, with_destiny=True)
+        self.cache = OrderedDict()  # key -> (state, data)
+        self.dirty = {}             # key -> (state, data) not yet written
+        self.touched = {}           # key -> last access (unix time), for cached keys
+        self.idle_ttl = idle_ttl
+        self.state_ttls = state_ttls
+        self.sweep_interval = sweep_interval
+        self._sweeper = None
+
+    # ---- cache ----
+    def _remember(self, key, record):
+        self.cache[key] = record
+        self.cache.move_to_end(key)
+        self.touched[key] = time.time()
+        while len(self.cache) > self.max_entries:
+            # Dirty entries stay readable from self.dirty until flushed
+            evicted, _ = self.cache.popitem(last=False)
+            self.touched.pop(evicted, None)
+
+    def _start_tasks(self):
+        self._start()
+        if self._sweeper is None:
+            self._sweeper = asyncio.get_running_loop().create_task(self._sweep_loop())
+
+    async def _load(self, key):
+        self._start_tasks()
+        record = self.cache.get(key)
+        if record is not None:
+            self.cache.move_to_end(key)
+            self.touched[key] = time.time()
+            return record
+        record = self.dirty.get(key)
+        if record is None:
+            row = await self.db.get_fsm_record(key)
+            # A write may have landed while we were reading
+            if key in self.cache:
+                return self.cache[key]
+            record = (row["state"], json.loads(row["data"] or "{}")) if row else (None, {})
+        self._remember(key, record)
+        return record
+
+    def _store(self, key, record):
+        self._remember(key, record)
+        self.dirty[key] = record
+        self._start_tasks()
+        if len(self.dirty) >= self.max_rows:
+            self.wake()
+
+    # ---- BaseStorage ----
+    async def set_state(self, key, state=None):
+        storage_key = self.key_builder.build(key)
+        _, data = await self._load(storage_key)
+        self._store(storage_key, (state.state if isinstance(state, State) else state, data))
+
+    async def get_state(self, key):
+        state, _ = await self._load(self.key_builder.build(key))
+        return state
+
+    async def set_data(self, key, data):
+        storage_key = self.key_builder.build(key)
+        state, _ = await self._load(storage_key)
+        self._store(storage_key, (state, copy.deepcopy(dict(data))))
+
+    async def get_data(self, key):
+        _, data = await self._load(self.key_builder.build(key))
+        return copy.deepcopy(data)
+
+    async def close(self):
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            try:
+                await self._sweeper
+            except asyncio.CancelledError:
+                pass
+            self._sweeper = None
+        await self.stop()
+
+    # ---- write-behind ----
+    def _take(self):
+        batch, self.dirty = self.dirty, {}
+        return batch
+
+    async def _write(self, batch):
+        now = int(time.time())
+        rows = [(key, state, json.dumps(data, ensure_ascii=False), now) for key, (state, data) in batch.items()]
+        await self.db.save_fsm_records(rows)
+        return len(rows)
+
+    def _restore(self, batch):
+        for key, record in batch.items():
+            self.dirty.setdefault(key, record)
+
+    # ---- idle eviction ----
+    def ttl_for(self, state):
+        if state is None:
+            return self.idle_ttl
+        return self.state_ttls.get(state.split(":", 1)[0], self.idle_ttl)
+
+    async def _sweep_loop(self):
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            try:
+                await self.sweep()
+            except Exception:
+                logging.exception("FSM sweep failed")
+
+    async def sweep(self):
+        now = time.time()
+
+        # Cached contexts: expired ones are cleared through the normal flush
+        contexts = size = 0
+        for key, (state, data) in list(self.cache.items()):
+            if now - self.touched.get(key, now) <= self.ttl_for(state):
+                continue
+            del self.cache[key]
+            self.touched.pop(key, None)
+            if state is not None or data:
+                self.dirty[key] = (None, {})
+                size += len(json.dumps(data, ensure_ascii=False))
+            contexts += 1
+
+        # Stored contexts that are no longer cached (e.g. from before a restart)
+        expired, expired_size = [], 0
+        for row in await self.db.get_expired_fsm_records(int(now), self.idle_ttl, self.state_ttls):
+            key = row["key"]
+            if key in self.cache or key in self.dirty:
+                continue
+            expired.append((key, row["updated_at"]))
+            expired_size += row["size"] or 0
+        rows = await self.db.delete_fsm_records(expired) if expired else 0
+        size += expired_size
+
+        fsm_swept.inc("cache", amount=contexts)
+        fsm_swept.inc("table", amount=rows)
+        fsm_swept_bytes.inc(amount=size)
+        if contexts or rows:
+            logging.info(
+                f"FSM sweep: expired {contexts} cached contexts and {rows} stored rows "
+                f"(~{size} bytes of data); {len(self.cache)} contexts cached"
+            )
+        return contexts, rows, size
+
+
+fsm_storage = SQLiteStorage(db)
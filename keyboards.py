@@ -3,39 +3,69 @@
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton, ReplyKeyboardMarkup, KeyboardButton
 
 
-from database import Database
+from button_cache import button_tree
+from callbacks import ADMIN_PANEL, MANAGERS, MANAGER_ADD, BUTTONS_LIST, STATS
 
 # ======================
 # Main User Menu (Reply Keyboard)
 # ======================
-def main_menu_keyboard(is_admin=False):
-    db = Database()
+# Ready-to-send markups keyed by (parent_id, is_admin, placeholder). They only
+# depend on the button tree, so the cache is dropped whenever the tree reloads.
+_menu_cache = {}
+_menu_cache_version = None
+
+# Only on the keyboard sent by /start and registration, as before the cache
+WELCOME_PLACEHOLDER = "مرحباً بك في البوت..."
+
+
+def _build_menu_keyboard(buttons, parent_id, is_admin, placeholder):
     keyboard = []
-    
+
     # Always show refresh button
     if is_admin:
         keyboard.append([KeyboardButton(text="🔄 تحديث البوت"), KeyboardButton(text="🔧 لوحة التحكم")])
     else:
         keyboard.append([KeyboardButton(text="🔄 تحديث البوت")])
-    
-    # Add dynamic buttons from database
-    dynamic_buttons = db.get_buttons()
+
+    # Add dynamic buttons from the tree
     temp_row = []
-    for btn in dynamic_buttons:
+    for btn in buttons:
         temp_row.append(KeyboardButton(text=btn['text']))
         if len(temp_row) == 2:  # 2 buttons per row
             keyboard.append(temp_row)
             temp_row = []
     if temp_row:
         keyboard.append(temp_row)
-    
+
+    if parent_id:
+        keyboard.append([KeyboardButton(text="⬅️ العودة للقائمة السابقة")])
+        keyboard.append([KeyboardButton(text="🏠 القائمة الرئيسية")])
+
     return ReplyKeyboardMarkup(
         keyboard=keyboard,
         resize_keyboard=True,
-        input_field_placeholder="مرحباً بك في البوت..."
+        input_field_placeholder=placeholder
     )
 
 
+async def menu_keyboard(parent_id=None, is_admin=False, placeholder=None):
+    global _menu_cache_version
+    buttons = await button_tree.get_children(parent_id)
+    if _menu_cache_version != button_tree.version:
+        _menu_cache.clear()
+        _menu_cache_version = button_tree.version
+
+    key = (parent_id, is_admin, placeholder)
+    markup = _menu_cache.get(key)
+    if markup is None:
+        markup = _menu_cache[key] = _build_menu_keyboard(buttons, parent_id, is_admin, placeholder)
+    return markup
+
+
+async def main_menu_keyboard(is_admin=False):
+    return await menu_keyboard(None, is_admin, WELCOME_PLACEHOLDER)
+
+
 # ======================
 # Admin Main Menu
 # ======================
@@ -44,19 +74,19 @@ def admin_main_keyboard():
         [
             InlineKeyboardButton(
                 text="👥 إدارة المشرفين",
-                callback_data="admin:supervisors"
+                callback_data=MANAGERS.pack()
             )
         ],
         [
             InlineKeyboardButton(
                 text="🧱 إدارة الأزرار",
-                callback_data="admin:buttons"
+                callback_data=BUTTONS_LIST.pack()
             )
         ],
         [
             InlineKeyboardButton(
                 text="📊 الإحصائيات",
-                callback_data="admin:stats"
+                callback_data=STATS.pack()
             )
         ]
     ])
@@ -70,13 +100,13 @@ def supervisors_keyboard():
         [
             InlineKeyboardButton(
                 text="➕ إضافة مشرف",
-                callback_data="admin:add_supervisor"
+                callback_data=MANAGER_ADD.pack()
             )
         ],
         [
             InlineKeyboardButton(
                 text="⬅️ رجوع",
-                callback_data="admin:back"
+                callback_data=ADMIN_PANEL.pack()
             )
         ]
     ])
@@ -0,0 +1,249 @@
+# metrics.py
+
+import threading
+import time
+
+from aiohttp import web
+from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.dispatcher.event.bases import UNHANDLED
+
+
+# ======================
+# Metric types
+# ======================
+# A small in-process registry rendered in the Prometheus text format. Values
+# are updated from the event loop and from the database threads, hence the lock.
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+REGISTRY = []
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=""):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            lines.extend(self._samples())
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name, documentation, labels=()):
+        super().__init__(name, documentation, labels)
+        self.values = {}
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def _samples(self):
+        for label_values, value in sorted(self.values.items()):
+            yield f"{self.name}{_labels(self.label_names, label_values)} {value}"
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def __init__(self, name, documentation, labels=()):
+        super().__init__(name, documentation, labels)
+        self.values = {}
+
+    def set(self, value, *label_values):
+        with self._lock:
+            self.values[label_values] = value
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def dec(self, *label_values, amount=1):
+        self.inc(*label_values, amount=-amount)
+
+    def _samples(self):
+        for label_values, value in sorted(self.values.items()):
+            yield f"{self.name}{_labels(self.label_names, label_values)} {value}"
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+        self.series = {}  # label values -> [bucket counts..., sum, count]
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            series = self.series.get(label_values)
+            if series is None:
+                series = self.series[label_values] = [0] * (len(self.buckets) + 2)
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def _samples(self):
+        for label_values, series in sorted(self.series.items()):
+            for bound, count in zip(self.buckets, series):
+                labels = _labels(self.label_names, label_values, 'le="%s"' % bound)
+                yield f"{self.name}_bucket{labels} {count}"
+            labels = _labels(self.label_names, label_values, 'le="+Inf"')
+            yield f"{self.name}_bucket{labels} {series[-1]}"
+            yield f"{self.name}_sum{_labels(self.label_names, label_values)} {series[-2]}"
+            yield f"{self.name}_count{_labels(self.label_names, label_values)} {series[-1]}"
+
+
+def render_metrics():
+    return "\n".join(metric.render() for metric in REGISTRY) + "\n"
+
+
+async def metrics_handler(request):
+    return web.Response(
+        body=render_metrics().encode(),
+        headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"},
+    )
+
+
+# ======================
+# Metrics
+# ======================
+update_seconds = Histogram(
+    "bot_update_duration_seconds", "Time to process one update, filters included.", ("update_type", "handled")
+)
+handler_seconds = Histogram(
+    "bot_handler_duration_seconds", "Time spent in a matched handler.", ("handler", "event_type")
+)
+handler_errors = Counter(
+    "bot_handler_errors_total", "Handlers that raised.", ("handler", "event_type")
+)
+db_query_seconds = Histogram(
+    "bot_db_query_duration_seconds", "Database method run time on its thread, commit included.", ("method", "kind")
+)
+db_wait_seconds = Histogram(
+    "bot_db_queue_wait_seconds", "Time a database call waited for a free connection thread.", ("kind",)
+)
+db_rows = Counter(
+    "bot_db_rows_total", "Rows returned by reads and changed by writes.", ("method", "kind")
+)
+fsm_swept = Counter(
+    "bot_fsm_swept_total", "Idle FSM contexts dropped by the TTL sweep, from the cache or from the table.", ("source",)
+)
+fsm_swept_bytes = Counter(
+    "bot_fsm_swept_bytes_total", "Approximate size of the FSM data dropped by the TTL sweep."
+)
+route_hits = Counter(
+    "bot_text_route_hits_total", "Messages resolved by the fixed text / command prefix table.", ("route",)
+)
+callback_hits = Counter(
+    "bot_callback_route_hits_total", "Callback queries resolved by the callback data trie.", ("route",)
+)
+executor_updates = Gauge(
+    "bot_executor_updates", "Updates in the executor by lane and state: waiting_chat, waiting_slot, running.",
+    ("lane", "state")
+)
+executor_chats = Gauge(
+    "bot_executor_chats", "Chats with at least one update in the executor."
+)
+executor_chat_depth = Histogram(
+    "bot_executor_chat_depth", "Updates of the same chat already queued when an update arrives.",
+    buckets=(0, 1, 2, 4, 8, 16, 32, 64)
+)
+executor_wait_seconds = Histogram(
+    "bot_executor_wait_seconds", "Time from arrival until an update starts running.", ("lane",)
+)
+executor_shed = Counter(
+    "bot_executor_shed_total", "User updates answered with the busy reply instead of being handled.",
+    ("event_type", "reason")
+)
+api_seconds = Histogram(
+    "bot_api_request_duration_seconds", "Outbound Bot API call latency.", ("method",)
+)
+api_requests = Counter(
+    "bot_api_requests_total", "Outbound Bot API calls by result.", ("method", "status")
+)
+
+
+def observe_query(method, kind, waited, elapsed, rows):
+    db_wait_seconds.observe(waited, kind)
+    db_query_seconds.observe(elapsed, method, kind)
+    if rows:
+        db_rows.inc(method, kind, amount=rows)
+
+
+def row_count(result):
+    if result is None:
+        return 0
+    if isinstance(result, list):
+        return len(result)
+    return 1
+
+
+# ======================
+# Middlewares
+# ======================
+class UpdateMetricsMiddleware(BaseMiddleware):
+    # Outer update middleware: whole update, including unhandled ones
+    async def __call__(self, handler, event, data):
+        started = time.perf_counter()
+        result = UNHANDLED
+        try:
+            result = await handler(event, data)
+            return result
+        finally:
+            handled = "no" if result is UNHANDLED else "yes"
+            update_seconds.observe(time.perf_counter() - started, event.event_type, handled)
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    # Inner middleware: runs only once a handler matched
+    async def __call__(self, handler, event, data):
+        # Updates dispatched through routing.text_routes / callback_routes
+        # carry their route
+        route = data.get("text_route") or data.get("callback_route")
+        name = route.name if route is not None else data["handler"].callback.__name__
+        event_type = data["event_update"].event_type
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            handler_errors.inc(name, event_type)
+            raise
+        finally:
+            handler_seconds.observe(time.perf_counter() - started, name, event_type)
+
+
+class BotApiMetricsMiddleware(BaseRequestMiddleware):
+    async def __call__(self, make_request, bot, method):
+        name = type(method).__name__
+        started = time.perf_counter()
+        status = "ok"
+        try:
+            return await make_request(bot, method)
+        except Exception as e:
+            status = type(e).__name__
+            raise
+        finally:
+            api_seconds.observe(time.perf_counter() - started, name)
+            api_requests.inc(name, status)
@@ -0,0 +1,404 @@
+# migrations.py
+
+import logging
+
+
+# ======================
+# Registry
+# ======================
+# Ordered list of (version, description, apply_fn). Each migration runs in
+# its own transaction and is recorded in schema_version, so a database only
+# ever moves forward and every deploy converges on the same schema.
+MIGRATIONS = []
+
+
+def migration(version, description):
+    def register(func):
+        MIGRATIONS.append((version, description, func))
+        MIGRATIONS.sort(key=lambda item: item[0])
+        return func
+    return register
+
+
+def _columns(conn, table):
+    return {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+
+
+def _add_column_if_missing(conn, table, column, definition):
+    if column not in _columns(conn, table):
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+
+# ======================
+# Migrations
+# ======================
+@migration(1, "baseline schema")
+def baseline_schema(conn):
+    # Users
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS users (
+        id INTEGER PRIMARY KEY,
+        telegram_id INTEGER UNIQUE,
+        username TEXT,
+        full_name TEXT,
+        role TEXT DEFAULT 'user',
+        is_active INTEGER DEFAULT 1,
+        joined_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+
+    # Permissions
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS permissions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        permission TEXT,
+        FOREIGN KEY (user_id) REFERENCES users (id)
+    )
+    """)
+
+    # Buttons
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS buttons (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        text TEXT NOT NULL,
+        type TEXT NOT NULL,
+        content TEXT,
+        parent_id INTEGER,
+        is_active INTEGER DEFAULT 1,
+        created_by INTEGER,
+        position INTEGER DEFAULT 0,
+        FOREIGN KEY (parent_id) REFERENCES buttons (id),
+        FOREIGN KEY (created_by) REFERENCES users (id)
+    )
+    """)
+
+    # Messages (Support System)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS support_messages (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        admin_id INTEGER,
+        message_text TEXT,
+        is_from_admin INTEGER DEFAULT 0,
+        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+        button_id INTEGER,
+        admin_name TEXT
+    )
+    """)
+
+    # Pending Supervisors
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS pending_supervisors (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        username TEXT UNIQUE,
+        role TEXT DEFAULT 'supervisor'
+    )
+    """)
+
+    # Statistics
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS statistics (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        key TEXT UNIQUE,
+        value INTEGER DEFAULT 0
+    )
+    """)
+
+    # Features & supervisor permissions
+    conn.execute("CREATE TABLE IF NOT EXISTS features (id TEXT PRIMARY KEY, name_ar TEXT)")
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS supervisor_permissions (
+        telegram_id INTEGER,
+        feature_id TEXT,
+        PRIMARY KEY (telegram_id, feature_id)
+    )
+    """)
+
+    # Admin logs
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS admin_logs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        admin_id INTEGER,
+        admin_name TEXT,
+        action_type TEXT,
+        section TEXT,
+        details TEXT,
+        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+        username TEXT
+    )
+    """)
+
+    # Older databases were created before these columns existed
+    _add_column_if_missing(conn, "users", "username", "TEXT")
+    _add_column_if_missing(conn, "users", "full_name", "TEXT")
+    _add_column_if_missing(conn, "users", "joined_at", "DATETIME")
+    _add_column_if_missing(conn, "buttons", "position", "INTEGER DEFAULT 0")
+    _add_column_if_missing(conn, "support_messages", "button_id", "INTEGER")
+    _add_column_if_missing(conn, "support_messages", "admin_name", "TEXT")
+    _add_column_if_missing(conn, "admin_logs", "username", "TEXT")
+
+    conn.executemany(
+        "INSERT OR IGNORE INTO features (id, name_ar) VALUES (?, ?)",
+        [
+            ("managers", "إدارة المشرفين"),
+            ("buttons", "إدارة الأزرار"),
+            ("stats", "الإحصائيات"),
+            ("logs", "سجل المراسلات"),
+        ]
+    )
+
+
+@migration(2, "hot-path indexes")
+def hot_path_indexes(conn):
+    # get_buttons: WHERE parent_id = ? AND is_active = 1 ORDER BY position
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_buttons_parent_active_position ON buttons (parent_id, is_active, position)")
+    # get_messages_by_button: WHERE button_id = ? ORDER BY timestamp
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_support_messages_button_timestamp ON support_messages (button_id, timestamp)")
+    # get_admins / supervisors count: WHERE role IN (...)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_users_role ON users (role)")
+    # get_admin_logs: ORDER BY timestamp DESC LIMIT ?
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_admin_logs_timestamp ON admin_logs (timestamp)")
+
+
+@migration(3, "broadcast jobs and delivery failures")
+def broadcast_jobs(conn):
+    # One row per broadcast; last_recipient_id is a keyset cursor over
+    # users.telegram_id so an interrupted job resumes where it stopped.
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS broadcast_jobs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        admin_id INTEGER,
+        admin_name TEXT,
+        text TEXT NOT NULL,
+        status TEXT DEFAULT 'running',
+        total INTEGER DEFAULT 0,
+        sent INTEGER DEFAULT 0,
+        failed INTEGER DEFAULT 0,
+        last_recipient_id INTEGER DEFAULT 0,
+        status_chat_id INTEGER,
+        status_message_id INTEGER,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        finished_at DATETIME
+    )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_broadcast_jobs_status ON broadcast_jobs (status)")
+
+    # Messages the bot could not deliver (kind: 'broadcast', ...)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS delivery_failures (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        kind TEXT NOT NULL,
+        reference_id INTEGER,
+        chat_id INTEGER,
+        error TEXT,
+        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_delivery_failures_kind_reference ON delivery_failures (kind, reference_id)")
+
+
+@migration(4, "persistent FSM storage")
+def fsm_states(conn):
+    # One row per FSM context; rows with no state and no data are deleted
+    # instead of kept, so the table only holds users mid-flow or mid-menu.
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS fsm_states (
+        key TEXT PRIMARY KEY,
+        state TEXT,
+        data TEXT,
+        updated_at INTEGER
+    ) WITHOUT ROWID
+    """)
+
+
+@migration(5, "FSM idle sweep index")
+def fsm_idle_index(conn):
+    # SQLiteStorage.sweep: WHERE updated_at < ?
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_fsm_states_updated_at ON fsm_states (updated_at)")
+
+
+@migration(6, "support message keyset index")
+def support_messages_keyset(conn):
+    # get_messages_page: WHERE button_id = ? AND id < ? ORDER BY id DESC
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_support_messages_button_id ON support_messages (button_id, id)")
+
+
+@migration(7, "user list keyset, search and counter")
+def user_list_indexes(conn):
+    # Rows added after joined_at was introduced by ALTER TABLE got no default;
+    # the keyset below needs a value on every row.
+    conn.execute("UPDATE users SET joined_at = '1970-01-01 00:00:00' WHERE joined_at IS NULL")
+
+    # get_users_page: ORDER BY joined_at DESC, id DESC, optionally per role
+    # or is_active; idx_users_role is covered by the role composite
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_users_joined ON users (joined_at, id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_users_role_joined ON users (role, joined_at, id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_users_active_joined ON users (is_active, joined_at, id)")
+    conn.execute("DROP INDEX IF EXISTS idx_users_role")
+
+    # Prefix search: username >= ? COLLATE NOCASE AND username < ? COLLATE NOCASE
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_users_username_nocase ON users (username COLLATE NOCASE)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_users_full_name_nocase ON users (full_name COLLATE NOCASE)")
+
+    # statistics.users_total follows inserts and deletes in the same transaction
+    conn.execute("""
+        INSERT INTO statistics (key, value) VALUES ('users_total', (SELECT COUNT(*) FROM users))
+        ON CONFLICT (key) DO UPDATE SET value = excluded.value
+    """)
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS trg_users_total_insert AFTER INSERT ON users
+    BEGIN
+        UPDATE statistics SET value = value + 1 WHERE key = 'users_total';
+    END
+    """)
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS trg_users_total_delete AFTER DELETE ON users
+    BEGIN
+        UPDATE statistics SET value = value - 1 WHERE key = 'users_total';
+    END
+    """)
+
+
+@migration(8, "statistics counters and daily rollups")
+def statistics_counters(conn):
+    # Day of the last interaction, set in batches by activity.ActivityTracker
+    _add_column_if_missing(conn, "users", "last_seen", "DATE")
+
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS daily_stats (
+        day DATE PRIMARY KEY,
+        new_users INTEGER DEFAULT 0,
+        active_users INTEGER DEFAULT 0,
+        button_presses INTEGER DEFAULT 0,
+        support_messages INTEGER DEFAULT 0
+    )
+    """)
+
+    # Seed the counters from the current tables; the triggers below keep
+    # them in step inside the same transaction as every write
+    conn.execute("""
+        INSERT INTO statistics (key, value)
+        SELECT 'users_active', COUNT(*) FROM users WHERE is_active = 1
+        UNION ALL SELECT 'users_blocked', COUNT(*) FROM users WHERE is_active = 0
+        UNION ALL SELECT 'supervisors', COUNT(*) FROM users WHERE role IN ('admin', 'supervisor')
+        UNION ALL SELECT 'button_messages:' || button_id, COUNT(*) FROM support_messages
+            WHERE button_id IS NOT NULL GROUP BY button_id
+        ON CONFLICT (key) DO UPDATE SET value = excluded.value
+    """)
+
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS trg_users_counters_insert AFTER INSERT ON users
+    BEGIN
+        UPDATE statistics SET value = value + CASE key
+            WHEN 'users_active' THEN NEW.is_active IS 1
+            WHEN 'users_blocked' THEN NEW.is_active IS 0
+            WHEN 'supervisors' THEN NEW.role IN ('admin', 'supervisor') IS 1
+        END
+        WHERE key IN ('users_active', 'users_blocked', 'supervisors');
+        INSERT INTO daily_stats (day, new_users) VALUES (date('now'), 1)
+        ON CONFLICT (day) DO UPDATE SET new_users = new_users + 1;
+    END
+    """)
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS trg_users_counters_delete AFTER DELETE ON users
+    BEGIN
+        UPDATE statistics SET value = value - CASE key
+            WHEN 'users_active' THEN OLD.is_active IS 1
+            WHEN 'users_blocked' THEN OLD.is_active IS 0
+            WHEN 'supervisors' THEN OLD.role IN ('admin', 'supervisor') IS 1
+        END
+        WHERE key IN ('users_active', 'users_blocked', 'supervisors');
+    END
+    """)
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS trg_users_counters_update AFTER UPDATE OF is_active, role ON users
+    BEGIN
+        UPDATE statistics SET value = value + CASE key
+            WHEN 'users_active' THEN (NEW.is_active IS 1) - (OLD.is_active IS 1)
+            WHEN 'users_blocked' THEN (NEW.is_active IS 0) - (OLD.is_active IS 0)
+            WHEN 'supervisors' THEN (NEW.role IN ('admin', 'supervisor') IS 1) - (OLD.role IN ('admin', 'supervisor') IS 1)
+        END
+        WHERE key IN ('users_active', 'users_blocked', 'supervisors');
+    END
+    """)
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS trg_users_last_seen AFTER UPDATE OF last_seen ON users
+    WHEN OLD.last_seen IS NULL OR OLD.last_seen < NEW.last_seen
+    BEGIN
+        INSERT INTO daily_stats (day, active_users) VALUES (NEW.last_seen, 1)
+        ON CONFLICT (day) DO UPDATE SET active_users = active_users + 1;
+    END
+    """)
+
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS trg_support_messages_insert AFTER INSERT ON support_messages
+    BEGIN
+        INSERT INTO daily_stats (day, support_messages) VALUES (date('now'), NEW.is_from_admin IS NOT 1)
+        ON CONFLICT (day) DO UPDATE SET support_messages = support_messages + excluded.support_messages;
+    END
+    """)
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS trg_button_messages_insert AFTER INSERT ON support_messages
+    WHEN NEW.button_id IS NOT NULL
+    BEGIN
+        INSERT INTO statistics (key, value) VALUES ('button_messages:' || NEW.button_id, 1)
+        ON CONFLICT (key) DO UPDATE SET value = value + 1;
+    END
+    """)
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS trg_button_messages_delete AFTER DELETE ON support_messages
+    WHEN OLD.button_id IS NOT NULL
+    BEGIN
+        UPDATE statistics SET value = value - 1 WHERE key = 'button_messages:' || OLD.button_id;
+    END
+    """)
+
+
+@migration(9, "button press analytics")
+def button_presses(conn):
+    # Written in batches by activity.ActivityTracker; one row per button and day
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS button_presses (
+        day DATE NOT NULL,
+        button_id INTEGER NOT NULL,
+        presses INTEGER DEFAULT 0,
+        PRIMARY KEY (day, button_id)
+    ) WITHOUT ROWID
+    """)
+
+
+# ======================
+# Runner
+# ======================
+def current_version(conn):
+    row = conn.execute("SELECT MAX(version) FROM schema_version").fetchone()
+    return row[0] or 0
+
+
+def apply_migrations(conn):
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS schema_version (
+        version INTEGER PRIMARY KEY,
+        description TEXT,
+        applied_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+    version = current_version(conn)
+    for target, description, func in MIGRATIONS:
+        if target <= version:
+            continue
+        conn.execute("BEGIN")
+        try:
+            func(conn)
+            conn.execute(
+                "INSERT INTO schema_version (version, description) VALUES (?, ?)",
+                (target, description)
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        logging.info(f"Applied migration {target}: {description}")
+        version = target
+    return version
@@ -0,0 +1,64 @@
+# notifications.py
+
+import asyncio
+import logging
+
+from config import SUPER_ADMIN_ID
+from database import db
+from broadcast import send_with_retry
+
+
+# ======================
+# Admin recipients
+# ======================
+class AdminRecipients:
+    # Staff who get new support messages. Role changes go through the
+    # "users" notifications, which drop the cached list.
+    def __init__(self, database):
+        self.db = database
+        self.ids = None
+        database.subscribe("users", self.invalidate)
+
+    def invalidate(self, _key=None):
+        self.ids = None
+
+    async def get(self):
+        if self.ids is None:
+            admins = await self.db.get_admins()
+            ids = [admin['telegram_id'] for admin in admins]
+            # Also include super admin
+            if SUPER_ADMIN_ID not in ids:
+                ids.append(SUPER_ADMIN_ID)
+            self.ids = ids
+        return self.ids
+
+
+admin_recipients = AdminRecipients(db)
+_background_tasks = set()
+
+
+# ======================
+# Fan-out
+# ======================
+async def _fan_out(bot, kind, reference_id, text, reply_markup, parse_mode):
+    try:
+        admin_ids = await admin_recipients.get()
+        # Ahead of any running broadcast in the shared rate budget
+        errors = await asyncio.gather(*(
+            send_with_retry(bot, admin_id, text, priority=True, reply_markup=reply_markup, parse_mode=parse_mode)
+            for admin_id in admin_ids
+        ))
+        failures = [(admin_id, error) for admin_id, error in zip(admin_ids, errors) if error]
+        if failures:
+            logging.warning(f"{kind} notification #{reference_id}: {len(failures)} of {len(admin_ids)} admins not reached")
+            await db.add_delivery_failures(kind, reference_id, failures)
+    except Exception:
+        logging.exception(f"{kind} notification #{reference_id} failed")
+
+
+def notify_admins(bot, kind, reference_id, text, reply_markup=None, parse_mode=None):
+    # Fire-and-forget: the caller's update does not wait for the sends
+    task = asyncio.create_task(_fan_out(bot, kind, reference_id, text, reply_markup, parse_mode))
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
@@ -0,0 +1,305 @@
+# routing.py
+
+from collections import namedtuple
+
+from aiogram.dispatcher.event.handler import CallableObject
+
+from metrics import route_hits, callback_hits
+
+
+# ======================
+# Text routes
+# ======================
+# Fixed reply-keyboard texts and admin command prefixes are resolved here with
+# dict lookups instead of one aiogram filter per handler. A single handler on
+# the dispatcher asks resolve(); texts it does not know (dynamic buttons,
+# FSM input) fall through to the routers as before. Prefix routes only apply
+# outside FSM states, so "/del_..." typed as pending input stays input.
+class Route:
+    __slots__ = ("name", "handler")
+
+    def __init__(self, callback):
+        self.name = callback.__name__
+        # CallableObject passes each handler only the kwargs it declares,
+        # the way aiogram calls its own handlers
+        self.handler = CallableObject(callback)
+
+
+class TextRoutes:
+    def __init__(self):
+        self.exact = {}           # text -> Route
+        self.prefixes = {}        # prefix -> Route
+        self.prefix_lengths = []  # distinct prefix lengths, longest first
+
+    def text(self, *texts):
+        def register(callback):
+            route = Route(callback)
+            for text in texts:
+                if text in self.exact:
+                    raise ValueError(f"Duplicate text route: {text!r}")
+                self.exact[text] = route
+            return callback
+        return register
+
+    def prefix(self, *prefixes):
+        # Longest prefix wins, so "/del_log_" is never taken by "/del_"
+        def register(callback):
+            route = Route(callback)
+            for prefix in prefixes:
+                if prefix in self.prefixes:
+                    raise ValueError(f"Duplicate prefix route: {prefix!r}")
+                self.prefixes[prefix] = route
+            self.prefix_lengths = sorted({len(prefix) for prefix in self.prefixes}, reverse=True)
+            return callback
+        return register
+
+    def resolve(self, text, prefixes=True):
+        route = self.exact.get(text)
+        if route is not None or not prefixes:
+            return route
+        for length in self.prefix_lengths:
+            route = self.prefixes.get(text[:length])
+            if route is not None:
+                return route
+        return None
+
+    # aiogram filter: the matched route is handed to dispatch() as text_route
+    async def filter(self, message, raw_state=None):
+        if not message.text:
+            return False
+        route = self.resolve(message.text, prefixes=raw_state is None)
+        if route is None:
+            return False
+        return {"text_route": route}
+
+    async def dispatch(self, message, text_route, **data):
+        route_hits.inc(text_route.name)
+        return await text_route.handler.call(message, **data)
+
+
+text_routes = TextRoutes()
+
+
+# ======================
+# Callback data
+# ======================
+# Inline buttons carry at most 64 bytes of callback_data. A schema is a short
+# prefix plus typed fields joined by ":", integers in base 36, so even 64-bit
+# ids stay short; the worst case is checked when the schema is defined.
+CALLBACK_DATA_LIMIT = 64
+SEPARATOR = ":"
+BASE36 = "0123456789abcdefghijklmnopqrstuvwxyz"
+
+
+def to_base36(number):
+    if number < 0:
+        return "-" + to_base36(-number)
+    digits = ""
+    while True:
+        number, digit = divmod(number, 36)
+        digits = BASE36[digit] + digits
+        if not number:
+            return digits
+
+
+class Field:
+    width = 0
+
+    def __init__(self, optional=False):
+        self.optional = optional
+
+
+class Int(Field):
+    width = 14  # "-" + 13 base-36 digits covers any 64-bit integer
+
+    def __init__(self, optional=False, user_id=False):
+        super().__init__(optional)
+        # Telegram ids are remapped when updates are captured (capture.py)
+        self.user_id = user_id
+
+    def encode(self, value):
+        return to_base36(int(value))
+
+    def decode(self, text):
+        value = int(text, 36)
+        # int() also takes "+1", "1_0", upper case...; one spelling per value
+        if to_base36(value) != text:
+            raise ValueError(text)
+        return value
+
+
+class Bool(Field):
+    width = 1
+
+    def encode(self, value):
+        return "1" if value else "0"
+
+    def decode(self, text):
+        if text not in ("0", "1"):
+            raise ValueError(text)
+        return text == "1"
+
+
+class Choice(Field):
+    def __init__(self, *values, optional=False):
+        super().__init__(optional)
+        self.values = values
+        self.width = max(len(value) for value in values)
+
+    def encode(self, value):
+        if value not in self.values:
+            raise ValueError(f"{value!r} is not one of {self.values}")
+        return value
+
+    def decode(self, text):
+        if text not in self.values:
+            raise ValueError(text)
+        return text
+
+
+class Token(Field):
+    # Free text without the separator, e.g. a feature id from the database
+    def __init__(self, max_length, optional=False):
+        super().__init__(optional)
+        self.width = max_length
+
+    def encode(self, value):
+        if not value or SEPARATOR in value or len(value) > self.width:
+            raise ValueError(f"Bad token: {value!r}")
+        return value
+
+    def decode(self, text):
+        return self.encode(text)
+
+
+INT = Int()
+USER_ID = Int(user_id=True)
+
+
+class CallbackData:
+    # CallbackData("b:m", direction=Choice("up", "down"), button_id=INT)
+    #   .pack("up", 42)        -> "b:m:up:16"
+    #   .unpack("b:m:up:16")   -> Values(direction='up', button_id=42)
+    # Optional fields come last; None is packed as an empty field and
+    # trailing empty fields are dropped.
+    def __init__(self, prefix, **fields):
+        self.prefix = prefix
+        self.fields = list(fields.values())
+        optional = [field.optional for field in self.fields]
+        if optional != sorted(optional):
+            raise ValueError(f"{prefix}: optional fields must come last")
+        self.values = namedtuple("Values", fields, defaults=[None] * sum(optional))
+        worst = len(prefix) + sum(len(SEPARATOR) + field.width for field in self.fields)
+        if worst > CALLBACK_DATA_LIMIT:
+            raise ValueError(f"{prefix}: callback data may reach {worst} bytes")
+
+    def pack(self, *args, **kwargs):
+        values = self.values(*args, **kwargs)
+        parts = [self.prefix]
+        for field, value in zip(self.fields, values):
+            if value is None:
+                if not field.optional:
+                    raise ValueError(f"{self.prefix}: missing value")
+                parts.append("")
+            else:
+                parts.append(field.encode(value))
+        while parts[-1] == "":
+            parts.pop()
+        data = SEPARATOR.join(parts)
+        if len(data.encode()) > CALLBACK_DATA_LIMIT:
+            raise ValueError(f"Callback data too long: {data!r}")
+        return data
+
+    def parse(self, parts):
+        # Field parts (prefix removed) -> values, or None if they do not fit
+        if len(parts) > len(self.fields):
+            return None
+        values = []
+        for index, field in enumerate(self.fields):
+            text = parts[index] if index < len(parts) else ""
+            if text == "":
+                if not field.optional:
+                    return None
+                values.append(None)
+                continue
+            try:
+                values.append(field.decode(text))
+            except ValueError:
+                return None
+        return self.values(*values)
+
+    def unpack(self, data):
+        head = self.prefix + SEPARATOR
+        if data == self.prefix:
+            return self.parse([])
+        if not data.startswith(head):
+            return None
+        return self.parse(data[len(head):].split(SEPARATOR))
+
+
+# ======================
+# Callback routes
+# ======================
+# Every callback_query handler is registered here against its schema. The
+# prefixes form a trie of ":"-separated tokens; resolving walks it down to
+# the one schema that can own the data and parses the rest, instead of trying
+# a startswith() filter per handler.
+class CallbackRoute(Route):
+    __slots__ = ("schema", "state")
+
+    def __init__(self, callback, schema, state=None):
+        super().__init__(callback)
+        self.schema = schema
+        # Only while the FSM is in this state (raw state string)
+        self.state = state
+
+
+class CallbackRoutes:
+    def __init__(self):
+        self.root = {}  # token -> child dict, or a CallbackRoute at a leaf
+
+    def route(self, schema, state=None):
+        def register(callback):
+            route = CallbackRoute(callback, schema, state.state if state is not None else None)
+            *path, leaf = schema.prefix.split(SEPARATOR)
+            node = self.root
+            for token in path:
+                node = node.setdefault(token, {})
+                if not isinstance(node, dict):
+                    raise ValueError(f"Callback prefix {schema.prefix!r} extends a registered one")
+            # Leaves only, so a field value can never be mistaken for a token
+            if leaf in node:
+                raise ValueError(f"Duplicate or overlapping callback prefix: {schema.prefix!r}")
+            node[leaf] = route
+            return callback
+        return register
+
+    def resolve(self, data):
+        # -> (route, values), or (None, None)
+        parts = data.split(SEPARATOR)
+        node = self.root
+        for depth, token in enumerate(parts, start=1):
+            node = node.get(token)
+            if node is None:
+                return None, None
+            if isinstance(node, CallbackRoute):
+                values = node.schema.parse(parts[depth:])
+                return (node, values) if values is not None else (None, None)
+        return None, None
+
+    # aiogram filter: route and parsed values are handed to dispatch() as
+    # callback_route and callback_data
+    async def filter(self, callback, raw_state=None):
+        if not callback.data:
+            return False
+        route, values = self.resolve(callback.data)
+        if route is None or (route.state is not None and route.state != raw_state):
+            return False
+        return {"callback_route": route, "callback_data": values}
+
+    async def dispatch(self, callback, callback_route, **data):
+        callback_hits.inc(callback_route.name)
+        return await callback_route.handler.call(callback, **data)
+
+
+callback_routes = CallbackRoutes()
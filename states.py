@@ -18,3 +18,5 @@ class SupportState(StatesGroup):
 class BroadcastState(StatesGroup):
     waiting_for_message = State()
 
+class UserSearch(StatesGroup):
+    waiting_for_query = State()
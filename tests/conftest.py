@@ -0,0 +1,25 @@
+# tests/conftest.py
+
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from tools.common import prepare_environment  # noqa: E402
+
+# Bot modules read the environment and open DATABASE_NAME at import time, so
+# point them at a scratch database before any test imports one
+prepare_environment()
+
+
+import pytest  # noqa: E402
+
+
+@pytest.fixture
+def fresh_db(tmp_path):
+    # A migrated database of its own, for tests that count or page rows
+    from database import Database
+    database = Database(str(tmp_path / "bot.db"))
+    yield database
+    database.close()
@@ -0,0 +1,25 @@
+# tests/test_admin_views.py
+
+import asyncio
+from types import SimpleNamespace
+
+import admin_interface
+from callbacks import HOT_BUTTONS
+
+
+class FakeMessage:
+    def __init__(self):
+        self.edits = []
+
+    async def edit_text(self, text, **kwargs):
+        self.edits.append(text)
+
+
+def test_hot_buttons_render_when_the_activity_flush_fails(monkeypatch):
+    async def failing_flush():
+        raise RuntimeError("database is locked")
+
+    monkeypatch.setattr(admin_interface.activity, "flush", failing_flush)
+    callback = SimpleNamespace(message=FakeMessage())
+    asyncio.run(admin_interface.hot_buttons_view(callback, HOT_BUTTONS.unpack("s:h:7")))
+    assert callback.message.edits and "آخر 7 يوم" in callback.message.edits[0]
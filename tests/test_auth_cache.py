@@ -0,0 +1,125 @@
+# tests/test_auth_cache.py
+
+import asyncio
+
+from auth_cache import AuthCache
+
+
+class FakeDatabase:
+    # Rows per telegram_id; reads block on `gate` when it is set, so a test
+    # can commit a change while a lookup is in flight
+    def __init__(self):
+        self.listeners = {}
+        self.users = {}
+        self.permissions = {}
+        self.gate = None
+        self.reads = 0
+
+    def subscribe(self, topic, callback):
+        self.listeners.setdefault(topic, []).append(callback)
+
+    def notify(self, topic, key=None):
+        for callback in self.listeners.get(topic, ()):
+            callback(key)
+
+    async def _read(self, result):
+        self.reads += 1
+        if self.gate is not None:
+            await self.gate.wait()
+        return result
+
+    async def get_features(self):
+        return [{"id": "broadcast"}, {"id": "support"}]
+
+    async def get_auth_snapshot(self, telegram_id):
+        user = self.users.get(telegram_id)
+        if user is None:
+            return await self._read((None, []))
+        return await self._read((dict(user), list(self.permissions.get(telegram_id, ()))))
+
+    async def get_staff_ids(self):
+        staff = [telegram_id for telegram_id, user in self.users.items() if user["role"] != "user"]
+        return await self._read(staff)
+
+
+def demote(database, telegram_id):
+    database.users[telegram_id]["role"] = "user"
+    database.notify("users", telegram_id)
+
+
+def test_snapshot_is_cached_until_invalidated():
+    async def scenario():
+        database = FakeDatabase()
+        database.users[5] = {"role": "supervisor", "is_active": 1}
+        cache = AuthCache(database)
+
+        assert await cache.is_staff(5)
+        assert await cache.is_staff(5)
+        assert database.reads == 1
+
+        demote(database, 5)
+        assert not await cache.is_staff(5)
+        assert database.reads == 2
+
+    asyncio.run(scenario())
+
+
+def test_invalidation_during_lookup_is_not_overwritten():
+    async def scenario():
+        database = FakeDatabase()
+        database.users[5] = {"role": "supervisor", "is_active": 1}
+        cache = AuthCache(database)
+        await cache._ensure_features()
+
+        database.gate = asyncio.Event()
+        lookup = asyncio.create_task(cache.get(5))
+        await asyncio.sleep(0)
+        assert database.reads == 1  # the lookup is waiting on its read
+
+        # The demotion commits after the row was read but before the
+        # lookup resumed with it
+        demote(database, 5)
+        database.gate.set()
+        assert (await lookup).role == "supervisor"
+
+        database.gate = None
+        assert 5 not in cache.snapshots
+        assert not await cache.is_staff(5)
+
+    asyncio.run(scenario())
+
+
+def test_staff_ids_invalidated_during_lookup_are_not_stored():
+    async def scenario():
+        database = FakeDatabase()
+        database.users[5] = {"role": "supervisor", "is_active": 1}
+        cache = AuthCache(database)
+
+        database.gate = asyncio.Event()
+        lookup = asyncio.create_task(cache.is_known_staff(5))
+        await asyncio.sleep(0)
+        demote(database, 5)
+        database.gate.set()
+        assert await lookup  # answered from the read that started before
+
+        database.gate = None
+        assert cache.staff_ids is None
+        assert not await cache.is_known_staff(5)
+
+    asyncio.run(scenario())
+
+
+def test_permissions_follow_feature_bits():
+    async def scenario():
+        database = FakeDatabase()
+        database.users[5] = {"role": "supervisor", "is_active": 1}
+        database.users[6] = {"role": "admin", "is_active": 1}
+        database.permissions[5] = ["support"]
+        cache = AuthCache(database)
+
+        assert await cache.has_permission(5, "support")
+        assert not await cache.has_permission(5, "broadcast")
+        assert await cache.has_permission(6, "broadcast")
+        assert not await cache.has_permission(7, "support")
+
+    asyncio.run(scenario())
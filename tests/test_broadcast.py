@@ -0,0 +1,155 @@
+# tests/test_broadcast.py
+
+import asyncio
+import os
+import sqlite3
+import time
+
+from aiogram.exceptions import TelegramNotFound, TelegramForbiddenError
+
+from broadcast import RateLimiter, BroadcastEngine, send_with_retry
+from database import db
+from tools.common import seed_users
+
+
+class FakeBot:
+    def __init__(self, errors=None):
+        self.errors = errors or {}
+        self.sent = []
+        self.edits = []
+
+    async def send_message(self, chat_id, text, **kwargs):
+        error = self.errors.get(chat_id)
+        if error is not None:
+            raise error
+        self.sent.append(chat_id)
+
+    async def edit_message_text(self, text, **kwargs):
+        self.edits.append(text)
+
+
+def test_sends_are_spaced_by_the_rate():
+    async def scenario():
+        limiter = RateLimiter(rate=100, per_chat_interval=0)
+        started = time.monotonic()
+        for chat_id in range(6):
+            await limiter.acquire(chat_id)
+        return time.monotonic() - started
+
+    assert 0.045 <= asyncio.run(scenario()) < 0.5
+
+
+def test_same_chat_waits_for_its_interval():
+    async def scenario():
+        limiter = RateLimiter(rate=1000, per_chat_interval=0.05)
+        await limiter.acquire(1)
+        started = time.monotonic()
+        await limiter.acquire(2)
+        other_chat = time.monotonic() - started
+        await limiter.acquire(1)
+        return other_chat, time.monotonic() - started
+
+    other_chat, same_chat = asyncio.run(scenario())
+    assert other_chat < 0.02
+    assert same_chat >= 0.045
+
+
+def test_pause_holds_every_chat():
+    async def scenario():
+        limiter = RateLimiter(rate=1000, per_chat_interval=0)
+        limiter.pause(0.05)
+        started = time.monotonic()
+        await limiter.acquire(1)
+        return time.monotonic() - started
+
+    assert asyncio.run(scenario()) >= 0.045
+
+
+def test_priority_sends_skip_the_bulk_queue():
+    async def scenario():
+        limiter = RateLimiter(rate=20, per_chat_interval=0)
+
+        async def bulk():
+            for chat_id in range(100, 110):
+                await limiter.acquire(chat_id)
+
+        broadcast = asyncio.create_task(bulk())
+        await asyncio.sleep(0.01)
+        started = time.monotonic()
+        await limiter.acquire(1, priority=True)
+        waited = time.monotonic() - started
+        # The bulk sends give up the slot the notification used
+        next_bulk_slot = limiter._next_slot - time.monotonic()
+        broadcast.cancel()
+        return waited, next_bulk_slot
+
+    waited, next_bulk_slot = asyncio.run(scenario())
+    assert waited < 0.02
+    assert next_bulk_slot > 0.05
+
+
+def test_unexpected_api_errors_become_failures():
+    async def scenario():
+        bot = FakeBot({1: TelegramNotFound(None, "chat not found")})
+        return await send_with_retry(bot, 1, "hi"), await send_with_retry(bot, 2, "hi")
+
+    error, ok = asyncio.run(scenario())
+    assert "chat not found" in error
+    assert ok is None
+
+
+def test_job_finishes_past_failing_recipients():
+    async def scenario():
+        path = os.environ["DATABASE_NAME"]
+        recipients = seed_users(path, 5, first_id=70_000_000)
+        total = len(await db.get_broadcast_recipients_after(0, 1_000_000))
+        bot = FakeBot({
+            recipients[1]: TelegramNotFound(None, "chat not found"),
+            recipients[3]: TelegramForbiddenError(None, "bot was blocked by the user"),
+        })
+        engine = BroadcastEngine(db)
+        job_id = await db.create_broadcast_job(1, "Admin", "hello", total, 1, 1)
+        await engine._run(bot, job_id)
+
+        job = await db.get_broadcast_job(job_id)
+        conn = sqlite3.connect(path)
+        failed = conn.execute(
+            "SELECT chat_id FROM delivery_failures WHERE kind = 'broadcast' AND reference_id = ? ORDER BY chat_id",
+            (job_id,)
+        ).fetchall()
+        conn.close()
+        return job, failed, bot, recipients, total
+
+    job, failed, bot, recipients, total = asyncio.run(scenario())
+    assert job["status"] == "done"
+    assert (job["sent"], job["failed"]) == (total - 2, 2)
+    assert [chat_id for chat_id, in failed] == [recipients[1], recipients[3]]
+    assert recipients[4] in bot.sent
+    assert bot.edits  # the final status was written
+
+
+class FailingProgress:
+    # The real database, except that saving progress fails
+    def __init__(self, database):
+        self.database = database
+
+    def __getattr__(self, name):
+        return getattr(self.database, name)
+
+    async def save_broadcast_progress(self, *args):
+        raise RuntimeError("database is locked")
+
+
+def test_failed_job_is_logged_and_left_resumable(caplog):
+    async def scenario():
+        seed_users(os.environ["DATABASE_NAME"], 2, first_id=71_000_000)
+        bot = FakeBot()
+        engine = BroadcastEngine(FailingProgress(db))
+        job_id = await db.create_broadcast_job(1, "Admin", "hello", 2, 1, 1)
+        await engine._run(bot, job_id)
+        return await db.get_broadcast_job(job_id), bot
+
+    job, bot = asyncio.run(scenario())
+    assert job["status"] == "running"
+    assert "resumes on the next start" in caplog.text
+    assert bot.edits and bot.edits[-1].startswith("⚠️")
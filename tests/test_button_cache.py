@@ -0,0 +1,71 @@
+# tests/test_button_cache.py
+
+import asyncio
+
+import keyboards
+from button_cache import ButtonTree
+
+
+def labels(markup):
+    return [button.text for row in markup.keyboard for button in row]
+
+
+async def button_id(tree, text, parent_id=None):
+    return (await tree.resolve(parent_id, text))["id"]
+
+
+def test_every_button_write_reloads_the_tree(fresh_db):
+    async def scenario():
+        tree = ButtonTree(fresh_db)
+        await fresh_db.add_button("A", "text", "a")
+        await fresh_db.add_button("B", "text", "b")
+        await tree.ensure_loaded()
+        steps = [[btn["text"] for btn in await tree.get_children()]]
+        first = await button_id(tree, "A")
+        second = await button_id(tree, "B")
+
+        async def step(write):
+            generation, version = tree._generation, tree.version
+            await write
+            assert tree._generation > generation
+            children = await tree.get_children()
+            assert tree.version > version
+            steps.append([btn["text"] for btn in children])
+
+        await step(fresh_db.add_button("Sub", "text", "s", parent_id=first))
+        assert [btn["text"] for btn in await tree.get_children(first)] == ["Sub"]
+        assert (await tree.get(first))["has_children"]
+        await step(fresh_db.move_button(second, "up"))
+        await step(fresh_db.update_button(first, text="A2"))
+        await step(fresh_db.delete_button(second))
+        return steps, await tree.resolve(None, "A"), await tree.resolve(None, " A2 ")
+
+    steps, old, renamed = asyncio.run(scenario())
+    assert steps == [["A", "B"], ["A", "B"], ["B", "A"], ["B", "A2"], ["A2"]]
+    assert old is None and renamed["text"] == "A2"
+
+
+def test_menu_keyboards_are_cached_per_role_and_placeholder(fresh_db, monkeypatch):
+    tree = ButtonTree(fresh_db)
+    monkeypatch.setattr(keyboards, "button_tree", tree)
+    monkeypatch.setattr(keyboards, "_menu_cache", {})
+    monkeypatch.setattr(keyboards, "_menu_cache_version", None)
+
+    async def scenario():
+        await fresh_db.add_button("A", "text", "a")
+        user = await keyboards.menu_keyboard()
+        admin = await keyboards.menu_keyboard(is_admin=True)
+        main_user = await keyboards.main_menu_keyboard()
+        main_admin = await keyboards.main_menu_keyboard(is_admin=True)
+        cached = await keyboards.menu_keyboard(is_admin=True)
+        await fresh_db.add_button("B", "text", "b")
+        rebuilt = await keyboards.menu_keyboard(is_admin=True)
+        return user, admin, main_user, main_admin, cached, rebuilt
+
+    user, admin, main_user, main_admin, cached, rebuilt = asyncio.run(scenario())
+    assert "🔧 لوحة التحكم" in labels(admin) and "🔧 لوحة التحكم" not in labels(user)
+    assert labels(main_admin) == labels(admin) and labels(main_user) == labels(user)
+    assert main_user.input_field_placeholder == main_admin.input_field_placeholder == keyboards.WELCOME_PLACEHOLDER
+    assert user.input_field_placeholder is None and admin.input_field_placeholder is None
+    assert cached is admin
+    assert rebuilt is not admin and labels(rebuilt)[-2:] == ["A", "B"]
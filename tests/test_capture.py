@@ -0,0 +1,33 @@
+# tests/test_capture.py
+
+import admin_interface  # noqa: F401  registers the command prefixes
+from capture import Anonymizer
+
+
+def test_commands_keep_only_known_forms():
+    anonymizer = Anonymizer("salt")
+    mapped = anonymizer.user_id(123456)
+
+    assert anonymizer.message_text("/start", lambda text: False) == "/start"
+    assert anonymizer.message_text("/ban_123456", lambda text: False) == f"/ban_{mapped}"
+    assert anonymizer.message_text("/del_log_42", lambda text: False) == "/del_log_42"
+
+
+def test_other_slash_text_is_hashed():
+    anonymizer = Anonymizer("salt")
+    for text in ("/help my number is 0501234567", "/ban_me please", "/start 0501234567", "/del_"):
+        anonymized = anonymizer.message_text(text, lambda text: False)
+        assert anonymized == anonymizer.text(text)
+        assert "050" not in anonymized and "me please" not in anonymized
+
+
+def test_names_follow_the_anonymized_id():
+    anonymizer = Anonymizer("salt")
+    update = {"message": {
+        "from": {"id": 123456, "first_name": "Ahmad", "username": "ahmad"},
+        "chat": {"id": 123456, "first_name": "Ahmad", "type": "private"},
+    }}
+    message = anonymizer.update(update)["message"]
+    mapped = anonymizer.user_id(123456)
+    assert message["from"] == {"id": mapped, "first_name": f"u{mapped}", "username": f"u{mapped}"}
+    assert message["chat"]["first_name"] == f"u{mapped}"
@@ -0,0 +1,190 @@
+# tests/test_executor.py
+
+import asyncio
+
+from executor import UpdateExecutor, PrioritySlots, BUSY_TEXT
+from tools.common import message_update, callback_update
+
+STAFF_ID = 1
+
+
+async def classify(update):
+    return "staff" if update.message and update.message.chat.id == STAFF_ID else "user"
+
+
+def make_executor(max_concurrency=4, **kwargs):
+    kwargs.setdefault("shed_queue_depth", 0)
+    kwargs.setdefault("shed_wait_ms", 0)
+    return UpdateExecutor(max_concurrency, classify=classify, **kwargs)
+
+
+class RecordingBot:
+    def __init__(self):
+        self.sent = []
+
+    async def send_message(self, chat_id, text):
+        self.sent.append(("message", chat_id, text))
+
+    async def answer_callback_query(self, callback_query_id, text=None):
+        self.sent.append(("callback", callback_query_id, text))
+
+
+def test_updates_of_one_chat_run_in_order():
+    async def scenario():
+        executor = make_executor()
+        order = []
+
+        async def handle(name, delay):
+            await asyncio.sleep(delay)
+            order.append(name)
+
+        await asyncio.gather(*(
+            executor.run(None, message_update(10, name), handle, name, delay)
+            for name, delay in (("first", 0.03), ("second", 0.01), ("third", 0))
+        ))
+        assert order == ["first", "second", "third"]
+        assert executor.chats == {}
+
+    asyncio.run(scenario())
+
+
+def test_chats_run_in_parallel_up_to_the_cap():
+    async def scenario():
+        executor = make_executor(max_concurrency=2)
+        running = 0
+        peak = 0
+
+        async def handle():
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+
+        await asyncio.gather(*(executor.run(None, message_update(chat, "x"), handle) for chat in range(10, 16)))
+        assert peak == 2
+        assert executor.slots.free == 2
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_waiter_does_not_break_the_turn_handoff():
+    async def scenario():
+        executor = make_executor()
+        release = asyncio.Event()
+        ran = []
+
+        async def handle(name):
+            if name == "head":
+                await release.wait()
+            ran.append(name)
+            return name
+
+        head = asyncio.create_task(executor.run(None, message_update(10, "a"), handle, "head"))
+        waiter = asyncio.create_task(executor.run(None, message_update(10, "b"), handle, "waiter"))
+        tail = asyncio.create_task(executor.run(None, message_update(10, "c"), handle, "tail"))
+        await asyncio.sleep(0.01)
+
+        # The head finishes in the same loop step in which the next turn is
+        # cancelled, before the cancelled task had a chance to leave the queue
+        release.set()
+        waiter.cancel()
+        assert await head == "head"
+        assert await tail == "tail"
+        assert waiter.cancelled()
+        assert ran == ["head", "tail"]
+        assert executor.chats == {}
+
+    asyncio.run(scenario())
+
+
+def test_errors_reach_the_caller_and_free_the_chat():
+    async def scenario():
+        executor = make_executor()
+
+        async def fail():
+            raise ValueError("boom")
+
+        async def succeed():
+            return "ok"
+
+        results = await asyncio.gather(
+            executor.run(None, message_update(10, "a"), fail),
+            executor.run(None, message_update(10, "b"), succeed),
+            return_exceptions=True,
+        )
+        assert isinstance(results[0], ValueError)
+        assert results[1] == "ok"
+        assert executor.chats == {} and executor.slots.free == 4
+
+    asyncio.run(scenario())
+
+
+def test_freed_slots_go_to_staff_first():
+    async def scenario():
+        slots = PrioritySlots(1)
+        await slots.acquire("user")
+        order = []
+
+        async def wait(lane, name):
+            await slots.acquire(lane)
+            order.append(name)
+            slots.release()
+
+        waiters = [
+            asyncio.create_task(wait("user", "user 1")),
+            asyncio.create_task(wait("user", "user 2")),
+            asyncio.create_task(wait("staff", "staff")),
+        ]
+        await asyncio.sleep(0)
+        slots.release()
+        await asyncio.gather(*waiters)
+        assert order == ["staff", "user 1", "user 2"]
+        assert slots.free == 1
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_slot_waiter_leaves_the_queue():
+    async def scenario():
+        slots = PrioritySlots(1)
+        await slots.acquire("user")
+        waiter = asyncio.create_task(slots.acquire("user"))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.sleep(0)
+        assert slots.waiting() == 0
+        slots.release()
+        assert slots.free == 1
+
+    asyncio.run(scenario())
+
+
+def test_user_updates_are_shed_when_the_queue_is_deep():
+    async def scenario():
+        executor = make_executor(max_concurrency=1, shed_queue_depth=1, busy_reply_interval=60)
+        bot = RecordingBot()
+        release = asyncio.Event()
+        handled = []
+
+        async def handle(name):
+            if name == "busy":
+                await release.wait()
+            handled.append(name)
+
+        busy = asyncio.create_task(executor.run(bot, message_update(10, "x"), handle, "busy"))
+        queued = asyncio.create_task(executor.run(bot, message_update(11, "x"), handle, "queued"))
+        await asyncio.sleep(0.01)
+        await executor.run(bot, message_update(12, "x"), handle, "shed message")
+        await executor.run(bot, message_update(12, "x"), handle, "shed again")
+        await executor.run(bot, callback_update(13, "a:p"), handle, "shed callback")
+        staff = asyncio.create_task(executor.run(bot, message_update(STAFF_ID, "x"), handle, "staff"))
+        await asyncio.sleep(0.01)
+        release.set()
+        await asyncio.gather(busy, queued, staff)
+
+        assert handled == ["busy", "staff", "queued"]
+        # One busy message per chat and interval; callbacks are always answered
+        assert [kind for kind, _, text in bot.sent if text == BUSY_TEXT] == ["message", "callback"]
+
+    asyncio.run(scenario())
@@ -0,0 +1,185 @@
+# tests/test_fsm_storage.py
+
+import asyncio
+import itertools
+import time
+
+from aiogram.fsm.storage.base import StorageKey
+
+from database import db
+from fsm_storage import SQLiteStorage
+from metrics import fsm_swept
+
+_chat_ids = itertools.count(80_000_000)
+
+
+def new_key():
+    chat_id = next(_chat_ids)
+    return StorageKey(bot_id=1, chat_id=chat_id, user_id=chat_id)
+
+
+def make_storage(database=db, **kwargs):
+    kwargs.setdefault("flush_interval_ms", 3_600_000)
+    kwargs.setdefault("sweep_interval", 3600)
+    return SQLiteStorage(database, **kwargs)
+
+
+def test_changes_are_written_on_flush_and_survive_a_restart():
+    async def scenario():
+        storage = make_storage()
+        key = new_key()
+        await storage.set_state(key, "ManageButtons:waiting_for_text")
+        await storage.set_data(key, {"parent_id": 3})
+        assert await db.get_fsm_record(storage.key_builder.build(key)) is None
+        assert await storage.flush() == 1
+        await storage.close()
+
+        restarted = make_storage()
+        state, data = await restarted.get_state(key), await restarted.get_data(key)
+        await restarted.close()
+        return state, data
+
+    state, data = asyncio.run(scenario())
+    assert state == "ManageButtons:waiting_for_text"
+    assert data == {"parent_id": 3}
+
+
+def test_cleared_context_deletes_its_row():
+    async def scenario():
+        storage = make_storage()
+        key = new_key()
+        await storage.set_state(key, "SupportState:waiting_for_message")
+        await storage.flush()
+        await storage.set_state(key, None)
+        await storage.flush()
+        row = await db.get_fsm_record(storage.key_builder.build(key))
+        await storage.close()
+        return row
+
+    assert asyncio.run(scenario()) is None
+
+
+def test_evicted_dirty_contexts_stay_readable():
+    async def scenario():
+        storage = make_storage(max_entries=2)
+        keys = [new_key() for _ in range(4)]
+        for index, key in enumerate(keys):
+            await storage.set_data(key, {"index": index})
+        assert len(storage.cache) == 2
+        data = [await storage.get_data(key) for key in keys]
+        await storage.close()
+        return data
+
+    assert asyncio.run(scenario()) == [{"index": index} for index in range(4)]
+
+
+class FailingDatabase:
+    # Fails the first save; reads see an empty table
+    def __init__(self):
+        self.saved = []
+        self.fail = True
+
+    async def get_fsm_record(self, key):
+        return None
+
+    async def save_fsm_records(self, rows):
+        await asyncio.sleep(0)
+        if self.fail:
+            self.fail = False
+            raise RuntimeError("disk I/O error")
+        self.saved.extend(rows)
+
+
+def test_failed_flush_keeps_newer_values():
+    async def scenario():
+        database = FailingDatabase()
+        storage = make_storage(database)
+        key = new_key()
+        await storage.set_data(key, {"step": 1})
+        flushing = asyncio.create_task(storage.flush())
+        await asyncio.sleep(0)
+        # Written while the failing batch is out
+        await storage.set_data(key, {"step": 2})
+        try:
+            await flushing
+        except RuntimeError:
+            pass
+        await storage.flush()
+        await storage.close()
+        return database.saved
+
+    saved = asyncio.run(scenario())
+    assert [data for _, _, data, _ in saved] == ['{"step": 2}']
+
+
+def test_sweep_expires_idle_contexts_per_state_group():
+    async def scenario():
+        storage = make_storage(idle_ttl=1000, state_ttls={"SupportState": 100})
+        support, menu, stored, recent = new_key(), new_key(), new_key(), new_key()
+        await storage.set_state(support, "SupportState:waiting_for_message")
+        await storage.set_data(menu, {"current_parent_id": 4})
+        await storage.flush()
+        # Idle for 200 s: past the SupportState TTL, not the default one
+        storage.touched[storage.key_builder.build(support)] -= 200
+        storage.touched[storage.key_builder.build(menu)] -= 200
+
+        # Rows from before a restart, not cached
+        now = int(time.time())
+        await db.save_fsm_records([
+            (storage.key_builder.build(stored), None, '{"current_parent_id": 1}', now - 2000),
+            (storage.key_builder.build(recent), None, '{"current_parent_id": 2}', now - 500),
+        ])
+        before = dict(fsm_swept.values)
+        contexts, rows, size = await storage.sweep()
+        await storage.flush()
+        swept = {source: fsm_swept.values.get((source,), 0) - before.get((source,), 0) for source in ("cache", "table")}
+
+        fresh = make_storage()
+        states = [
+            (await fresh.get_state(key), await fresh.get_data(key)) for key in (support, menu, stored, recent)
+        ]
+        await storage.close()
+        await fresh.close()
+        return contexts, rows, size, swept, states
+
+    contexts, rows, size, swept, states = asyncio.run(scenario())
+    assert (contexts, rows) == (1, 1)
+    assert size > 0
+    assert swept == {"cache": 1, "table": 1}
+    assert states == [
+        (None, {}),
+        (None, {"current_parent_id": 4}),
+        (None, {}),
+        (None, {"current_parent_id": 2}),
+    ]
+
+
+def test_expired_rows_are_selected_by_their_group_ttl():
+    async def scenario():
+        now = int(time.time())
+        keys = [f"ttl-test:{index}" for index in range(6)]
+        await db.save_fsm_records([
+            (keys[0], None, '{"current_parent_id": 1}', now - 150),                # idle TTL 100: expired
+            (keys[1], None, '{"current_parent_id": 1}', now - 50),                 # not yet
+            (keys[2], "ManageButtons:waiting_for_text", "{}", now - 150),          # group TTL 1000: kept
+            (keys[3], "SupportState:waiting_for_reply", "{}", now - 150),          # group TTL 10: expired
+            (keys[4], "UserSearch:waiting_for_query", "{}", now - 150),            # unlisted: idle TTL
+            (keys[5], "ManageButtons", "{}", now - 1500),                          # group without a state name
+        ])
+        rows = await db.get_expired_fsm_records(now, 100, {"ManageButtons": 1000, "SupportState": 10})
+        return {row["key"] for row in rows if row["key"].startswith("ttl-test:")}, keys
+
+    expired, keys = asyncio.run(scenario())
+    assert expired == {keys[0], keys[3], keys[4], keys[5]}
+
+
+def test_every_state_group_has_a_ttl():
+    import states
+    from aiogram.fsm.state import StatesGroup
+    from config import FSM_STATE_TTLS
+
+    groups = {
+        name for name, value in vars(states).items()
+        if isinstance(value, type) and issubclass(value, StatesGroup) and value is not StatesGroup
+    }
+    assert groups <= set(FSM_STATE_TTLS)
@@ -0,0 +1,122 @@
+# tests/test_migrations.py
+
+import sqlite3
+
+from database import Database
+from migrations import MIGRATIONS, apply_migrations
+
+# create_tables() as it was before migrations existed; databases made by that
+# version have no schema_version table
+LEGACY_SCHEMA = """
+CREATE TABLE users (
+    id INTEGER PRIMARY KEY,
+    telegram_id INTEGER UNIQUE,
+    username TEXT,
+    full_name TEXT,
+    role TEXT DEFAULT 'user',
+    is_active INTEGER DEFAULT 1,
+    joined_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE permissions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER,
+    permission TEXT,
+    FOREIGN KEY (user_id) REFERENCES users (id)
+);
+CREATE TABLE buttons (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    text TEXT NOT NULL,
+    type TEXT NOT NULL,
+    content TEXT,
+    parent_id INTEGER,
+    is_active INTEGER DEFAULT 1,
+    created_by INTEGER,
+    position INTEGER,
+    FOREIGN KEY (parent_id) REFERENCES buttons (id),
+    FOREIGN KEY (created_by) REFERENCES users (id)
+);
+CREATE TABLE support_messages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER,
+    admin_id INTEGER,
+    message_text TEXT,
+    is_from_admin INTEGER DEFAULT 0,
+    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE pending_supervisors (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username TEXT UNIQUE,
+    role TEXT DEFAULT 'supervisor'
+);
+INSERT INTO users (telegram_id, username, full_name, role, is_active) VALUES
+    (1, 'owner', 'Owner', 'admin', 1),
+    (2, 'client', 'Client', 'user', 1),
+    (3, 'gone', 'Gone', 'user', 0);
+INSERT INTO buttons (text, type, content, position) VALUES ('Help', 'text', 'hi', 0);
+INSERT INTO support_messages (user_id, message_text) VALUES (2, 'hello');
+"""
+
+# Migration 7 drops idx_users_role from migration 2 again
+INDEXES = {
+    "idx_buttons_parent_active_position", "idx_support_messages_button_timestamp",
+    "idx_admin_logs_timestamp", "idx_broadcast_jobs_status", "idx_delivery_failures_kind_reference",
+    "idx_fsm_states_updated_at", "idx_support_messages_button_id", "idx_users_joined",
+    "idx_users_role_joined", "idx_users_active_joined", "idx_users_username_nocase",
+    "idx_users_full_name_nocase",
+}
+
+
+def schema(path):
+    conn = sqlite3.connect(path)
+    objects = set(conn.execute("SELECT type, name FROM sqlite_master WHERE name NOT LIKE 'sqlite_%'"))
+    versions = [row[0] for row in conn.execute("SELECT version FROM schema_version ORDER BY version")]
+    conn.close()
+    return objects, versions
+
+
+def migrate(path):
+    Database(path).close()
+
+
+def test_fresh_database_reaches_the_latest_version(tmp_path):
+    path = str(tmp_path / "bot.db")
+    migrate(path)
+    objects, versions = schema(path)
+    assert versions == [version for version, _, _ in MIGRATIONS] == list(range(1, 10))
+    assert {name for kind, name in objects if kind == "index"} == INDEXES
+    assert {"daily_stats", "statistics", "fsm_states", "broadcast_jobs"} <= {name for kind, name in objects if kind == "table"}
+
+
+def test_legacy_database_is_upgraded_in_place(tmp_path):
+    path = str(tmp_path / "bot.db")
+    conn = sqlite3.connect(path)
+    conn.executescript(LEGACY_SCHEMA)
+    conn.close()
+
+    migrate(path)
+    objects, versions = schema(path)
+    assert versions == list(range(1, 10))
+    assert {name for kind, name in objects if kind == "index"} == INDEXES
+
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(support_messages)")}
+    assert {"button_id", "admin_name"} <= columns
+    assert "last_seen" in {row[1] for row in conn.execute("PRAGMA table_info(users)")}
+    assert [row["telegram_id"] for row in conn.execute("SELECT telegram_id FROM users ORDER BY id")] == [1, 2, 3]
+    # Counters are seeded from the rows that were already there
+    counters = dict(conn.execute("SELECT key, value FROM statistics"))
+    conn.close()
+    assert (counters["users_total"], counters["users_active"], counters["users_blocked"], counters["supervisors"]) == (3, 2, 1, 1)
+
+
+def test_second_run_changes_nothing(tmp_path):
+    path = str(tmp_path / "bot.db")
+    migrate(path)
+    before = schema(path)
+
+    conn = sqlite3.connect(path, isolation_level=None)
+    assert apply_migrations(conn) == 9
+    conn.close()
+    migrate(path)
+    assert schema(path) == before
@@ -0,0 +1,156 @@
+# tests/test_routing.py
+
+import asyncio
+from types import SimpleNamespace
+
+from routing import TextRoutes, CallbackData, CallbackRoutes, Int, Choice, Token, INT, USER_ID, CALLBACK_DATA_LIMIT
+from states import SupportState
+
+
+# ======================
+# Text routes
+# ======================
+def text_table():
+    routes = TextRoutes()
+
+    @routes.text("🏠 القائمة الرئيسية")
+    async def main_menu(message):
+        return "main_menu"
+
+    @routes.prefix("/del_")
+    async def delete_message(message):
+        return "delete_message"
+
+    @routes.prefix("/del_log_")
+    async def delete_log(message):
+        return "delete_log"
+
+    return routes
+
+
+def test_longest_prefix_wins():
+    routes = text_table()
+    assert routes.resolve("/del_log_5").name == "delete_log"
+    assert routes.resolve("/del_5").name == "delete_message"
+    assert routes.resolve("🏠 القائمة الرئيسية").name == "main_menu"
+    assert routes.resolve("hello") is None
+
+
+def test_prefixes_do_not_take_fsm_input():
+    routes = text_table()
+
+    def matched(text, raw_state=None):
+        result = asyncio.run(routes.filter(SimpleNamespace(text=text), raw_state))
+        return result and result["text_route"].name
+
+    assert matched("/del_5") == "delete_message"
+    assert matched("/del_5", "SupportState:waiting_for_reply") is False
+    assert matched("🏠 القائمة الرئيسية", "SupportState:waiting_for_reply") == "main_menu"
+
+
+def test_duplicate_routes_are_rejected():
+    routes = text_table()
+    try:
+        routes.prefix("/del_")(lambda message: None)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("duplicate prefix accepted")
+
+
+# ======================
+# Callback data and the prefix trie
+# ======================
+MOVE = CallbackData("b:m", direction=Choice("up", "down"), button_id=INT)
+PAGE = CallbackData("l:v", button_id=INT, before_id=Int(optional=True), after_id=Int(optional=True))
+
+
+def test_pack_and_unpack_round_trip():
+    assert MOVE.pack("up", 42) == "b:m:up:16"
+    assert MOVE.unpack("b:m:up:16") == ("up", 42)
+    assert PAGE.pack(7) == "l:v:7"
+    assert PAGE.pack(7, after_id=36) == "l:v:7::10"
+    assert PAGE.unpack("l:v:7::10") == (7, None, 36)
+    assert CallbackData("m:v", telegram_id=USER_ID).unpack("m:v:-1") == (-1,)
+
+
+def test_malformed_data_is_rejected():
+    for data in ("b:m:left:16", "b:m:up", "b:m:up:16:1", "b:m:up:1G", "b:m:up:+1", "b:m:up:0016"):
+        assert MOVE.unpack(data) is None, data
+
+
+def test_worst_case_size_is_checked_at_definition():
+    try:
+        CallbackData("x:y", a=INT, b=INT, c=INT, d=INT, e=INT)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("oversized schema accepted")
+    assert len(MOVE.pack("down", 2 ** 63 - 1)) <= CALLBACK_DATA_LIMIT
+
+
+def test_optional_fields_must_come_last():
+    try:
+        CallbackData("x:z", a=Int(optional=True), b=INT)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("optional field before a required one accepted")
+
+
+def callback_table():
+    routes = CallbackRoutes()
+
+    @routes.route(MOVE)
+    async def move(callback, callback_data):
+        return callback_data
+
+    @routes.route(PAGE)
+    async def page(callback, callback_data):
+        return callback_data
+
+    @routes.route(CallbackData("m:p", telegram_id=USER_ID, feature=Token(16, optional=True)))
+    async def permissions(callback, callback_data):
+        return callback_data
+
+    @routes.route(CallbackData("r:u", user_id=USER_ID), state=SupportState.waiting_for_reply)
+    async def reply(callback, callback_data):
+        return callback_data
+
+    return routes
+
+
+def test_trie_resolves_to_the_owning_schema():
+    routes = callback_table()
+    route, values = routes.resolve("b:m:down:a")
+    assert route.name == "move" and values == ("down", 10)
+    route, values = routes.resolve("m:p:1:stats")
+    assert route.name == "permissions" and values == (1, "stats")
+    assert routes.resolve("b:x:1") == (None, None)
+    assert routes.resolve("b") == (None, None)
+    assert routes.resolve("b:m:sideways:1") == (None, None)
+    # Buttons of messages sent before the schemas existed
+    assert routes.resolve("admin:buttons") == (None, None)
+
+
+def test_overlapping_prefixes_are_rejected():
+    routes = callback_table()
+    for prefix in ("b:m", "b:m:x", "b"):
+        try:
+            routes.route(CallbackData(prefix))(lambda callback: None)
+        except ValueError:
+            continue
+        raise AssertionError(f"{prefix!r} accepted")
+
+
+def test_filter_checks_the_route_state():
+    routes = callback_table()
+
+    def matched(data, raw_state=None):
+        result = asyncio.run(routes.filter(SimpleNamespace(data=data), raw_state))
+        return result and (result["callback_route"].name, result["callback_data"])
+
+    assert matched("b:m:up:1") == ("move", ("up", 1))
+    assert matched("r:u:5") is False
+    assert matched("r:u:5", SupportState.waiting_for_reply.state) == ("reply", (5,))
+    assert matched(None) is False
@@ -0,0 +1,44 @@
+# tests/test_shutdown.py
+
+import asyncio
+
+import bot
+
+
+class Part:
+    def __init__(self, calls, name, fail=False):
+        self.calls = calls
+        self.name = name
+        self.fail = fail
+
+    def _call(self):
+        self.calls.append(self.name)
+        if self.fail:
+            raise RuntimeError(f"{self.name} failed")
+
+    async def stop(self):
+        self._call()
+
+    async def close(self):
+        self._call()
+
+
+class SyncPart(Part):
+    def stop(self):
+        self._call()
+
+    def close(self):
+        self._call()
+
+
+def test_a_failed_flush_does_not_skip_the_later_closes(monkeypatch):
+    calls = []
+    monkeypatch.setattr(bot, "broadcasts", Part(calls, "broadcasts"))
+    monkeypatch.setattr(bot, "user_writes", Part(calls, "user_writes", fail=True))
+    monkeypatch.setattr(bot, "activity", Part(calls, "activity", fail=True))
+    monkeypatch.setattr(bot, "fsm_storage", Part(calls, "fsm_storage"))
+    monkeypatch.setattr(bot, "capture", SyncPart(calls, "capture"))
+    monkeypatch.setattr(bot, "db", SyncPart(calls, "db"))
+
+    asyncio.run(bot.on_shutdown())
+    assert calls == ["broadcasts", "user_writes", "activity", "fsm_storage", "capture", "db"]
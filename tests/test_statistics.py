@@ -0,0 +1,91 @@
+# tests/test_statistics.py
+
+import asyncio
+import sqlite3
+
+
+def real_counts(database):
+    conn = sqlite3.connect(database.connections.path)
+    counts = {
+        "users_total": conn.execute("SELECT COUNT(*) FROM users").fetchone()[0],
+        "users_active": conn.execute("SELECT COUNT(*) FROM users WHERE is_active = 1").fetchone()[0],
+        "users_blocked": conn.execute("SELECT COUNT(*) FROM users WHERE is_active = 0").fetchone()[0],
+        "supervisors": conn.execute("SELECT COUNT(*) FROM users WHERE role IN ('admin', 'supervisor')").fetchone()[0],
+    }
+    for button_id, count in conn.execute(
+        "SELECT button_id, COUNT(*) FROM support_messages WHERE button_id IS NOT NULL GROUP BY button_id"
+    ):
+        counts[f"button_messages:{button_id}"] = count
+    conn.close()
+    return counts
+
+
+def counters(statistics):
+    # Button counters that dropped to zero stay as rows with value 0
+    return {key: value for key, value in statistics.items() if value or not key.startswith("button_messages:")}
+
+
+def test_counters_follow_every_user_write_path(fresh_db):
+    async def scenario():
+        checks = []
+
+        async def check(step):
+            checks.append((step, counters(await fresh_db.get_statistics()), real_counts(fresh_db)))
+
+        await fresh_db.add_user(1, "one", "One")
+        await fresh_db.add_user(1, "one", "One")  # ignored duplicate
+        await check("add_user")
+        await fresh_db.upsert_users([(1, "uno", "Uno"), (2, "two", "Two"), (3, "three", "Three")])
+        await check("upsert_users, one existing")
+        await fresh_db.upsert_users([(2, "dos", "Dos")])
+        await check("upsert_users, all existing")
+        await fresh_db.add_user(4, "four", "Four", role="supervisor")
+        await fresh_db.update_user_role(2, "admin")
+        await fresh_db.update_user_role(4, "user")
+        await check("update_user_role")
+        await fresh_db.set_user_active(3, 0)
+        await fresh_db.set_user_active(3, 0)
+        await fresh_db.set_user_active(1, 0)
+        await fresh_db.set_user_active(1, 1)
+        await check("set_user_active")
+        await fresh_db.delete_user(3)
+        await fresh_db.delete_supervisor(2)
+        await check("delete")
+        return checks
+
+    for step, statistics, expected in asyncio.run(scenario()):
+        assert statistics == expected, step
+
+
+def test_counters_follow_support_messages(fresh_db):
+    async def scenario():
+        await fresh_db.add_user(1, "one", "One")
+        ids = [await fresh_db.add_support_message(1, f"q{index}", button_id=index % 2 + 10) for index in range(5)]
+        await fresh_db.add_support_message(1, "answer", is_from_admin=1, admin_id=9, button_id=10)
+        await fresh_db.add_support_message(1, "no section")
+        first = counters(await fresh_db.get_statistics()), real_counts(fresh_db)
+        await fresh_db.delete_support_message(ids[0])
+        await fresh_db.clear_support_messages_by_button(11)
+        second = counters(await fresh_db.get_statistics()), real_counts(fresh_db)
+        daily = (await fresh_db.get_daily_stats(1))[0]
+        return first, second, daily
+
+    first, second, daily = asyncio.run(scenario())
+    assert first[0] == first[1]
+    assert second[0] == second[1]
+    assert second[0]["button_messages:10"] == 3
+    # Rollups count what arrived that day; admin replies are not support messages
+    assert (daily["new_users"], daily["support_messages"]) == (1, 6)
+
+
+def test_activity_rollups_count_each_user_once_per_day(fresh_db):
+    async def scenario():
+        await fresh_db.upsert_users([(1, "one", "One"), (2, "two", "Two")])
+        await fresh_db.record_activity("2024-05-01", [1, 2], {7: 2})
+        await fresh_db.record_activity("2024-05-01", [1], {7: 1, 8: 1})
+        await fresh_db.record_activity("2024-05-02", [1], None)
+        return {row["day"]: dict(row) for row in await fresh_db.get_daily_stats(10)}
+
+    days = asyncio.run(scenario())
+    assert (days["2024-05-01"]["active_users"], days["2024-05-01"]["button_presses"]) == (2, 4)
+    assert days["2024-05-02"]["active_users"] == 1
@@ -0,0 +1,110 @@
+# tests/test_support_logs.py
+
+import asyncio
+import re
+
+import admin_interface
+from admin_interface import MESSAGE_LIMIT, telegram_length, render_section_logs
+from callbacks import LOG_PAGE
+
+
+class FakeMessage:
+    def __init__(self):
+        self.edits = []
+
+    async def edit_text(self, text, reply_markup=None, **kwargs):
+        self.edits.append((text, reply_markup))
+
+
+class FakeCallback:
+    def __init__(self):
+        self.message = FakeMessage()
+
+
+def ids_on(text):
+    return [int(found) for found in re.findall(r"/del_(\d+)", text)]
+
+
+def pages(markup):
+    # {"older"/"newer": LOG_PAGE values} from the navigation row
+    found = {}
+    for row in markup.inline_keyboard:
+        for button in row:
+            if button.callback_data.startswith("l:v"):
+                key = "older" if "أقدم" in button.text else "newer"
+                found[key] = LOG_PAGE.unpack(button.callback_data)
+    return found
+
+
+async def fill(database, button_id, texts):
+    await database.add_user(1, "client", "Client")
+    return [await database.add_support_message(1, text, button_id=button_id) for text in texts]
+
+
+def test_messages_page_walks_both_ways_and_stops_at_the_ends(fresh_db):
+    async def scenario():
+        ids = await fill(fresh_db, 10, [f"m{index}" for index in range(7)])
+        await fill(fresh_db, 11, ["other section"])
+        page = lambda **kwargs: fresh_db.get_messages_page(10, limit=3, **kwargs)
+        newest = [row["id"] for row in await page()]
+        older = [row["id"] for row in await page(before_id=newest[-1])]
+        oldest = [row["id"] for row in await page(before_id=older[-1])]
+        past_oldest = await page(before_id=oldest[-1])
+        newer = [row["id"] for row in await page(after_id=oldest[0])]
+        past_newest = await page(after_id=newest[0])
+        ends = (await fresh_db.has_messages_around(10, ids[0], ids[2]),
+                await fresh_db.has_messages_around(10, ids[4], ids[6]))
+        return ids, newest, older, oldest, past_oldest, newer, past_newest, ends
+
+    ids, newest, older, oldest, past_oldest, newer, past_newest, ends = asyncio.run(scenario())
+    assert newest == ids[6:3:-1] and older == ids[3:0:-1] and oldest == ids[:1]
+    assert newer == ids[1:4]
+    assert past_oldest == [] and past_newest == []
+    assert ends == ((False, True), (True, False))
+
+
+def test_section_log_pages_fit_the_limit_and_cover_every_message(fresh_db, monkeypatch):
+    monkeypatch.setattr(admin_interface, "db", fresh_db)
+    # Escaping and astral characters make a page longer than len() says
+    texts = [f"<{index}> " + "😀&" * 300 for index in range(30)]
+
+    async def scenario():
+        ids = await fill(fresh_db, 10, texts)
+        callback = FakeCallback()
+        await render_section_logs(callback, 10)
+        while "older" in pages(callback.message.edits[-1][1]):
+            await render_section_logs(callback, 10, before_id=pages(callback.message.edits[-1][1])["older"].before_id)
+        backwards = list(callback.message.edits)
+        while "newer" in pages(callback.message.edits[-1][1]):
+            await render_section_logs(callback, 10, after_id=pages(callback.message.edits[-1][1])["newer"].after_id)
+        return ids, backwards, callback.message.edits[len(backwards):]
+
+    ids, backwards, forwards = asyncio.run(scenario())
+    assert len(backwards) > 1
+    for text, _ in backwards + forwards:
+        assert telegram_length(text) <= MESSAGE_LIMIT
+        assert ids_on(text) == sorted(ids_on(text))
+    seen = [found for text, _ in backwards for found in ids_on(text)]
+    assert sorted(seen) == ids and len(set(seen)) == len(seen)
+    assert sorted(found for text, _ in forwards for found in ids_on(text)) == [found for found in ids if found > ids_on(backwards[-1][0])[-1]]
+    # Only the newest page offers a reply to the last client message
+    assert any("💬" in button.text for row in backwards[0][1].inline_keyboard for button in row)
+    assert not any("💬" in button.text for row in backwards[-1][1].inline_keyboard for button in row)
+
+
+def test_an_over_long_message_is_cut_to_fit(fresh_db, monkeypatch):
+    monkeypatch.setattr(admin_interface, "db", fresh_db)
+
+    async def scenario():
+        ids = await fill(fresh_db, 10, ["short", "<b>" + "😀" * 5000])
+        callback = FakeCallback()
+        await render_section_logs(callback, 10)
+        await render_section_logs(callback, 10, before_id=ids[1])
+        return ids, callback.message.edits
+
+    ids, edits = asyncio.run(scenario())
+    text, markup = edits[0]
+    assert telegram_length(text) <= MESSAGE_LIMIT
+    assert "…" in text and "&lt;b&gt;" in text and ids_on(text) == [ids[1]]
+    assert pages(markup)["older"].before_id == ids[1]
+    assert ids_on(edits[1][0]) == [ids[0]]
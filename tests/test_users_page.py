@@ -0,0 +1,101 @@
+# tests/test_users_page.py
+
+import asyncio
+import sqlite3
+
+from migrations import user_list_indexes
+from tools.common import seed_users
+
+
+def connect(database):
+    return sqlite3.connect(database.connections.path)
+
+
+def page_through(database, limit=10, **filters):
+    async def scenario():
+        pages, cursor = [], None
+        while True:
+            rows, has_more = await database.get_users_page(older_than=cursor, limit=limit, **filters)
+            pages.append([row["telegram_id"] for row in rows])
+            if not has_more:
+                return pages
+            cursor = rows[-1]["id"]
+
+    return asyncio.run(scenario())
+
+
+def test_pages_walk_every_user_newest_first(fresh_db):
+    ids = seed_users(fresh_db.connections.path, 25, first_id=1000)
+    pages = page_through(fresh_db, role="user")
+    assert [len(page) for page in pages] == [10, 10, 5]
+    assert [telegram_id for page in pages for telegram_id in page] == ids[::-1]
+
+
+def test_newer_than_returns_the_previous_page(fresh_db):
+    seed_users(fresh_db.connections.path, 25, first_id=1000)
+
+    async def scenario():
+        first, _ = await fresh_db.get_users_page(role="user", limit=10)
+        second, _ = await fresh_db.get_users_page(role="user", older_than=first[-1]["id"], limit=10)
+        back, has_more = await fresh_db.get_users_page(role="user", newer_than=second[0]["id"], limit=10)
+        newest, has_newer = await fresh_db.get_users_page(role="user", newer_than=first[0]["id"], limit=10)
+        return first, back, has_more, newest, has_newer
+
+    first, back, has_more, newest, has_newer = asyncio.run(scenario())
+    assert [row["id"] for row in back] == [row["id"] for row in first]
+    assert not has_more
+    assert newest == [] and not has_newer
+
+
+def test_equal_join_times_are_ordered_by_id(fresh_db):
+    ids = seed_users(fresh_db.connections.path, 12, first_id=1000)
+    conn = connect(fresh_db)
+    with conn:
+        conn.execute("UPDATE users SET joined_at = '2024-01-01 00:00:00' WHERE telegram_id >= 1000")
+    conn.close()
+    pages = page_through(fresh_db, limit=5, role="user")
+    assert [telegram_id for page in pages for telegram_id in page] == ids[::-1]
+
+
+def test_role_and_active_filters(fresh_db):
+    path = fresh_db.connections.path
+    users = seed_users(path, 6, first_id=1000)
+    supervisors = seed_users(path, 3, first_id=2000, role="supervisor")
+    asyncio.run(fresh_db.set_user_active(users[0], 0))
+
+    assert page_through(fresh_db, role="supervisor") == [supervisors[::-1]]
+    assert page_through(fresh_db, is_active=0) == [[users[0]]]
+    assert page_through(fresh_db, role="user", is_active=1) == [users[1:][::-1]]
+
+
+def test_search_matches_name_prefixes_case_insensitively(fresh_db):
+    conn = connect(fresh_db)
+    with conn:
+        conn.executemany(
+            "INSERT INTO users (telegram_id, username, full_name, joined_at) VALUES (?, ?, ?, ?)",
+            [
+                (1001, "Ahmad", "Ahmad Ali", "2024-01-01 00:00:01"),
+                (1002, "ahmed_x", "Zaid", "2024-01-01 00:00:02"),
+                (1003, "bob", "AHMAD Saleh", "2024-01-01 00:00:03"),
+                (1004, "sahmad", "Omar", "2024-01-01 00:00:04"),
+            ]
+        )
+    conn.close()
+
+    assert page_through(fresh_db, search="ah") == [[1003, 1002, 1001]]
+    assert page_through(fresh_db, search="AHMAD") == [[1003, 1001]]
+    assert page_through(fresh_db, search="1004") == [[1004]]
+    assert page_through(fresh_db, search="zz") == [[]]
+
+
+def test_null_join_times_are_backfilled_and_paged_last(fresh_db):
+    ids = seed_users(fresh_db.connections.path, 4, first_id=1000)
+    conn = connect(fresh_db)
+    with conn:
+        conn.execute("UPDATE users SET joined_at = NULL WHERE telegram_id IN (?, ?)", (ids[2], ids[3]))
+        user_list_indexes(conn)
+        nulls = conn.execute("SELECT COUNT(*) FROM users WHERE joined_at IS NULL").fetchone()[0]
+    conn.close()
+
+    assert nulls == 0
+    assert page_through(fresh_db, limit=3, role="user") == [[ids[1], ids[0], ids[3]], [ids[2]]]
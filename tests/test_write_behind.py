@@ -0,0 +1,84 @@
+# tests/test_write_behind.py
+
+import asyncio
+from collections import Counter
+
+from activity import ActivityTracker
+from write_behind import UserUpsertQueue
+
+
+class FakeDatabase:
+    # Fails the first `failures` writes, and once for each day in fail_days
+    def __init__(self, failures=0, fail_days=()):
+        self.failures = failures
+        self.fail_days = set(fail_days)
+        self.users = []
+        self.activity = []
+
+    def _maybe_fail(self):
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError("database is locked")
+
+    async def upsert_users(self, rows):
+        await asyncio.sleep(0)
+        self._maybe_fail()
+        self.users.extend(rows)
+
+    async def record_activity(self, day, telegram_ids, presses):
+        if day in self.fail_days:
+            self.fail_days.discard(day)
+            raise RuntimeError("database is locked")
+        self.activity.append((day, sorted(telegram_ids), dict(presses or {})))
+
+
+def test_batch_size_wakes_the_writer():
+    async def scenario():
+        database = FakeDatabase()
+        queue = UserUpsertQueue(database, flush_interval_ms=3_600_000, max_rows=2)
+        queue.upsert(1, "one", "One")
+        queue.upsert(2, "two", "Two")
+        await asyncio.sleep(0.01)
+        written = list(database.users)
+        await queue.stop()
+        return written
+
+    assert asyncio.run(scenario()) == [(1, "one", "One"), (2, "two", "Two")]
+
+
+def test_failed_batch_is_retried_without_clobbering_newer_values():
+    async def scenario():
+        database = FakeDatabase(failures=1)
+        queue = UserUpsertQueue(database, flush_interval_ms=3_600_000)
+        queue.upsert(1, "old", "Old")
+        queue.upsert(2, "two", "Two")
+        flushing = asyncio.create_task(queue.flush())
+        await asyncio.sleep(0)
+        queue.upsert(1, "new", "New")
+        try:
+            await flushing
+        except RuntimeError:
+            pass
+        await queue.stop()
+        return sorted(database.users)
+
+    assert asyncio.run(scenario()) == [(1, "new", "New"), (2, "two", "Two")]
+
+
+def test_activity_puts_back_only_unwritten_days():
+    async def scenario():
+        database = FakeDatabase(fail_days={"2024-01-02"})
+        tracker = ActivityTracker(database, flush_interval=3600)
+        tracker.pending = {"2024-01-01": {1}, "2024-01-02": {2}}
+        tracker.presses = {"2024-01-02": Counter({7: 3})}
+        try:
+            await tracker.flush()
+        except RuntimeError:
+            pass
+        remaining = (dict(tracker.pending), dict(tracker.presses))
+        await tracker.stop()
+        return remaining, database.activity
+
+    remaining, written = asyncio.run(scenario())
+    assert remaining == ({"2024-01-02": {2}}, {"2024-01-02": Counter({7: 3})})
+    assert written == [("2024-01-01", [1], {}), ("2024-01-02", [2], {7: 3})]
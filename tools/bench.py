@@ -0,0 +1,213 @@
+# tools/bench.py
+#
+# In-process throughput benchmark: builds the real dispatcher (bot.py
+# handlers + admin_router + user_router) against a copy of the database and
+# a stubbed Bot API session, then feeds synthetic update streams.
+#
+#   python -m tools.bench
+#   python -m tools.bench --db bot.db --users 5000 --clients 500 --scenario menu --scenario support
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sqlite3
+
+from tools.common import (
+    ROOT, prepare_environment, quiet_logging, seed_users, stub_session,
+    callback_targets, message_update, callback_update, summarize, print_table, Timer,
+)
+
+BACK = "⬅️ العودة للقائمة السابقة"
+HOME = "🏠 القائمة الرئيسية"
+ADMIN_BASE_ID = 9_000_000
+
+
+# ======================
+# Scenarios
+# ======================
+# Each scenario is an async generator per virtual user yielding updates; the
+# runner feeds one update at a time, so a scenario can look at the replies
+# (ctx.session.last_markup) before choosing its next update.
+class Context:
+    def __init__(self, session, rng, depth, pages):
+        self.session = session
+        self.rng = rng
+        self.depth = depth
+        self.pages = pages
+
+
+async def start_storm(ctx, user_id):
+    yield message_update(user_id, "/start")
+
+
+async def menu_navigation(ctx, user_id):
+    from button_cache import button_tree
+
+    yield message_update(user_id, "/start")
+    parent_id, levels = None, 0
+    for _ in range(ctx.depth):
+        children = [
+            child for child in await button_tree.get_children(parent_id)
+            if child["type"] != "contact"
+        ]
+        if not children:
+            break
+        target = ctx.rng.choice(children)
+        yield message_update(user_id, target["text"])
+        target = await button_tree.get(target["id"])
+        if not (target["has_children"] or target["type"] == "folder"):
+            break
+        parent_id, levels = target["id"], levels + 1
+    for _ in range(levels):
+        yield message_update(user_id, BACK)
+    yield message_update(user_id, HOME)
+
+
+async def support_submission(ctx, user_id):
+    from button_cache import button_tree
+
+    await button_tree.ensure_loaded()
+    contacts = [button for button in button_tree.by_id.values() if button["type"] == "contact"]
+    if not contacts:
+        return
+    target = ctx.rng.choice(contacts)
+    path = [target]
+    while path[0]["parent_id"]:
+        path.insert(0, await button_tree.get(path[0]["parent_id"]))
+    yield message_update(user_id, HOME)
+    for button in path:
+        yield message_update(user_id, button["text"])
+    yield message_update(user_id, f"رسالة تجريبية من {user_id}")
+
+
+async def admin_paging(ctx, admin_id):
+    from callbacks import STATS, USERS_PAGE, LOG_SECTIONS, LOG_PAGE
+
+    session = ctx.session
+    yield callback_update(admin_id, STATS.pack())
+    yield callback_update(admin_id, USERS_PAGE.pack("*", "*", False))
+    for _ in range(ctx.pages):
+        older = callback_targets(session.last_markup.get(admin_id), USERS_PAGE.prefix + ":")
+        older = [data for data in older if USERS_PAGE.unpack(data).older_than is not None]
+        if not older:
+            break
+        yield callback_update(admin_id, older[0])
+
+    yield callback_update(admin_id, LOG_SECTIONS.pack())
+    sections = callback_targets(session.last_markup.get(admin_id), LOG_PAGE.prefix + ":")
+    if sections:
+        yield callback_update(admin_id, ctx.rng.choice(sections))
+        for _ in range(ctx.pages):
+            older = callback_targets(session.last_markup.get(admin_id), LOG_PAGE.prefix + ":")
+            older = [data for data in older if LOG_PAGE.unpack(data).before_id is not None]
+            if not older:
+                break
+            yield callback_update(admin_id, older[0])
+
+
+SCENARIOS = {
+    "start": (start_storm, "users"),
+    "menu": (menu_navigation, "users"),
+    "support": (support_submission, "users"),
+    "admin": (admin_paging, "admins"),
+}
+
+
+# ======================
+# Runner
+# ======================
+async def run_scenario(dp, bot, ctx, name, scenario, user_ids, concurrency):
+    latencies = []
+    errors = 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def drive(user_id):
+        nonlocal errors
+        async with semaphore:
+            async for update in scenario(ctx, user_id):
+                with Timer() as timer:
+                    try:
+                        await dp.feed_update(bot, update)
+                    except Exception:
+                        errors += 1
+                latencies.append(timer.elapsed)
+
+    with Timer() as total:
+        await asyncio.gather(*(drive(user_id) for user_id in user_ids))
+    return summarize(name, latencies, total.elapsed, errors)
+
+
+def seed_support_messages(path, count, rng):
+    conn = sqlite3.connect(path)
+    contacts = [row[0] for row in conn.execute("SELECT id FROM buttons WHERE type = 'contact' AND is_active = 1")]
+    users = [row[0] for row in conn.execute("SELECT telegram_id FROM users WHERE role = 'user' LIMIT 1000")]
+    if contacts and users:
+        with conn:
+            conn.executemany(
+                "INSERT INTO support_messages (user_id, message_text, is_from_admin, button_id) VALUES (?, ?, ?, ?)",
+                [
+                    (rng.choice(users), f"رسالة رقم {index} " * rng.randint(1, 12), int(rng.random() < 0.3), rng.choice(contacts))
+                    for index in range(count)
+                ]
+            )
+    conn.close()
+
+
+async def bench(args):
+    rng = random.Random(args.seed)
+    path = prepare_environment(args.db, args.target)
+    user_ids = seed_users(path, args.users)
+    admin_ids = seed_users(path, args.admins, first_id=ADMIN_BASE_ID, role="admin")
+    seed_support_messages(path, args.messages, rng)
+
+    # Imported only now: they read the environment prepared above
+    from aiogram import Bot
+    import bot as bot_module
+    from database import db
+
+    quiet_logging()
+    bot_module.setup_dispatcher(bot_module.dp)
+    await db.add_user(telegram_id=int(os.environ["SUPER_ADMIN_ID"]), role="super_admin")
+
+    session = stub_session(args.api_latency / 1000)
+    bot = Bot(token=os.environ["BOT_TOKEN"], session=session)
+    ctx = Context(session, rng, args.depth, args.pages)
+
+    results = []
+    for name in args.scenario or list(SCENARIOS):
+        scenario, population = SCENARIOS[name]
+        pool = admin_ids if population == "admins" else user_ids
+        clients = [rng.choice(pool) for _ in range(args.clients)] if population == "users" else pool
+        # One stream per user at a time: the same user never runs twice in parallel
+        clients = list(dict.fromkeys(clients))
+        results.append(await run_scenario(bot_module.dp, bot, ctx, name, scenario, clients, args.concurrency))
+
+    await bot_module.on_shutdown()
+    print_table(results)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Feed synthetic updates through the real dispatcher")
+    parser.add_argument("--db", default=os.path.join(ROOT, "bot.db"), help="database to copy (left untouched)")
+    parser.add_argument("--target", help="where to put the working copy (default: a temp dir)")
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS), help="repeatable; default: all")
+    parser.add_argument("--users", type=int, default=2000, help="synthetic users to add")
+    parser.add_argument("--admins", type=int, default=5, help="synthetic admins for the admin scenario")
+    parser.add_argument("--messages", type=int, default=5000, help="synthetic support messages to add")
+    parser.add_argument("--clients", type=int, default=300, help="virtual users per scenario")
+    parser.add_argument("--concurrency", type=int, default=50, help="virtual users in flight")
+    parser.add_argument("--depth", type=int, default=4, help="max menu depth walked")
+    parser.add_argument("--pages", type=int, default=5, help="pages turned per admin list")
+    parser.add_argument("--api-latency", type=float, default=0.0, help="simulated Bot API latency in ms")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="also write the results to this file")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    asyncio.run(bench(parse_args()))
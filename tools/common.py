@@ -0,0 +1,200 @@
+# tools/common.py
+
+import asyncio
+import datetime
+import itertools
+import logging
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+# ======================
+# Environment
+# ======================
+def prepare_environment(source_db=None, target_db=None):
+    # Must run before any bot module is imported: config.py reads the
+    # environment at import time and database.py opens DATABASE_NAME.
+    if target_db is None:
+        target_db = os.path.join(tempfile.mkdtemp(prefix="bot-tools-"), "bot.db")
+    if source_db:
+        shutil.copy(source_db, target_db)
+    os.environ["DATABASE_NAME"] = target_db
+    os.environ.setdefault("BOT_TOKEN", "123456:TOOLS")
+    os.environ.setdefault("SUPER_ADMIN_ID", "1")
+    # Notification fan-out must not be paced like real Telegram traffic
+    os.environ.setdefault("BROADCAST_RATE_LIMIT", "1000000")
+    os.environ.setdefault("BROADCAST_PER_CHAT_INTERVAL", "0")
+    # Measure full handling; set these explicitly to study load shedding
+    os.environ.setdefault("EXECUTOR_SHED_QUEUE_DEPTH", "0")
+    os.environ.setdefault("EXECUTOR_SHED_WAIT_MS", "0")
+    return target_db
+
+
+def quiet_logging():
+    # bot.py configures INFO; per-update log lines would dominate the timings
+    logging.getLogger().setLevel(logging.WARNING)
+    logging.getLogger("aiogram").setLevel(logging.WARNING)
+
+
+def seed_users(path, count, first_id=10_000_000, role="user"):
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.executemany(
+            "INSERT OR IGNORE INTO users (telegram_id, username, full_name, role, joined_at) "
+            "VALUES (?, ?, ?, ?, datetime('now', ?))",
+            [
+                (telegram_id, f"user{telegram_id}", f"User {telegram_id}", role, f"-{count - index} seconds")
+                for index, telegram_id in enumerate(range(first_id, first_id + count))
+            ]
+        )
+    conn.close()
+    return list(range(first_id, first_id + count))
+
+
+# ======================
+# Stub Bot API session
+# ======================
+def _make_stub_session():
+    from aiogram.client.session.base import BaseSession
+    from aiogram.types import Chat, Message, User
+
+    class StubSession(BaseSession):
+        # Answers every Bot API call locally; remembers the last markup sent
+        # to each chat so scenarios can follow inline navigation.
+        def __init__(self, latency=0.0):
+            super().__init__()
+            self.latency = latency
+            self.calls = 0
+            self.last_markup = {}
+            self._message_ids = itertools.count(1)
+            self._me = User(id=123456, is_bot=True, first_name="Bench", username="bench_bot")
+
+        async def close(self):
+            pass
+
+        async def stream_content(self, *args, **kwargs):
+            yield b""
+
+        async def make_request(self, bot, method, timeout=None):
+            self.calls += 1
+            if self.latency:
+                await asyncio.sleep(self.latency)
+            name = type(method).__name__
+            chat_id = getattr(method, "chat_id", None)
+            if name in ("SendMessage", "EditMessageText"):
+                if getattr(method, "reply_markup", None) is not None:
+                    self.last_markup[chat_id] = method.reply_markup
+                return Message(
+                    message_id=next(self._message_ids),
+                    date=datetime.datetime.now(),
+                    chat=Chat(id=chat_id if isinstance(chat_id, int) else 0, type="private"),
+                    from_user=self._me,
+                    text=method.text,
+                )
+            if name == "GetMe":
+                return self._me
+            return True
+
+    return StubSession
+
+
+def stub_session(latency=0.0):
+    return _make_stub_session()(latency)
+
+
+def callback_targets(markup, prefix):
+    # callback_data of the inline buttons in `markup` starting with prefix
+    if markup is None or not hasattr(markup, "inline_keyboard"):
+        return []
+    return [
+        button.callback_data
+        for row in markup.inline_keyboard for button in row
+        if button.callback_data and button.callback_data.startswith(prefix)
+    ]
+
+
+# ======================
+# Synthetic updates
+# ======================
+_update_ids = itertools.count(1)
+
+
+def _user(user_id):
+    from aiogram.types import User
+    return User(id=user_id, is_bot=False, first_name=f"User {user_id}", username=f"user{user_id}")
+
+
+def message_update(user_id, text):
+    from aiogram.types import Chat, Message, Update
+    update_id = next(_update_ids)
+    return Update(update_id=update_id, message=Message(
+        message_id=update_id,
+        date=datetime.datetime.now(),
+        chat=Chat(id=user_id, type="private"),
+        from_user=_user(user_id),
+        text=text,
+    ))
+
+
+def callback_update(user_id, data):
+    from aiogram.types import CallbackQuery, Chat, Message, Update
+    update_id = next(_update_ids)
+    return Update(update_id=update_id, callback_query=CallbackQuery(
+        id=str(update_id),
+        chat_instance=str(user_id),
+        from_user=_user(user_id),
+        data=data,
+        message=Message(
+            message_id=update_id,
+            date=datetime.datetime.now(),
+            chat=Chat(id=user_id, type="private"),
+            text="…",
+        ),
+    ))
+
+
+# ======================
+# Reporting
+# ======================
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def summarize(name, latencies, elapsed, errors=0):
+    values = sorted(latencies)
+    return {
+        "scenario": name,
+        "updates": len(values),
+        "seconds": round(elapsed, 3),
+        "updates_per_sec": round(len(values) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(values, 0.50) * 1000, 2),
+        "p90_ms": round(percentile(values, 0.90) * 1000, 2),
+        "p99_ms": round(percentile(values, 0.99) * 1000, 2),
+        "max_ms": round(values[-1] * 1000, 2) if values else 0.0,
+        "errors": errors,
+    }
+
+
+def print_table(rows):
+    columns = ["scenario", "updates", "seconds", "updates_per_sec", "p50_ms", "p90_ms", "p99_ms", "max_ms", "errors"]
+    widths = {column: max(len(column), *(len(str(row[column])) for row in rows)) for column in columns}
+    print("  ".join(column.ljust(widths[column]) for column in columns))
+    for row in rows:
+        print("  ".join(str(row[column]).ljust(widths[column]) for column in columns))
+
+
+class Timer:
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed = time.perf_counter() - self.started
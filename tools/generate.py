@@ -0,0 +1,251 @@
+# tools/generate.py
+#
+# Fills a database file with reproducible synthetic data at campaign scale:
+# users with roles, a button tree, support threads on the contact buttons and
+# admin logs. The schema comes from migrations.py, so the file is exactly
+# what the bot would create.
+#
+#   python -m tools.generate /tmp/big.db --users 200000 --messages 2000000
+#   python -m tools.generate /tmp/deep.db --depth 6 --fanout 6 --seed 7
+
+import argparse
+import datetime
+import os
+import random
+import sqlite3
+import sys
+
+from migrations import apply_migrations
+from tools.common import ROOT, Timer
+
+SUPER_ADMIN_ID = 1
+FIRST_USER_ID = 100_000_000
+BATCH_SIZE = 10_000
+EPOCH = datetime.datetime(2025, 1, 1)
+
+FIRST_NAMES = ["محمد", "أحمد", "عبدالله", "يوسف", "عمر", "خالد", "فاطمة", "عائشة", "مريم", "زينب", "Ali", "Sara", "Omar", "Lina"]
+LAST_NAMES = ["العتيبي", "الشمري", "القحطاني", "الحربي", "الزهراني", "Hassan", "Saleh", "Khan", ""]
+LEAF_TYPES = ["content", "text", "url", "contact"]
+ADMIN_ACTIONS = [
+    ("reply", "contact"), ("delete_message", "contact"), ("add_button", "buttons"),
+    ("edit_button", "buttons"), ("broadcast", "broadcast"), ("add_supervisor", "managers"),
+]
+
+
+def timestamp(rng, days):
+    return (EPOCH + datetime.timedelta(seconds=rng.randrange(days * 86400))).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def batched(rows, size=BATCH_SIZE):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def insert_many(conn, query, rows):
+    count = 0
+    for batch in batched(rows):
+        with conn:
+            conn.executemany(query, batch)
+        count += len(batch)
+    return count
+
+
+# ======================
+# Generators
+# ======================
+def user_rows(rng, count, supervisors, admins, days):
+    yield (SUPER_ADMIN_ID, "owner", "Owner", "super_admin", 1, timestamp(rng, 1), None)
+    staff = ["admin"] * admins + ["supervisor"] * supervisors
+    for index in range(count):
+        telegram_id = FIRST_USER_ID + index
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        # About a third of Telegram users have no username
+        username = f"{first.lower()}_{telegram_id % 100_000}" if rng.random() < 0.65 else None
+        role = staff[index] if index < len(staff) else "user"
+        is_active = int(rng.random() >= 0.05)
+        joined_at = timestamp(rng, days)
+        # Most users came back at least once after joining
+        last_seen = max(timestamp(rng, days), joined_at)[:10] if rng.random() < 0.7 else None
+        yield (telegram_id, username, f"{first} {last}".strip(), role, is_active, joined_at, last_seen)
+
+
+def button_rows(rng, depth, fanout):
+    # Breadth-first so every parent exists before its children; positions are
+    # global like add_button's
+    next_id, position = 1, 0
+    level = [None]
+    rows = []
+    for current_depth in range(1, depth + 1):
+        next_level = []
+        for parent_id in level:
+            for index in range(rng.randint(max(1, fanout // 2), fanout)):
+                if current_depth < depth and rng.random() < 0.6:
+                    btn_type, content = "folder", None
+                    next_level.append(next_id)
+                else:
+                    btn_type = rng.choice(LEAF_TYPES)
+                    content = f"محتوى الزر {next_id}\n" * rng.randint(1, 8)
+                rows.append((next_id, f"زر {current_depth}.{index + 1} #{next_id}", btn_type, content, parent_id, SUPER_ADMIN_ID, position))
+                next_id, position = next_id + 1, position + 1
+        level = next_level
+        if not level:
+            break
+    return rows
+
+
+def support_rows(rng, contact_ids, user_count, admin_ids, messages, days):
+    # Threads: a user writes a few messages on one contact button, staff
+    # answer some of them. Busy buttons get most threads.
+    weights = [1 / (rank + 1) for rank in range(len(contact_ids))]
+    produced = 0
+    while produced < messages:
+        button_id = rng.choices(contact_ids, weights)[0]
+        user_id = FIRST_USER_ID + rng.randrange(user_count)
+        moment = EPOCH + datetime.timedelta(seconds=rng.randrange(days * 86400))
+        for _ in range(min(rng.randint(1, 6), messages - produced)):
+            moment += datetime.timedelta(seconds=rng.randint(5, 3600))
+            stamp = moment.strftime("%Y-%m-%d %H:%M:%S")
+            if admin_ids and rng.random() < 0.35:
+                admin_id = rng.choice(admin_ids)
+                yield (user_id, admin_id, f"رد الإدارة {produced}", 1, stamp, button_id, f"Admin {admin_id}")
+            else:
+                yield (user_id, None, "رسالة من المستخدم " * rng.randint(1, 20), 0, stamp, button_id, None)
+            produced += 1
+
+
+def admin_log_rows(rng, admin_ids, count, days):
+    for index in range(count):
+        admin_id = rng.choice(admin_ids)
+        action, section = rng.choice(ADMIN_ACTIONS)
+        yield (admin_id, f"Admin {admin_id}", action, section, f"تفاصيل العملية {index}", timestamp(rng, days), f"admin{admin_id}")
+
+
+def press_rows(rng, button_ids, days):
+    # One row per button and day it was pressed; popular buttons first
+    weights = [1 / (rank + 1) for rank in range(len(button_ids))]
+    for offset in range(days):
+        day = (EPOCH + datetime.timedelta(days=offset)).strftime("%Y-%m-%d")
+        for button_id in set(rng.choices(button_ids, weights, k=max(1, len(button_ids) // 3))):
+            yield (day, button_id, rng.randint(1, 500))
+
+
+def rebuild_daily_stats(conn):
+    # The triggers date every insert today; spread the rollups over the
+    # generated timestamps instead
+    with conn:
+        conn.execute("DELETE FROM daily_stats")
+        conn.execute("""
+            INSERT INTO daily_stats (day, new_users)
+            SELECT date(joined_at), COUNT(*) FROM users GROUP BY date(joined_at)
+        """)
+        conn.execute("""
+            INSERT INTO daily_stats (day, support_messages)
+            SELECT date(timestamp), COUNT(*) FROM support_messages WHERE is_from_admin IS NOT 1 GROUP BY date(timestamp)
+            ON CONFLICT (day) DO UPDATE SET support_messages = excluded.support_messages
+        """)
+        conn.execute("""
+            INSERT INTO daily_stats (day, active_users)
+            SELECT last_seen, COUNT(*) FROM users WHERE last_seen IS NOT NULL GROUP BY last_seen
+            ON CONFLICT (day) DO UPDATE SET active_users = excluded.active_users
+        """)
+        conn.execute("""
+            INSERT INTO daily_stats (day, button_presses)
+            SELECT day, SUM(presses) FROM button_presses GROUP BY day
+            ON CONFLICT (day) DO UPDATE SET button_presses = excluded.button_presses
+        """)
+
+
+# ======================
+# Entry point
+# ======================
+def generate(path, users=10_000, supervisors=20, admins=5, depth=4, fanout=6,
+             messages=50_000, admin_logs=5_000, days=365, seed=1, log=print):
+    rng = random.Random(seed)
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = OFF")
+    apply_migrations(conn)
+
+    with Timer() as timer:
+        inserted = insert_many(conn, """
+            INSERT INTO users (telegram_id, username, full_name, role, is_active, joined_at, last_seen) VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, user_rows(rng, users, supervisors, admins, days))
+    log(f"users: {inserted} in {timer.elapsed:.1f}s")
+
+    staff_ids = [FIRST_USER_ID + index for index in range(min(users, admins + supervisors))]
+    features = [row[0] for row in conn.execute("SELECT id FROM features")]
+    insert_many(conn, "INSERT OR IGNORE INTO supervisor_permissions (telegram_id, feature_id) VALUES (?, ?)", [
+        (telegram_id, feature)
+        for telegram_id in staff_ids[admins:] for feature in rng.sample(features, rng.randint(1, len(features)))
+    ])
+
+    with Timer() as timer:
+        buttons = button_rows(rng, depth, fanout)
+        insert_many(conn, """
+            INSERT INTO buttons (id, text, type, content, parent_id, created_by, position) VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, buttons)
+    log(f"buttons: {len(buttons)} in {timer.elapsed:.1f}s")
+
+    contact_ids = [row[0] for row in buttons if row[2] == "contact"]
+    responders = [SUPER_ADMIN_ID] + staff_ids
+    with Timer() as timer:
+        inserted = 0
+        if contact_ids and users:
+            inserted = insert_many(conn, """
+                INSERT INTO support_messages (user_id, admin_id, message_text, is_from_admin, timestamp, button_id, admin_name)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, support_rows(rng, contact_ids, users, responders, messages, days))
+    log(f"support_messages: {inserted} on {len(contact_ids)} contact buttons in {timer.elapsed:.1f}s")
+
+    with Timer() as timer:
+        inserted = insert_many(conn, """
+            INSERT INTO admin_logs (admin_id, admin_name, action_type, section, details, timestamp, username)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, admin_log_rows(rng, responders, admin_logs, days))
+    log(f"admin_logs: {inserted} in {timer.elapsed:.1f}s")
+
+    with Timer() as timer:
+        inserted = insert_many(conn, "INSERT INTO button_presses (day, button_id, presses) VALUES (?, ?, ?)",
+                               press_rows(rng, [row[0] for row in buttons], days))
+    log(f"button_presses: {inserted} in {timer.elapsed:.1f}s")
+
+    rebuild_daily_stats(conn)
+    conn.execute("PRAGMA optimize")
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    conn.close()
+    return path
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Generate a synthetic bot database")
+    parser.add_argument("path", help="database file to create (replaced if it exists)")
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--supervisors", type=int, default=20)
+    parser.add_argument("--admins", type=int, default=5)
+    parser.add_argument("--depth", type=int, default=4, help="button tree depth")
+    parser.add_argument("--fanout", type=int, default=6, help="max children per folder")
+    parser.add_argument("--messages", type=int, default=50_000, help="support messages")
+    parser.add_argument("--admin-logs", type=int, default=5_000)
+    parser.add_argument("--days", type=int, default=365, help="span of the generated timestamps")
+    parser.add_argument("--seed", type=int, default=1)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if os.path.abspath(args.path) == os.path.join(ROOT, "bot.db"):
+        sys.exit("Refusing to overwrite the bot's own database")
+    generate(
+        args.path, users=args.users, supervisors=args.supervisors, admins=args.admins, depth=args.depth,
+        fanout=args.fanout, messages=args.messages, admin_logs=args.admin_logs, days=args.days, seed=args.seed,
+    )
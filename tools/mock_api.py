@@ -0,0 +1,406 @@
+# tools/mock_api.py
+#
+# Local stand-in for the Telegram Bot API, for end-to-end load tests of the
+# real process (main.py) over HTTP. It implements the methods the bot uses,
+# drives a population of virtual users that press whatever keyboard the bot
+# last sent them, and can inject latency, 429 and 403 responses.
+#
+#   python -m tools.mock_api --port 8081 --users 200 --duration 60
+#   TELEGRAM_API_URL=http://127.0.0.1:8081 python main.py
+#
+# Polling: updates are served by getUpdates. Webhook: once the bot calls
+# setWebhook the updates are POSTed to that URL with its secret token, e.g.
+#   BOT_MODE=webhook WEBHOOK_URL=http://127.0.0.1:8080 WEBHOOK_SECRET=s python main.py
+
+import argparse
+import asyncio
+import datetime
+import itertools
+import json
+import random
+import time
+
+import aiohttp
+from aiohttp import web
+
+from tools.common import percentile
+
+BOT_USER = {"id": 123456, "is_bot": True, "first_name": "Mock", "username": "mock_bot"}
+FIRST_USER_ID = 500_000_000
+SEND_METHODS = {"sendMessage", "editMessageText"}
+
+
+def now():
+    return int(datetime.datetime.now().timestamp())
+
+
+def private_chat(chat_id):
+    return {"id": chat_id, "type": "private", "first_name": f"User {chat_id}", "username": f"user{chat_id}"}
+
+
+def user_for(chat_id):
+    return {"id": chat_id, "is_bot": False, "first_name": f"User {chat_id}", "username": f"user{chat_id}"}
+
+
+# ======================
+# Mock server
+# ======================
+class MockTelegram:
+    def __init__(self, latency=0.0, jitter=0.0, rate_429=0.0, retry_after=1, rate_403=0.0, seed=1):
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_429 = rate_429
+        self.retry_after = retry_after
+        self.rate_403 = rate_403
+        self.rng = random.Random(seed)
+
+        self.update_ids = itertools.count(1)
+        self.message_ids = itertools.count(1)
+        self.pending = []                  # updates not yet confirmed by getUpdates
+        self.pending_changed = asyncio.Event()
+        self.webhook = None                # (url, secret_token) once setWebhook was called
+        self.callback_chats = {}           # callback_query_id -> chat_id
+        self.connected = asyncio.Event()   # set by the bot's first getUpdates / setWebhook
+
+        self.requests = {}                 # (method, status) -> count
+        self.replies = {}                  # chat_id -> asyncio.Queue of (method, params)
+        self.sent_at = {}                  # chat_id -> when its unanswered update was sent
+        self.latencies = []                # update -> first bot reply, seconds
+        self.updates_sent = 0
+
+    # ----- update delivery -----
+    async def push(self, update, chat_id):
+        update["update_id"] = next(self.update_ids)
+        self.updates_sent += 1
+        self.sent_at.setdefault(chat_id, time.perf_counter())
+        if self.webhook is not None:
+            await self._post_webhook(update)
+        else:
+            self.pending.append(update)
+            self.pending_changed.set()
+
+    async def _post_webhook(self, update):
+        url, secret = self.webhook
+        headers = {"X-Telegram-Bot-Api-Secret-Token": secret} if secret else {}
+        try:
+            async with self.client.post(url, json=update, headers=headers) as response:
+                self._count("webhook", response.status)
+        except aiohttp.ClientError:
+            self._count("webhook", "error")
+
+    def _reply_seen(self, chat_id, method, params):
+        started = self.sent_at.pop(chat_id, None)
+        if started is not None:
+            self.latencies.append(time.perf_counter() - started)
+        queue = self.replies.get(chat_id)
+        if queue is not None:
+            queue.put_nowait((method, params))
+
+    def _count(self, method, status):
+        key = (method, status)
+        self.requests[key] = self.requests.get(key, 0) + 1
+
+    # ----- HTTP -----
+    async def handle(self, request):
+        method = request.match_info["method"]
+        params = dict(request.query)
+        if request.can_read_body:
+            if request.content_type == "application/json":
+                params.update(await request.json())
+            else:
+                params.update(await request.post())
+
+        if method != "getUpdates":
+            delay = self.latency + self.rng.uniform(0, self.jitter)
+            if delay:
+                await asyncio.sleep(delay)
+            if self.rate_429 and self.rng.random() < self.rate_429:
+                self._count(method, 429)
+                return self._error(429, f"Too Many Requests: retry after {self.retry_after}",
+                                   {"retry_after": self.retry_after})
+            if method in SEND_METHODS and self.rate_403 and self.rng.random() < self.rate_403:
+                self._count(method, 403)
+                return self._error(403, "Forbidden: bot was blocked by the user")
+
+        handler = getattr(self, "api_" + method, None)
+        if handler is None:
+            self._count(method, 404)
+            return self._error(404, "Not Found: method not found")
+        result = await handler(params)
+        if isinstance(result, web.Response):
+            return result
+        self._count(method, 200)
+        return web.json_response({"ok": True, "result": result})
+
+    def _error(self, code, description, parameters=None):
+        body = {"ok": False, "error_code": code, "description": description}
+        if parameters:
+            body["parameters"] = parameters
+        return web.json_response(body, status=code)
+
+    def _message(self, chat_id, text, reply_markup=None, message_id=None):
+        message = {
+            "message_id": message_id or next(self.message_ids),
+            "date": now(),
+            "chat": private_chat(chat_id),
+            "from": BOT_USER,
+            "text": text,
+        }
+        if reply_markup and "inline_keyboard" in reply_markup:
+            message["reply_markup"] = reply_markup
+        return message
+
+    # ----- Bot API methods -----
+    async def api_getMe(self, params):
+        return BOT_USER
+
+    async def api_getUpdates(self, params):
+        if self.webhook is not None:
+            return self._error(409, "Conflict: can't use getUpdates method while webhook is active")
+        self.connected.set()
+        offset = int(params.get("offset") or 0)
+        limit = int(params.get("limit") or 100)
+        timeout = float(params.get("timeout") or 0)
+        if offset:
+            self.pending = [update for update in self.pending if update["update_id"] >= offset]
+        if not self.pending and timeout:
+            self.pending_changed.clear()
+            try:
+                await asyncio.wait_for(self.pending_changed.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return self.pending[:limit]
+
+    async def api_setWebhook(self, params):
+        self.webhook = (params["url"], params.get("secret_token"))
+        self.connected.set()
+        return True
+
+    async def api_deleteWebhook(self, params):
+        self.webhook = None
+        return True
+
+    async def api_getWebhookInfo(self, params):
+        url = self.webhook[0] if self.webhook else ""
+        return {"url": url, "has_custom_certificate": False, "pending_update_count": len(self.pending)}
+
+    async def api_sendMessage(self, params):
+        chat_id = int(params["chat_id"])
+        markup = json.loads(params["reply_markup"]) if params.get("reply_markup") else None
+        self._reply_seen(chat_id, "sendMessage", {"text": params.get("text"), "reply_markup": markup})
+        return self._message(chat_id, params.get("text"), markup)
+
+    async def api_editMessageText(self, params):
+        if "inline_message_id" in params:
+            return True
+        chat_id = int(params["chat_id"])
+        markup = json.loads(params["reply_markup"]) if params.get("reply_markup") else None
+        self._reply_seen(chat_id, "editMessageText", {"text": params.get("text"), "reply_markup": markup})
+        return self._message(chat_id, params.get("text"), markup, int(params["message_id"]))
+
+    async def api_answerCallbackQuery(self, params):
+        chat_id = self.callback_chats.pop(params["callback_query_id"], None)
+        if chat_id is not None:
+            self._reply_seen(chat_id, "answerCallbackQuery", {})
+        return True
+
+    async def api_deleteMessage(self, params):
+        return True
+
+    async def api_getChat(self, params):
+        chat_id = str(params["chat_id"])
+        # Virtual users are known as @user<id>; anything else does not exist
+        if chat_id.startswith("@user") and chat_id[5:].isdigit():
+            chat_id = chat_id[5:]
+        if not chat_id.lstrip("-").isdigit():
+            return self._error(400, "Bad Request: chat not found")
+        return dict(
+            private_chat(int(chat_id)),
+            accent_color_id=0,
+            max_reaction_count=11,
+            accepted_gift_types={
+                "unlimited_gifts": True, "limited_gifts": True, "unique_gifts": True,
+                "premium_subscription": True, "gifts_from_channels": True,
+            },
+        )
+
+    # ----- lifecycle -----
+    def build_app(self):
+        app = web.Application(client_max_size=16 * 1024 * 1024)
+        app.router.add_route("*", "/bot{token}/{method}", self.handle)
+        app.router.add_get("/_stats", self.stats_handler)
+        app.on_startup.append(self._on_startup)
+        app.on_cleanup.append(self._on_cleanup)
+        return app
+
+    async def _on_startup(self, app):
+        self.client = aiohttp.ClientSession()
+
+    async def _on_cleanup(self, app):
+        await self.client.close()
+
+    def stats(self):
+        values = sorted(self.latencies)
+        return {
+            "updates_sent": self.updates_sent,
+            "replies": len(values),
+            "reply_p50_ms": round(percentile(values, 0.50) * 1000, 1),
+            "reply_p95_ms": round(percentile(values, 0.95) * 1000, 1),
+            "reply_p99_ms": round(percentile(values, 0.99) * 1000, 1),
+            "requests": {f"{method} {status}": count for (method, status), count in sorted(self.requests.items(), key=str)},
+        }
+
+    async def stats_handler(self, request):
+        return web.json_response(self.stats())
+
+
+# ======================
+# Virtual users
+# ======================
+class VirtualUser:
+    # Starts with /start, then keeps pressing a random button of the last
+    # keyboard the bot sent (reply keyboard text or inline callback), waiting
+    # for the bot's answer each time like a person would.
+    def __init__(self, server, chat_id, rng, think, reply_timeout):
+        self.server = server
+        self.chat_id = chat_id
+        self.rng = rng
+        self.think = think
+        self.reply_timeout = reply_timeout
+        self.keyboard = []                 # reply keyboard texts
+        self.inline = []                   # inline callback_data
+        self.replies = server.replies[chat_id] = asyncio.Queue()
+
+    def _message(self, text):
+        return {"message": {
+            "message_id": next(self.server.message_ids),
+            "date": now(),
+            "chat": private_chat(self.chat_id),
+            "from": user_for(self.chat_id),
+            "text": text,
+        }}
+
+    def _callback(self, data):
+        query_id = str(next(self.server.update_ids))
+        self.server.callback_chats[query_id] = self.chat_id
+        return {"callback_query": {
+            "id": query_id,
+            "chat_instance": str(self.chat_id),
+            "from": user_for(self.chat_id),
+            "data": data,
+            "message": {
+                "message_id": next(self.server.message_ids),
+                "date": now(),
+                "chat": private_chat(self.chat_id),
+                "from": BOT_USER,
+                "text": "…",
+            },
+        }}
+
+    def _remember(self, params):
+        markup = params.get("reply_markup") or {}
+        if "keyboard" in markup:
+            self.keyboard = [button["text"] for row in markup["keyboard"] for button in row]
+        if "inline_keyboard" in markup:
+            self.inline = [
+                button["callback_data"]
+                for row in markup["inline_keyboard"] for button in row if button.get("callback_data")
+            ]
+        elif markup:
+            self.inline = []
+
+    def next_update(self):
+        if self.inline and self.rng.random() < 0.5:
+            return self._callback(self.rng.choice(self.inline))
+        if self.keyboard and self.rng.random() < 0.9:
+            return self._message(self.rng.choice(self.keyboard))
+        if self.rng.random() < 0.1:
+            return self._message(f"رسالة تجريبية {self.rng.randrange(10**6)}")
+        return self._message("/start")
+
+    async def run(self, deadline):
+        update = self._message("/start")
+        while time.monotonic() < deadline:
+            await self.server.push(update, self.chat_id)
+            try:
+                method, params = await asyncio.wait_for(self.replies.get(), self.reply_timeout)
+                self._remember(params)
+                # Drain follow-ups (a handler may send several messages)
+                while not self.replies.empty():
+                    self._remember(self.replies.get_nowait()[1])
+            except asyncio.TimeoutError:
+                self.server.sent_at.pop(self.chat_id, None)
+            await asyncio.sleep(self.rng.expovariate(1 / self.think) if self.think else 0)
+            update = self.next_update()
+
+
+async def drive_users(server, args):
+    rng = random.Random(args.seed)
+    users = [
+        VirtualUser(server, FIRST_USER_ID + index, random.Random(rng.random()), args.think_ms / 1000, args.reply_timeout)
+        for index in range(args.users)
+    ]
+    deadline = time.monotonic() + args.duration
+    tasks = [asyncio.create_task(user.run(deadline)) for user in users]
+    started = time.monotonic()
+    while not all(task.done() for task in tasks):
+        await asyncio.sleep(args.report_every)
+        stats = server.stats()
+        elapsed = time.monotonic() - started
+        # Past the deadline only the stragglers finish; rate over the run itself
+        rate = stats['updates_sent'] / min(elapsed, args.duration)
+        print(
+            f"[{elapsed:6.1f}s] updates={stats['updates_sent']} "
+            f"({rate:.1f}/s) replies={stats['replies']} "
+            f"p50={stats['reply_p50_ms']}ms p95={stats['reply_p95_ms']}ms p99={stats['reply_p99_ms']}ms"
+        )
+    await asyncio.gather(*tasks)
+    print(json.dumps(server.stats(), ensure_ascii=False, indent=2))
+
+
+async def main(args):
+    server = MockTelegram(
+        latency=args.latency_ms / 1000, jitter=args.jitter_ms / 1000,
+        rate_429=args.rate_429, retry_after=args.retry_after, rate_403=args.rate_403, seed=args.seed,
+    )
+    runner = web.AppRunner(server.build_app())
+    await runner.setup()
+    await web.TCPSite(runner, host=args.host, port=args.port).start()
+    print(f"Mock Bot API on http://{args.host}:{args.port} (set TELEGRAM_API_URL to this)")
+    try:
+        if args.users:
+            # The clock starts once the bot polls or registers its webhook
+            await server.connected.wait()
+            await asyncio.sleep(args.warmup)
+            await drive_users(server, args)
+        if args.users == 0 or not args.exit:
+            await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Mock Telegram Bot API server with virtual users")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--users", type=int, default=100, help="virtual users (0: serve only)")
+    parser.add_argument("--duration", type=float, default=60, help="seconds of traffic")
+    parser.add_argument("--warmup", type=float, default=1, help="seconds between the bot connecting and the traffic")
+    parser.add_argument("--think-ms", type=float, default=500, help="mean pause between a reply and the next press")
+    parser.add_argument("--reply-timeout", type=float, default=3, help="seconds a user waits for an answer")
+    parser.add_argument("--latency-ms", type=float, default=0, help="added to every API call")
+    parser.add_argument("--jitter-ms", type=float, default=0, help="random extra latency, up to this")
+    parser.add_argument("--rate-429", type=float, default=0, help="fraction of calls answered 429")
+    parser.add_argument("--retry-after", type=int, default=1, help="retry_after sent with 429s")
+    parser.add_argument("--rate-403", type=float, default=0, help="fraction of sends answered 403 (blocked)")
+    parser.add_argument("--report-every", type=float, default=5)
+    parser.add_argument("--exit", action="store_true", help="exit after the run instead of idling")
+    parser.add_argument("--seed", type=int, default=1)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main(parse_args()))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,259 @@
+# tools/query_bench.py
+#
+# Times every Database method on generated databases of growing size, to see
+# how each one scales. Methods are called through the real async layer (reader
+# pool / writer thread), so the numbers include the executor hop.
+#
+#   python -m tools.query_bench
+#   python -m tools.query_bench --sizes 10000,100000,500000 --repeat 50 --json scaling.json
+
+import argparse
+import asyncio
+import inspect
+import json
+import os
+import random
+import tempfile
+import time
+
+from tools.common import prepare_environment, quiet_logging, percentile
+from tools.generate import generate, FIRST_USER_ID, SUPER_ADMIN_ID
+
+
+# ======================
+# Cases
+# ======================
+# method name -> function(ctx) returning the call's positional arguments.
+# Run in this order: reads before the writes that change what they read,
+# destructive writes last. Every call gets fresh arguments from ctx.rng.
+class Context:
+    def __init__(self, conn, rng, users):
+        self.rng = rng
+        self.users = users
+        self.staff = [row[0] for row in conn.execute("SELECT telegram_id FROM users WHERE role IN ('admin', 'supervisor')")]
+        self.supervisors = [row[0] for row in conn.execute("SELECT telegram_id FROM users WHERE role = 'supervisor'")]
+        self.user_row_ids = [row[0] for row in conn.execute("SELECT id FROM users ORDER BY id")]
+        self.folders = [row[0] for row in conn.execute("SELECT id FROM buttons WHERE type = 'folder'")]
+        self.leaves = [row[0] for row in conn.execute("SELECT id FROM buttons WHERE type != 'folder'")]
+        self.contacts = [row[0] for row in conn.execute("SELECT id FROM buttons WHERE type = 'contact'")]
+        self.max_message_id = conn.execute("SELECT MAX(id) FROM support_messages").fetchone()[0] or 1
+        self.max_log_id = conn.execute("SELECT MAX(id) FROM admin_logs").fetchone()[0] or 1
+        self.features = [row[0] for row in conn.execute("SELECT id FROM features")]
+        self.job_id = None
+        self.serial = 0
+
+    def user(self):
+        return FIRST_USER_ID + self.rng.randrange(self.users)
+
+    def next(self):
+        self.serial += 1
+        return self.serial
+
+    def take(self, values):
+        # Distinct values for destructive calls
+        return values.pop(self.rng.randrange(len(values))) if values else -1
+
+
+def _page_cursor(ctx):
+    return ctx.rng.choice(ctx.user_row_ids)
+
+
+def _message_window(ctx):
+    first = ctx.rng.randrange(1, ctx.max_message_id)
+    return ctx.rng.choice(ctx.contacts), first, first + 20
+
+
+CASES = [
+    # Users
+    ("get_total_users_count", lambda ctx: ()),
+    ("get_total_supervisors_count", lambda ctx: ()),
+    ("get_user_by_telegram_id", lambda ctx: (ctx.user(),)),
+    ("get_users_page", lambda ctx: ()),
+    ("get_users_page:older", lambda ctx: dict(older_than=_page_cursor(ctx))),
+    ("get_users_page:role", lambda ctx: dict(role="user", older_than=_page_cursor(ctx))),
+    ("get_users_page:inactive", lambda ctx: dict(is_active=0)),
+    ("get_users_page:search", lambda ctx: dict(search=ctx.rng.choice(["محمد", "ali", "sara_1", "Omar", "خ"]))),
+    ("get_users_page:search_id", lambda ctx: dict(search=str(ctx.user()))),
+    ("get_admins", lambda ctx: ()),
+    ("get_staff_ids", lambda ctx: ()),
+    # Auth
+    ("get_auth_snapshot", lambda ctx: (ctx.rng.choice(ctx.staff + [ctx.user()]),)),
+    ("has_permission", lambda ctx: (ctx.rng.choice(ctx.staff), ctx.rng.choice(ctx.features))),
+    ("get_supervisor_permissions", lambda ctx: (ctx.rng.choice(ctx.staff),)),
+    ("get_features", lambda ctx: ()),
+    ("get_permissions", lambda ctx: (ctx.rng.choice(ctx.user_row_ids),)),
+    ("get_pending_by_username", lambda ctx: (f"pending_{ctx.rng.randrange(100)}",)),
+    # Buttons
+    ("get_all_buttons", lambda ctx: ()),
+    ("get_buttons", lambda ctx: (None,)),
+    ("get_buttons:child", lambda ctx: (ctx.rng.choice(ctx.folders),)),
+    ("get_button_by_id", lambda ctx: (ctx.rng.choice(ctx.leaves),)),
+    ("get_contact_buttons", lambda ctx: ()),
+    # Support
+    ("get_messages_page", lambda ctx: (ctx.rng.choice(ctx.contacts),)),
+    ("get_messages_page:older", lambda ctx: dict(button_id=ctx.rng.choice(ctx.contacts), before_id=ctx.rng.randrange(1, ctx.max_message_id))),
+    ("get_messages_page:newer", lambda ctx: dict(button_id=ctx.rng.choice(ctx.contacts), after_id=ctx.rng.randrange(1, ctx.max_message_id))),
+    ("has_messages_around", _message_window),
+    ("get_message_by_id", lambda ctx: (ctx.rng.randrange(1, ctx.max_message_id),)),
+    ("get_admin_logs", lambda ctx: ()),
+    ("get_admin_log_by_id", lambda ctx: (ctx.rng.randrange(1, ctx.max_log_id),)),
+    # Statistics
+    ("get_statistics", lambda ctx: ()),
+    ("get_daily_stats", lambda ctx: (30,)),
+    ("get_hot_buttons", lambda ctx: ("2025-12-01",)),
+    # Broadcasts
+    ("get_broadcast_recipients_count", lambda ctx: ()),
+    ("get_broadcast_recipients_after", lambda ctx: (ctx.user(), 500)),
+    ("get_running_broadcast_jobs", lambda ctx: ()),
+
+    # Writes
+    ("add_user", lambda ctx: (FIRST_USER_ID + ctx.users + ctx.next(), "new_user", "New User")),
+    ("upsert_users", lambda ctx: ([(ctx.user(), f"user{n}", f"User {n}") for n in range(100)],)),
+    ("update_user_info", lambda ctx: (ctx.user(), "renamed", "Renamed User")),
+    ("set_user_active", lambda ctx: (ctx.user(), ctx.rng.randint(0, 1))),
+    ("update_user_role", lambda ctx: (ctx.user(), "user")),
+    ("add_permission", lambda ctx: (ctx.rng.choice(ctx.user_row_ids), "bench")),
+    ("add_pending_supervisor", lambda ctx: (f"pending_{ctx.next()}",)),
+    ("remove_pending", lambda ctx: (f"pending_{ctx.rng.randrange(ctx.serial + 1)}",)),
+    ("set_supervisor_permission", lambda ctx: (ctx.rng.choice(ctx.supervisors), ctx.rng.choice(ctx.features), ctx.rng.random() < 0.5)),
+    ("add_button", lambda ctx: (f"bench {ctx.next()}", "text", "content", ctx.rng.choice(ctx.folders), SUPER_ADMIN_ID)),
+    ("update_button", lambda ctx: (ctx.rng.choice(ctx.leaves), f"renamed {ctx.next()}", None)),
+    ("move_button", lambda ctx: (ctx.rng.choice(ctx.leaves), ctx.rng.choice(["up", "down"]))),
+    ("add_support_message", lambda ctx: (ctx.user(), "bench message", 0, None, ctx.rng.choice(ctx.contacts))),
+    ("add_admin_log", lambda ctx: (ctx.rng.choice(ctx.staff), "Admin", "reply", "contact", "bench")),
+    ("record_activity", lambda ctx: ("2026-01-02", [ctx.user() for _ in range(200)], {ctx.rng.choice(ctx.leaves): 3 for _ in range(20)})),
+    ("create_broadcast_job", lambda ctx: (SUPER_ADMIN_ID, "Owner", "bench", ctx.users, SUPER_ADMIN_ID, ctx.next())),
+    ("get_broadcast_job", lambda ctx: (ctx.serial,)),
+    ("save_broadcast_progress", lambda ctx: (1, ctx.user(), 100, 2, [(ctx.user(), "Forbidden"), (ctx.user(), "Forbidden")])),
+    ("add_delivery_failures", lambda ctx: ("notification", ctx.rng.randrange(1, ctx.max_message_id), [(ctx.user(), "Forbidden")])),
+    ("finish_broadcast_job", lambda ctx: (ctx.rng.randint(1, max(1, ctx.serial)),)),
+    # FSM storage
+    ("save_fsm_records", lambda ctx: ([
+        (f"bench:{ctx.user()}", "SupportState:waiting_for_message", '{"button_id": 1}', int(time.time()) - ctx.rng.randrange(7200))
+        for _ in range(50)
+    ],)),
+    ("get_fsm_record", lambda ctx: (f"bench:{ctx.user()}",)),
+    ("get_expired_fsm_records", lambda ctx: (int(time.time()), 1800, {"ManageButtons": 86400, "SupportState": 3600})),
+    ("delete_fsm_records", lambda ctx: ([(f"bench:{ctx.user()}", 0) for _ in range(50)],)),
+
+    # Destructive
+    ("delete_support_message", lambda ctx: (ctx.rng.randrange(1, ctx.max_message_id),)),
+    ("delete_admin_log", lambda ctx: (ctx.rng.randrange(1, ctx.max_log_id),)),
+    ("delete_user", lambda ctx: (ctx.user(),)),
+    ("delete_supervisor", lambda ctx: (ctx.take(ctx.supervisors),)),
+    ("delete_button", lambda ctx: (ctx.take(ctx.leaves),)),
+    ("clear_support_messages_by_button", lambda ctx: (ctx.take(ctx.contacts),)),
+    ("clear_all_admin_logs", lambda ctx: ()),
+]
+# Calls that empty a table: repeating them would time an empty table
+RUN_ONCE = {"clear_all_admin_logs"}
+
+
+def uncovered_methods(database_class):
+    covered = {name.split(":")[0] for name, _ in CASES}
+    public = {
+        name for name, member in inspect.getmembers(database_class, inspect.iscoroutinefunction)
+        if not name.startswith("_")
+    }
+    return sorted(public - covered)
+
+
+# ======================
+# Runner
+# ======================
+async def time_cases(database, ctx, repeat):
+    results = {}
+    for name, make_args in CASES:
+        method = getattr(database, name.split(":")[0])
+        latencies = []
+        for _ in range(1 if name in RUN_ONCE else repeat):
+            args = make_args(ctx)
+            started = time.perf_counter()
+            if isinstance(args, dict):
+                await method(**args)
+            else:
+                await method(*args)
+            latencies.append(time.perf_counter() - started)
+        latencies.sort()
+        results[name] = {
+            "p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+            "p95_ms": round(percentile(latencies, 0.95) * 1000, 3),
+        }
+    return results
+
+
+async def bench_size(database_class, path, users, repeat, seed):
+    import sqlite3
+
+    conn = sqlite3.connect(path)
+    ctx = Context(conn, random.Random(seed), users)
+    conn.close()
+    database = database_class(path)
+    try:
+        return await time_cases(database, ctx, repeat)
+    finally:
+        database.close()
+
+
+def print_scaling(sizes, results):
+    headers = ["method"] + [f"{size:,} p50/p95 ms" for size in sizes] + ["growth"]
+    rows = []
+    for name, _ in CASES:
+        cells = [f"{results[size][name]['p50_ms']}/{results[size][name]['p95_ms']}" for size in sizes]
+        first, last = results[sizes[0]][name]["p50_ms"], results[sizes[-1]][name]["p50_ms"]
+        rows.append([name] + cells + [f"x{last / first:.1f}" if first else "-"])
+    widths = [max(len(str(row[index])) for row in rows + [headers]) for index in range(len(headers))]
+    for row in [headers] + rows:
+        print("  ".join(str(cell).ljust(width) for cell, width in zip(row, widths)))
+
+
+async def main(args):
+    workdir = args.workdir or tempfile.mkdtemp(prefix="bot-query-bench-")
+    # database.py opens DATABASE_NAME on import; keep that away from bot.db
+    prepare_environment(target_db=os.path.join(workdir, "import.db"))
+    from database import Database
+    quiet_logging()
+
+    missing = uncovered_methods(Database)
+    if missing:
+        print("Not benchmarked:", ", ".join(missing))
+
+    sizes = [int(size) for size in args.sizes.split(",")]
+    results = {}
+    for size in sizes:
+        path = os.path.join(workdir, f"bench-{size}.db")
+        print(f"== {size:,} users")
+        generate(
+            path, users=size, messages=int(size * args.messages_per_user), admin_logs=int(size * args.logs_per_user),
+            depth=args.depth, fanout=args.fanout, seed=args.seed, log=lambda line: print("  " + line),
+        )
+        results[size] = await bench_size(Database, path, size, args.repeat, args.seed)
+        if not args.keep:
+            for suffix in ("", "-wal", "-shm"):
+                if os.path.exists(path + suffix):
+                    os.remove(path + suffix)
+
+    print()
+    print_scaling(sizes, results)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({str(size): result for size, result in results.items()}, f, indent=2)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Time every Database method on generated datasets")
+    parser.add_argument("--sizes", default="1000,10000,100000", help="comma separated user counts")
+    parser.add_argument("--messages-per-user", type=float, default=5, help="support messages per user")
+    parser.add_argument("--logs-per-user", type=float, default=0.1, help="admin log rows per user")
+    parser.add_argument("--depth", type=int, default=4)
+    parser.add_argument("--fanout", type=int, default=6)
+    parser.add_argument("--repeat", type=int, default=30, help="calls per method and size")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--workdir", help="where to generate the databases (default: a temp dir)")
+    parser.add_argument("--keep", action="store_true", help="keep the generated databases")
+    parser.add_argument("--json", help="also write the results to this file")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
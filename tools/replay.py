@@ -0,0 +1,209 @@
+# tools/replay.py
+#
+# Feeds a capture recorded by capture.py (CAPTURE_ENABLED=true) back through
+# the real dispatcher against a copy of the database, at the original pace or
+# faster, and reports throughput and latency per update type. Bot API calls
+# are answered by the stub session from tools/common.py.
+#
+#   python -m tools.replay captures/updates.jsonl --salt "$CAPTURE_SALT"
+#   python -m tools.replay captures/updates.jsonl --speed 0 --db backup.db --salt "$CAPTURE_SALT"
+#
+# The capture's ids are pseudonyms; --salt applies the same mapping to the
+# database copy so roles, permissions and support threads line up again.
+
+import argparse
+import asyncio
+import glob
+import json
+import os
+import sqlite3
+import time
+
+from tools.common import (
+    ROOT, prepare_environment, quiet_logging, stub_session, summarize, print_table, percentile,
+)
+
+
+# ======================
+# Capture files
+# ======================
+def capture_files(path):
+    # path plus its rotated backups, oldest first (path.N is the oldest)
+    backups = [name for name in glob.glob(glob.escape(path) + ".*") if name.rsplit(".", 1)[1].isdigit()]
+    backups.sort(key=lambda name: int(name.rsplit(".", 1)[1]), reverse=True)
+    return backups + ([path] if os.path.exists(path) else [])
+
+
+def read_capture(paths, limit=None):
+    records = []
+    for path in paths:
+        for name in capture_files(path):
+            with open(name, encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        record = json.loads(line)
+                        records.append((record["t"], record["u"]))
+    records.sort(key=lambda record: record[0])
+    return records[:limit] if limit else records
+
+
+def update_type(payload):
+    return next(key for key in payload if key != "update_id")
+
+
+def chat_key(payload):
+    event = payload[update_type(payload)]
+    if "chat" in event:
+        return event["chat"]["id"]
+    if "from" in event:
+        return event["from"]["id"]
+    return None
+
+
+# ======================
+# Database copy
+# ======================
+def anonymize_database(path, anonymizer):
+    # Same id mapping as the capture; names become the same pseudonyms. FSM
+    # rows are keyed by the real ids and would never match, so start empty.
+    def anon_id(value):
+        return None if value is None else anonymizer.user_id(value)
+
+    def anon_name(value):
+        return None if value is None else anonymizer.name(value)
+
+    conn = sqlite3.connect(path)
+    conn.create_function("anon_id", 1, anon_id, deterministic=True)
+    conn.create_function("anon_name", 1, anon_name, deterministic=True)
+    with conn:
+        # Through negative ids first: a new id may equal an old one not yet remapped
+        conn.execute("""
+            UPDATE users SET
+                username = CASE WHEN username IS NULL THEN NULL ELSE anon_name(telegram_id) END,
+                full_name = anon_name(telegram_id),
+                telegram_id = -anon_id(telegram_id)
+        """)
+        conn.execute("UPDATE users SET telegram_id = -telegram_id")
+        conn.execute("UPDATE supervisor_permissions SET telegram_id = anon_id(telegram_id)")
+        conn.execute("""
+            UPDATE support_messages SET
+                user_id = anon_id(user_id),
+                admin_id = anon_id(admin_id),
+                admin_name = CASE WHEN admin_id IS NULL THEN admin_name ELSE anon_name(admin_id) END
+        """)
+        conn.execute("UPDATE admin_logs SET admin_id = anon_id(admin_id), admin_name = anon_name(admin_id), username = NULL")
+        conn.execute("UPDATE broadcast_jobs SET admin_id = anon_id(admin_id), admin_name = anon_name(admin_id), status_chat_id = anon_id(status_chat_id)")
+        # Nothing to resume in a replay
+        conn.execute("UPDATE broadcast_jobs SET status = 'done' WHERE status = 'running'")
+        conn.execute("UPDATE delivery_failures SET chat_id = anon_id(chat_id)")
+        conn.execute("DELETE FROM fsm_states")
+    conn.close()
+
+
+def super_admin_of(path):
+    conn = sqlite3.connect(path)
+    row = conn.execute("SELECT telegram_id FROM users WHERE role = 'super_admin' ORDER BY id LIMIT 1").fetchone()
+    conn.close()
+    return row[0] if row else None
+
+
+# ======================
+# Replay
+# ======================
+async def replay(dp, bot, records, speed, in_flight):
+    from aiogram.types import Update
+
+    # Updates of one chat run one after another, as a user cannot send the
+    # next one before seeing the answer; different chats overlap freely.
+    latencies = {}
+    lags = []
+    errors = {}
+    chains = {}
+    slots = asyncio.Semaphore(in_flight)
+    t0 = records[0][0]
+    started = time.perf_counter()
+
+    async def run(payload, previous, due):
+        try:
+            if previous is not None:
+                await previous
+            kind = update_type(payload)
+            begin = time.perf_counter()
+            lags.append(max(0.0, begin - due))
+            try:
+                await dp.feed_update(bot, Update.model_validate(payload, context={"bot": bot}))
+            except Exception:
+                errors[kind] = errors.get(kind, 0) + 1
+            latencies.setdefault(kind, []).append(time.perf_counter() - begin)
+        finally:
+            slots.release()
+
+    for t, payload in records:
+        due = started + ((t - t0) / speed if speed else 0)
+        delay = due - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        await slots.acquire()
+        key = chat_key(payload)
+        chains[key] = asyncio.create_task(run(payload, chains.get(key), due))
+    await asyncio.gather(*chains.values())
+    elapsed = time.perf_counter() - started
+
+    rows = [summarize(kind, values, elapsed, errors.get(kind, 0)) for kind, values in sorted(latencies.items())]
+    everything = [value for values in latencies.values() for value in values]
+    rows.append(summarize("all", everything, elapsed, sum(errors.values())))
+    return rows, sorted(lags)
+
+
+async def main(args):
+    records = read_capture(args.capture, args.limit)
+    if not records:
+        raise SystemExit("No updates in the capture")
+
+    path = prepare_environment(args.db, args.target)
+    if args.salt:
+        from capture import Anonymizer
+        anonymize_database(path, Anonymizer(args.salt))
+    else:
+        print("No --salt: database ids are left as they are and will not match the capture")
+    super_admin = super_admin_of(path)
+    if super_admin is not None:
+        os.environ["SUPER_ADMIN_ID"] = str(super_admin)
+
+    # Imported only now: they read the environment prepared above
+    from aiogram import Bot
+    import bot as bot_module
+
+    quiet_logging()
+    bot_module.setup_dispatcher(bot_module.dp)
+    bot = Bot(token=os.environ["BOT_TOKEN"], session=stub_session(args.api_latency / 1000))
+
+    span = records[-1][0] - records[0][0]
+    print(f"Replaying {len(records)} updates spanning {span:.0f}s at " + (f"x{args.speed}" if args.speed else "full speed"))
+    rows, lags = await replay(bot_module.dp, bot, records, args.speed, args.in_flight)
+    await bot_module.on_shutdown()
+
+    print_table(rows)
+    if args.speed:
+        print(f"start lag vs schedule: p50={percentile(lags, 0.5) * 1000:.1f}ms p99={percentile(lags, 0.99) * 1000:.1f}ms")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(rows, f, indent=2)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Replay captured updates through the real dispatcher")
+    parser.add_argument("capture", nargs="+", help="capture file(s); rotated backups are picked up")
+    parser.add_argument("--db", default=os.path.join(ROOT, "bot.db"), help="database to copy (left untouched)")
+    parser.add_argument("--target", help="where to put the working copy (default: a temp dir)")
+    parser.add_argument("--salt", default=os.getenv("CAPTURE_SALT"), help="CAPTURE_SALT used for the capture")
+    parser.add_argument("--speed", type=float, default=1.0, help="1 = original pace, 10 = ten times faster, 0 = no waits")
+    parser.add_argument("--in-flight", type=int, default=1000, help="max updates being handled at once")
+    parser.add_argument("--limit", type=int, help="replay only the first N updates")
+    parser.add_argument("--api-latency", type=float, default=0.0, help="simulated Bot API latency in ms")
+    parser.add_argument("--json", help="also write the results to this file")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
@@ -0,0 +1,71 @@
+# webhook.py
+
+import asyncio
+import logging
+
+from aiohttp import web
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+
+from config import (
+    WEBHOOK_URL, WEBHOOK_PATH, WEBHOOK_SECRET, WEB_SERVER_HOST, WEB_SERVER_PORT,
+    METRICS_ENABLED, METRICS_PATH,
+)
+from metrics import metrics_handler
+
+
+# ======================
+# Web app
+# ======================
+def build_metrics_app():
+    app = web.Application()
+    if METRICS_ENABLED:
+        app.router.add_get(METRICS_PATH, metrics_handler)
+    return app
+
+
+async def start_web_server(app):
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, host=WEB_SERVER_HOST, port=WEB_SERVER_PORT)
+    await site.start()
+    return runner
+
+
+async def start_metrics_server():
+    # Polling mode has no web app of its own; serve just the metrics
+    if not METRICS_ENABLED:
+        return None
+    runner = await start_web_server(build_metrics_app())
+    logging.info(f"Metrics on {WEB_SERVER_HOST}:{WEB_SERVER_PORT}{METRICS_PATH}")
+    return runner
+
+
+def build_web_app(dp, bot):
+    app = build_metrics_app()
+    # SimpleRequestHandler rejects requests without the matching
+    # X-Telegram-Bot-Api-Secret-Token header. With handle_in_background the
+    # update is queued as a task and Telegram gets its 200 immediately.
+    SimpleRequestHandler(
+        dispatcher=dp,
+        bot=bot,
+        secret_token=WEBHOOK_SECRET,
+        handle_in_background=True,
+    ).register(app, path=WEBHOOK_PATH)
+    setup_application(app, dp, bot=bot)
+    return app
+
+
+async def run_webhook(dp, bot):
+    runner = await start_web_server(build_web_app(dp, bot))
+
+    await bot.set_webhook(
+        f"{WEBHOOK_URL.rstrip('/')}{WEBHOOK_PATH}",
+        secret_token=WEBHOOK_SECRET,
+        allowed_updates=dp.resolve_used_update_types(),
+    )
+    logging.info(f"Webhook server listening on {WEB_SERVER_HOST}:{WEB_SERVER_PORT}{WEBHOOK_PATH}")
+
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
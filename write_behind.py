@@ -0,0 +1,103 @@
+# write_behind.py
+
+import asyncio
+import logging
+
+from config import USER_FLUSH_INTERVAL_MS, USER_FLUSH_MAX_ROWS
+from database import db
+
+
+# ======================
+# Write-behind base
+# ======================
+class WriteBehind:
+    # Changes are collected in memory by the subclass and written in one
+    # transaction every flush_interval seconds, sooner after wake(), and a
+    # last time in stop(). Subclasses implement _take() (detach the pending
+    # batch, falsy when empty), _write(batch) and _restore(batch), which puts
+    # a failed batch back without clobbering newer values.
+    name = "Write-behind"
+
+    def __init__(self, flush_interval):
+        self.flush_interval = flush_interval
+        self._wakeup = asyncio.Event()
+        self._task = None
+        self._flush_lock = asyncio.Lock()
+
+    def _start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def wake(self):
+        self._wakeup.set()
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception:
+                logging.exception(f"{self.name} flush failed, will retry")
+
+    async def flush(self):
+        async with self._flush_lock:
+            batch = self._take()
+            if not batch:
+                return 0
+            try:
+                return await self._write(batch)
+            except Exception:
+                self._restore(batch)
+                raise
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+
+# ======================
+# User upsert queue
+# ======================
+class UserUpsertQueue(WriteBehind):
+    # /start and "🔄 تحديث البوت" only need to refresh username/full_name, so
+    # instead of two commits per press the latest values per telegram_id are
+    # kept here and written in one transaction every interval or batch size.
+    name = "User upsert"
+
+    def __init__(self, database, flush_interval_ms=USER_FLUSH_INTERVAL_MS, max_rows=USER_FLUSH_MAX_ROWS):
+        super().__init__(flush_interval_ms / 1000)
+        self.db = database
+        self.max_rows = max_rows
+        self.pending = {}
+
+    def upsert(self, telegram_id, username=None, full_name=None):
+        self.pending[telegram_id] = (username, full_name)
+        self._start()
+        if len(self.pending) >= self.max_rows:
+            self.wake()
+
+    def _take(self):
+        batch, self.pending = self.pending, {}
+        return batch
+
+    async def _write(self, batch):
+        rows = [(telegram_id, username, full_name) for telegram_id, (username, full_name) in batch.items()]
+        await self.db.upsert_users(rows)
+        return len(rows)
+
+    def _restore(self, batch):
+        for telegram_id, values in batch.items():
+            self.pending.setdefault(telegram_id, values)
+
+
+user_writes = UserUpsertQueue(db)